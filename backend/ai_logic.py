@@ -1,6 +1,8 @@
 import re
 from datetime import datetime, timedelta
 
+from . import tracing
+
 class AI_Condition_Parser:
     """
     Simulates an NLP service that converts natural language conditions 
@@ -8,6 +10,7 @@ class AI_Condition_Parser:
     """
     
     @staticmethod
+    @tracing.traced("ai.parse_condition")
     def parse_condition(text: str):
         text = text.lower()
         conditions = []
@@ -0,0 +1,281 @@
+"""
+Merkle-batched on-chain anchoring of issued certificates.
+
+Issuing a certificate stores its digest (a CertificateAnchor row with no batch).
+The anchorer periodically, or as soon as ANCHOR_BATCH_SIZE digests are waiting,
+claims the pending digests, builds a Merkle tree over them, stores each
+certificate's inclusion proof and anchors only the root: one zero-amount
+Algorand payment per batch, with the root in the transaction note.
+
+Verifying a certificate is then a local, log-size proof check against the
+batch root; the chain is only needed to confirm the root once.
+"""
+import functools
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from . import database, metrics, models
+from .bundle_verifier import certificate_digest_from_fields, leaf_hash, node_hash, verify_merkle_proof
+
+# --- Config ---
+ANCHOR_BATCH_SIZE = int(os.getenv("TRUSTCERT_ANCHOR_BATCH_SIZE", "1000"))
+ANCHOR_INTERVAL = float(os.getenv("TRUSTCERT_ANCHOR_INTERVAL", "60"))
+ANCHOR_MNEMONIC = os.getenv("TRUSTCERT_ANCHOR_MNEMONIC")
+# A batch still SUBMITTING after this long was claimed by an anchorer that died mid-submit
+ANCHOR_CLAIM_TIMEOUT = float(os.getenv("TRUSTCERT_ANCHOR_CLAIM_TIMEOUT", "600"))
+ANCHOR_NOTE_PREFIX = b"trustcert-anchor:"
+
+
+# --- Digests ---
+def digest_fields(cert: models.Certificate) -> dict:
+    """The immutable certificate fields covered by the anchored digest."""
+    return {
+        "id": cert.id,
+        "title": cert.title,
+        "student_id": cert.student_id,
+        "issuer_id": cert.issuer_id,
+        "document_hash": cert.encrypted_ipfs_hash,
+        "created_at": cert.created_at.isoformat() if cert.created_at else None,
+    }
+
+
+def certificate_digest(cert: models.Certificate) -> str:
+    """SHA-256 over the certificate's immutable fields, as canonical JSON."""
+    return certificate_digest_from_fields(digest_fields(cert))
+
+
+# --- Merkle Tree ---
+# Leaves and inner nodes are hashed with distinct prefixes (see bundle_verifier)
+# so an inner node can never be passed off as a leaf. An odd node at the end of
+# a level is promoted unchanged instead of being paired with itself.
+
+
+def build_tree(digests: List[str]):
+    """Return (root_hex, proofs) where proofs[i] is the inclusion proof of digests[i]."""
+    if not digests:
+        raise ValueError("Cannot build a Merkle tree without leaves")
+    level = [leaf_hash(d) for d in digests]
+    positions = list(range(len(digests)))  # index of each leaf's ancestor in the current level
+    proofs = [[] for _ in digests]
+
+    while len(level) > 1:
+        next_level = []
+        for i in range(0, len(level), 2):
+            if i + 1 < len(level):
+                next_level.append(node_hash(level[i], level[i + 1]))
+            else:
+                next_level.append(level[i])
+        for leaf, pos in enumerate(positions):
+            sibling = pos ^ 1
+            if sibling < len(level):
+                side = "L" if sibling < pos else "R"
+                proofs[leaf].append({"side": side, "hash": level[sibling].hex()})
+            positions[leaf] = pos // 2
+        level = next_level
+
+    return level[0].hex(), proofs
+
+
+verify_proof = verify_merkle_proof
+
+
+# --- Issuance Hook ---
+def record_certificate(db: Session, cert: models.Certificate):
+    """Queue a freshly issued certificate for anchoring (part of the caller's transaction)."""
+    db.add(models.CertificateAnchor(certificate_id=cert.id, digest=certificate_digest(cert)))
+    anchorer.notify()
+
+
+# --- Batching ---
+def build_batch(db: Session, limit: int = ANCHOR_BATCH_SIZE) -> Optional[models.AnchorBatch]:
+    """
+    Claim up to `limit` pending digests into a new batch and store their proofs.
+    The claim is a conditional UPDATE, so concurrent anchorers never share a digest.
+    """
+    batch = models.AnchorBatch(status="PENDING", leaf_count=0)
+    db.add(batch)
+    db.flush()
+
+    pending_ids = select(models.CertificateAnchor.id).filter(
+        models.CertificateAnchor.batch_id == None
+    ).order_by(models.CertificateAnchor.id).limit(limit)
+    claimed = db.execute(
+        update(models.CertificateAnchor)
+        .where(models.CertificateAnchor.id.in_(pending_ids.scalar_subquery()))
+        .where(models.CertificateAnchor.batch_id == None)
+        .values(batch_id=batch.id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        db.rollback()
+        return None
+
+    anchors = db.query(models.CertificateAnchor).filter(
+        models.CertificateAnchor.batch_id == batch.id
+    ).order_by(models.CertificateAnchor.id).all()
+    root, proofs = build_tree([a.digest for a in anchors])
+    for index, (anchor, proof) in enumerate(zip(anchors, proofs)):
+        anchor.leaf_index = index
+        anchor.proof = json.dumps(proof, separators=(",", ":"))
+
+    batch.merkle_root = root
+    batch.leaf_count = len(anchors)
+    db.commit()
+    return batch
+
+
+def submit_root(client, root_hex: str) -> str:
+    """Anchor a Merkle root on chain; returns the transaction id."""
+    from algosdk import account, transaction
+
+    private_key = _signing_key()
+    sender = account.address_from_private_key(private_key)
+    with metrics.timed_call("algod", "suggested_params"):
+        params = client.suggested_params()
+    txn = transaction.PaymentTxn(sender, params, sender, 0, note=ANCHOR_NOTE_PREFIX + bytes.fromhex(root_hex))
+    with metrics.timed_call("algod", "send_transaction"):
+        return client.send_transaction(txn.sign(private_key))
+
+
+_dev_key = None
+
+def _signing_key():
+    global _dev_key
+    from algosdk import account, mnemonic
+
+    if ANCHOR_MNEMONIC:
+        return mnemonic.to_private_key(ANCHOR_MNEMONIC)
+    if _dev_key is None:
+        # No configured account: fine against a local stand-in, rejected by a real network
+        _dev_key, address = account.generate_account()
+        print(f"Anchoring with ephemeral dev account {address}; set TRUSTCERT_ANCHOR_MNEMONIC for a real network")
+    return _dev_key
+
+
+def _set_batch_status(db: Session, batch_id: int, from_status: str, **values) -> bool:
+    """Conditional status change, committed; False if the batch was no longer in `from_status`."""
+    changed = db.execute(
+        update(models.AnchorBatch)
+        .where(models.AnchorBatch.id == batch_id, models.AnchorBatch.status == from_status)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return bool(changed)
+
+
+def release_stale_claims(db: Session, timeout: float = ANCHOR_CLAIM_TIMEOUT) -> int:
+    """
+    Put batches claimed longer than `timeout` ago back to PENDING. Their anchorer
+    died between claim and commit, so the root may already be on chain: a retry
+    can cost one duplicate transaction, never a lost anchor.
+    """
+    released = db.execute(
+        update(models.AnchorBatch)
+        .where(
+            models.AnchorBatch.status == "SUBMITTING",
+            models.AnchorBatch.claimed_at < datetime.utcnow() - timedelta(seconds=timeout),
+        )
+        .values(status="PENDING", claimed_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    if released:
+        print(f"Released {released} stale anchoring claim(s)")
+    return released
+
+
+def anchor_pending_batches(db: Session, client) -> int:
+    """
+    Submit every batch whose root is not on chain yet. Returns the number anchored.
+    Each batch is claimed (PENDING -> SUBMITTING) with a conditional UPDATE before
+    it is submitted, so concurrent anchorers never pay for the same root twice.
+    """
+    release_stale_claims(db)
+    anchored = 0
+    pending = db.execute(
+        select(models.AnchorBatch.id, models.AnchorBatch.merkle_root)
+        .filter(models.AnchorBatch.status == "PENDING", models.AnchorBatch.merkle_root != None)
+        .order_by(models.AnchorBatch.id)
+    ).all()
+    db.commit() # end the read transaction before claiming
+    for batch_id, merkle_root in pending:
+        if not _set_batch_status(db, batch_id, "PENDING", status="SUBMITTING", claimed_at=datetime.utcnow()):
+            continue # another anchorer claimed it
+        try:
+            txid = submit_root(client, merkle_root)
+        except Exception as e:
+            _set_batch_status(db, batch_id, "SUBMITTING", status="PENDING", claimed_at=None)
+            print(f"Anchoring batch {batch_id} failed, will retry: {e}")
+            break
+        _set_batch_status(db, batch_id, "SUBMITTING", status="ANCHORED", txid=txid, anchored_at=datetime.utcnow())
+        anchored += 1
+    return anchored
+
+
+def run_once(client, session_factory=database.SessionLocal) -> int:
+    """Batch every pending digest and anchor every unanchored root."""
+    db = session_factory()
+    try:
+        while build_batch(db) is not None:
+            pass
+        if client is None:
+            return 0
+        return anchor_pending_batches(db, client)
+    finally:
+        db.close()
+
+
+class Anchorer:
+    """Background thread running `run_once` on a timer, or early once a batch fills up."""
+
+    def __init__(self, batch_size: int = ANCHOR_BATCH_SIZE, interval: float = ANCHOR_INTERVAL):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.client = None
+        self._pending = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def notify(self):
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self._wake.set()
+
+    def start(self, client):
+        self.client = client
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="anchorer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self._pending = 0
+            # Each institution's digests are batched (and anchored) from its own database
+            for institution in database.tenants:
+                try:
+                    run_once(self.client, functools.partial(database.open_session, institution))
+                except Exception as e:
+                    print(f"Anchorer run failed for institution {institution}: {e}")
+
+
+anchorer = Anchorer()
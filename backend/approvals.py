@@ -0,0 +1,257 @@
+"""
+Condition and certificate status transitions, single and in bulk.
+
+`approve_batch` runs entirely in the caller's transaction with set-based
+statements per chunk of ids:
+
+1. one conditional UPDATE flips every still-unmet approval condition the
+   approver may act on (untargeted, or targeted at them), RETURNING which
+   certificates it touched;
+2. one UPDATE bumps their `updated_at` and one unlocks those that no longer
+   have an unmet condition (NOT EXISTS);
+3. one SELECT explains the ids that were not approved.
+
+Audit entries, cache invalidation and push events ride on the same commit.
+
+Faculty queues are served from the materialized `approval_inbox`, which is
+kept in step here: items are queued when a certificate is created and removed
+in the same transaction that grants the approval or deletes the certificate.
+
+Every transition here is compare-and-set (`... WHERE is_met = false`,
+`... WHERE status != 'UNLOCKED'`), so concurrent approvals and evaluations of
+the same certificate can neither lose nor double-apply a change. The single
+approve / verify endpoints use the same helpers.
+"""
+import json
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from fastapi import Response
+from sqlalchemy import and_, delete, exists, or_, select, union_all, update
+from sqlalchemy.orm import Session
+
+from . import models, audit, cache, events
+
+# Max certificate ids accepted by one batch approval
+APPROVE_BATCH_MAX_IDS = int(os.getenv("TRUSTCERT_APPROVE_BATCH_MAX_IDS", "5000"))
+# Ids per statement (kept well under SQLite's bound-parameter limit)
+APPROVE_BATCH_CHUNK_SIZE = 500
+
+# Approval inbox pages
+INBOX_PAGE_SIZE = 100
+INBOX_MAX_PAGE_SIZE = 500
+
+# Per-item results
+APPROVED = "approved"
+ALREADY_APPROVED = "already_approved"
+NOT_TARGETED = "not_targeted"
+NO_APPROVAL_CONDITION = "no_approval_condition"
+NOT_FOUND = "not_found"
+# Most favourable first: a certificate with several approval conditions reports the best one
+_RESULT_RANK = {APPROVED: 0, ALREADY_APPROVED: 1, NOT_TARGETED: 2, NO_APPROVAL_CONDITION: 3}
+
+
+class BatchTooLarge(ValueError):
+    pass
+
+
+def _unmet_conditions(cert_id_column):
+    return exists().where(
+        models.Condition.certificate_id == cert_id_column,
+        models.Condition.is_met == False,
+    )
+
+
+# --- Compare-and-Set Transitions ---
+def set_condition_met(db: Session, condition_id: int, current_value: str) -> bool:
+    """Flip one condition to met. False if it already was (someone else won the race)."""
+    return db.execute(
+        update(models.Condition)
+        .where(models.Condition.id == condition_id, models.Condition.is_met == False)
+        .values(is_met=True, current_value=current_value)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+
+
+def touch_certificates(db: Session, cert_ids: Iterable[int], now: Optional[datetime] = None):
+    """A condition changed outside the ORM: bump the certificates' version and drop cached copies."""
+    cert_ids = list(cert_ids)
+    if not cert_ids:
+        return
+    db.execute(
+        update(models.Certificate)
+        .where(models.Certificate.id.in_(cert_ids))
+        .values(updated_at=now or datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    cache.mark_certificates_changed(db, cert_ids)
+
+
+def unlock_if_all_met(db: Session, cert_ids: Iterable[int], now: Optional[datetime] = None) -> Set[int]:
+    """
+    Unlock the certificates among `cert_ids` with no unmet condition left, in one
+    conditional UPDATE. Returns the ids this call unlocked; a certificate that was
+    already unlocked (by this or a concurrent transaction) is not reported twice.
+    """
+    cert_ids = list(cert_ids)
+    if not cert_ids:
+        return set()
+    unlocked = db.execute(
+        update(models.Certificate)
+        .where(
+            models.Certificate.id.in_(cert_ids),
+            models.Certificate.status != "UNLOCKED",
+            ~_unmet_conditions(models.Certificate.id)
+        )
+        .values(status="UNLOCKED", updated_at=now or datetime.utcnow())
+        .returning(models.Certificate.id, models.Certificate.student_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    for cert_id, student_id in unlocked:
+        events.certificate_status_changed(db, cert_id, student_id, "UNLOCKED")
+    unlocked_ids = {cert_id for cert_id, _ in unlocked}
+    cache.mark_certificates_changed(db, unlocked_ids)
+    return unlocked_ids
+
+
+# --- Approval Inbox ---
+def queue_approvals(db: Session, cert_id: int, conditions: List[models.Condition], payload: dict):
+    """Put a new certificate's unmet approvals in the targeted (or shared) inbox."""
+    pending = [c for c in conditions if c.condition_type == "approval" and not c.is_met]
+    if not pending:
+        return
+    if any(c.id is None for c in pending):
+        db.flush()
+    body = json.dumps(payload, separators=(",", ":"))
+    for cond in pending:
+        db.add(models.ApprovalInboxItem(
+            faculty_id=cond.target_recipient_id or models.SHARED_INBOX,
+            certificate_id=cert_id,
+            condition_id=cond.id,
+            payload=body,
+        ))
+
+
+def dequeue_conditions(db: Session, condition_ids: Iterable[int]):
+    condition_ids = list(condition_ids)
+    if condition_ids:
+        db.execute(
+            delete(models.ApprovalInboxItem)
+            .where(models.ApprovalInboxItem.condition_id.in_(condition_ids))
+            .execution_options(synchronize_session=False)
+        )
+
+
+def dequeue_certificates(db: Session, cert_ids: Iterable[int]):
+    db.execute(
+        delete(models.ApprovalInboxItem)
+        .where(models.ApprovalInboxItem.certificate_id.in_(list(cert_ids)))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def inbox_page_query(faculty_id: int, limit: int = INBOX_PAGE_SIZE, before_id: Optional[int] = None):
+    """
+    One page of a faculty member's queue, newest certificate first. Their own and
+    the shared inbox are each read as one bounded, index-ordered range over
+    ix_approval_inbox_faculty_certificate (at most `limit` rows apiece) and the
+    two short lists are merged; no join, no sort over the whole queue.
+    Page backwards with `before_id` (a certificate id).
+    """
+    limit = max(1, min(limit, INBOX_MAX_PAGE_SIZE))
+    item = models.ApprovalInboxItem
+
+    def inbox_range(key):
+        query = select(item.certificate_id, item.payload).where(item.faculty_id == key)
+        if before_id is not None:
+            query = query.where(item.certificate_id < before_id)
+        return select(query.order_by(item.certificate_id.desc()).limit(limit).subquery())
+
+    merged = union_all(inbox_range(faculty_id), inbox_range(models.SHARED_INBOX)).subquery()
+    return select(merged.c.payload).order_by(merged.c.certificate_id.desc()).limit(limit)
+
+
+def inbox_response(payloads: Iterable[str]) -> Response:
+    """Stored payloads are already CertificateResponse JSON; join them without re-encoding."""
+    return Response(content="[" + ",".join(payloads) + "]", media_type="application/json")
+
+
+# --- Batch Approval ---
+def approve_batch(db: Session, cert_ids: List[int], approver: models.User) -> List[dict]:
+    """
+    Approve the approval condition of many certificates. Does not commit.
+    Returns one {"certificate_id", "result", "cert_status"} per distinct id, in request order.
+    """
+    cert_ids = list(dict.fromkeys(cert_ids))
+    if len(cert_ids) > APPROVE_BATCH_MAX_IDS:
+        raise BatchTooLarge(f"At most {APPROVE_BATCH_MAX_IDS} certificates per request")
+
+    results: Dict[int, dict] = {}
+    now = datetime.utcnow()
+    approved_by = f"Approved by {approver.username}"
+
+    for start in range(0, len(cert_ids), APPROVE_BATCH_CHUNK_SIZE):
+        chunk = cert_ids[start:start + APPROVE_BATCH_CHUNK_SIZE]
+
+        # 1. Flip the approvals this approver may act on
+        flipped = db.execute(
+            update(models.Condition)
+            .where(
+                models.Condition.certificate_id.in_(chunk),
+                models.Condition.condition_type == "approval",
+                models.Condition.is_met == False,
+                or_(
+                    models.Condition.target_recipient_id == None,
+                    models.Condition.target_recipient_id == approver.id
+                )
+            )
+            .values(is_met=True, current_value=approved_by)
+            .returning(models.Condition.id, models.Condition.certificate_id, models.Condition.target_recipient_id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        approved_ids = list({cert_id for _, cert_id, _ in flipped})
+
+        if approved_ids:
+            # 2. Recompute status in SQL: unlock where nothing is left unmet
+            touch_certificates(db, approved_ids, now)
+            unlock_if_all_met(db, approved_ids, now)
+
+            dequeue_conditions(db, [cond_id for cond_id, _, _ in flipped])
+            for _, cert_id, target_recipient_id in flipped:
+                events.approval_resolved(db, cert_id, target_recipient_id)
+                audit.sink.record(db, "APPROVE_CONDITION", str(cert_id), "Approval granted (batch)", approver.username)
+
+        # 3. Explain everything else in one query
+        rows = db.execute(
+            select(
+                models.Certificate.id,
+                models.Certificate.status,
+                models.Condition.is_met,
+                models.Condition.target_recipient_id,
+            )
+            .outerjoin(models.Condition, and_(
+                models.Condition.certificate_id == models.Certificate.id,
+                models.Condition.condition_type == "approval"
+            ))
+            .where(models.Certificate.id.in_(chunk))
+        ).all()
+        approved_set = set(approved_ids)
+        for cert_id, status, is_met, target_recipient_id in rows:
+            if cert_id in approved_set:
+                result = APPROVED
+            elif is_met is None:
+                result = NO_APPROVAL_CONDITION
+            elif is_met:
+                result = ALREADY_APPROVED
+            else:
+                result = NOT_TARGETED
+            # A certificate with several approval conditions keeps its most favourable result
+            previous = results.get(cert_id)
+            if previous is None or _RESULT_RANK[result] < _RESULT_RANK[previous["result"]]:
+                results[cert_id] = {"certificate_id": cert_id, "result": result, "cert_status": status}
+
+    return [
+        results.get(cert_id, {"certificate_id": cert_id, "result": NOT_FOUND, "cert_status": None})
+        for cert_id in cert_ids
+    ]
@@ -0,0 +1,221 @@
+"""
+Audit log sink.
+
+Audit entries are attached to the caller's session and only leave it once that
+session commits, so a rolled-back action never produces an audit entry. They are
+persisted to the append-only segment store in `audit_store`, each in the store
+of the institution whose session recorded it.
+
+Durability modes (TRUSTCERT_AUDIT_MODE):
+- "transactional": the entry is appended (and fsynced) by the committing request
+  before it returns.
+- "batched" (default): on commit the entry is handed to a bounded queue and a
+  background thread writes it in batches, flushing on size or time. When the
+  queue is full the caller blocks up to AUDIT_ENQUEUE_TIMEOUT seconds and then
+  writes its remaining entries itself, as one batch, so bursts slow writers
+  down instead of dropping logs. If that write fails the entries are handed to
+  the background writer to retry: the request has already committed, so it
+  never fails because of its audit entries.
+"""
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import audit_store, database
+
+# --- Config ---
+AUDIT_MODE = os.getenv("TRUSTCERT_AUDIT_MODE", "batched")
+AUDIT_BATCH_SIZE = int(os.getenv("TRUSTCERT_AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("TRUSTCERT_AUDIT_FLUSH_INTERVAL", "0.5"))
+AUDIT_QUEUE_SIZE = int(os.getenv("TRUSTCERT_AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_ENQUEUE_TIMEOUT = float(os.getenv("TRUSTCERT_AUDIT_ENQUEUE_TIMEOUT", "1.0"))
+
+TRANSACTIONAL = "transactional"
+BATCHED = "batched"
+
+_PENDING_KEY = "audit_pending"
+
+
+class AuditSink:
+    def __init__(
+        self,
+        mode: str = AUDIT_MODE,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        flush_interval: float = AUDIT_FLUSH_INTERVAL,
+        max_queue: int = AUDIT_QUEUE_SIZE,
+        enqueue_timeout: float = AUDIT_ENQUEUE_TIMEOUT,
+        store_for=audit_store.store_for,
+    ):
+        if mode not in (TRANSACTIONAL, BATCHED):
+            raise ValueError(f"Unknown audit mode: {mode}")
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.store_for = store_for
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._deferred = [] # entries whose caller-side write failed; retried by the writer
+        self._deferred_lock = threading.Lock()
+
+    # --- Producer side ---
+    def record(self, db: Session, action: str, target_id: str, details: str, actor: str):
+        db.info.setdefault(_PENDING_KEY, []).append({
+            "action": action,
+            "target_id": target_id,
+            "details": details,
+            "actor_username": actor,
+            "timestamp": datetime.utcnow(),
+            "institution_id": database.institution_of(db),
+        })
+
+    def committed(self, entries):
+        if self.mode == TRANSACTIONAL:
+            self._write(entries)
+        else:
+            self.enqueue(entries)
+
+    def enqueue(self, entries):
+        self._ensure_started()
+        for index, entry in enumerate(entries):
+            try:
+                self._queue.put(entry, timeout=self.enqueue_timeout)
+            except queue.Full:
+                # Backpressure: the writer is behind, so this caller pays for its own write
+                self._write_or_defer(list(entries[index:]))
+                return
+
+    def _write_or_defer(self, entries):
+        # Runs in after_commit: an error here would fail a request whose data is committed
+        try:
+            self._write(entries)
+        except Exception as e:
+            print(f"Audit write of {len(entries)} entries failed, deferred to the writer: {e}")
+            with self._deferred_lock:
+                self._deferred.extend(entries) # `_write` left only the unwritten ones
+
+    def _take_deferred(self):
+        with self._deferred_lock:
+            deferred, self._deferred = self._deferred, []
+        return deferred
+
+    # --- Writer side ---
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the writer thread and flush whatever is still queued."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+        self.flush()
+
+    def flush(self):
+        """Synchronously write everything currently queued."""
+        while True:
+            batch = self._take_deferred() or self._drain(block=False)
+            if not batch:
+                return
+            self._write(batch)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self.start()
+
+    def _run(self):
+        batch = []
+        while not self._stop.is_set():
+            batch = batch or self._take_deferred() or self._drain(block=True)
+            if not batch:
+                continue
+            try:
+                self._write(batch)
+                batch = []
+            except Exception as e:
+                # Keep the writer alive and retry the same batch after a pause
+                print(f"Audit writer failed to flush {len(batch)} entries: {e}")
+                self._stop.wait(self.flush_interval)
+        if batch:
+            self._write(batch)
+
+    def _drain(self, block: bool):
+        """Collect up to batch_size entries, waiting at most flush_interval for the batch to fill."""
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            try:
+                if block:
+                    if deadline is None:
+                        timeout = self.flush_interval
+                    else:
+                        timeout = deadline - time.monotonic()
+                        if timeout <= 0:
+                            break
+                    entry = self._queue.get(timeout=timeout)
+                else:
+                    entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(entry)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return batch
+
+    def _write(self, entries):
+        """
+        Append entries to their institutions' stores. If a store fails, the
+        entries already written are removed from `entries` before re-raising,
+        so a retry of the same list does not write them twice.
+        """
+        by_institution = {}
+        for entry in entries:
+            by_institution.setdefault(entry["institution_id"], []).append(entry)
+        written = []
+        try:
+            for institution, group in by_institution.items():
+                # The store's directory says whose entries they are
+                self.store_for(institution).append(
+                    [{key: value for key, value in entry.items() if key != "institution_id"} for entry in group]
+                )
+                written.extend(group)
+        except Exception:
+            written_ids = {id(entry) for entry in written}
+            entries[:] = [entry for entry in entries if id(entry) not in written_ids]
+            raise
+
+
+sink = AuditSink()
+
+
+# --- Dependency ---
+def get_audit_store(request: Request) -> audit_store.SegmentedAuditStore:
+    """The audit store of the request's institution, picked like database.get_db picks the engine."""
+    return audit_store.store_for(getattr(request.state, "institution", database.DEFAULT_INSTITUTION))
+
+
+# --- Session Hooks ---
+@event.listens_for(Session, "after_commit")
+def _release_pending(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        sink.committed(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,233 @@
+"""
+Append-only, segmented audit log storage.
+
+Layout (one pair of files per UTC day):
+    audit-YYYYMMDD.log.gz   concatenated gzip members; each append writes one member (a "block")
+    audit-YYYYMMDD.idx      sparse index, one JSON line per block:
+                            {"offset", "length", "first_id", "last_id", "min_ts", "max_ts", "count"}
+
+Nothing is ever rewritten. A tail query decompresses blocks from the highest
+ids down and a time-range scan opens only the days in the window and only the
+blocks whose [min_ts, max_ts] overlaps it, so query cost follows the window
+requested rather than total retention.
+
+Ids come from a counter file (`.last_id`) rather than from the newest segment,
+so entries appended with an older timestamp (backfills, clock skew) still get
+fresh, increasing ids. Appends take an exclusive file lock, so several workers
+can share one directory.
+
+Each institution (see tenancy.py) has a store of its own: the default one in
+TRUSTCERT_AUDIT_DIR, every other tenant in TRUSTCERT_AUDIT_DIR/<institution>/.
+Tenants neither share the append lock nor read each other's blocks.
+"""
+import fcntl
+import gzip
+import heapq
+import json
+import os
+import threading
+from datetime import datetime
+from typing import List, Optional
+
+AUDIT_STORE_DIR = os.getenv("TRUSTCERT_AUDIT_DIR", "./backend/audit_segments")
+DEFAULT_INSTITUTION = "default" # database.DEFAULT_INSTITUTION; this module stays free of backend imports
+
+_SEGMENT_PREFIX = "audit-"
+_LOG_SUFFIX = ".log.gz"
+_INDEX_SUFFIX = ".idx"
+_COUNTER_FILE = ".last_id"
+
+
+def _day_key(ts: datetime) -> str:
+    return ts.strftime("%Y%m%d")
+
+
+def _encode(entry: dict) -> dict:
+    out = dict(entry)
+    out["timestamp"] = entry["timestamp"].isoformat()
+    return out
+
+
+def _decode(entry: dict) -> dict:
+    entry["timestamp"] = datetime.fromisoformat(entry["timestamp"])
+    return entry
+
+
+class SegmentedAuditStore:
+    def __init__(self, root: str = AUDIT_STORE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        # day -> (bytes parsed, blocks): index files only grow, so only new lines are parsed
+        self._indexes = {}
+        self._index_lock = threading.Lock()
+
+    # --- Paths ---
+    def _log_path(self, day: str) -> str:
+        return os.path.join(self.root, f"{_SEGMENT_PREFIX}{day}{_LOG_SUFFIX}")
+
+    def _index_path(self, day: str) -> str:
+        return os.path.join(self.root, f"{_SEGMENT_PREFIX}{day}{_INDEX_SUFFIX}")
+
+    def days(self) -> List[str]:
+        """Segment days present on disk, oldest first."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name[len(_SEGMENT_PREFIX):-len(_INDEX_SUFFIX)]
+            for name in os.listdir(self.root)
+            if name.startswith(_SEGMENT_PREFIX) and name.endswith(_INDEX_SUFFIX)
+        )
+
+    # --- Index ---
+    def _read_index(self, day: str) -> List[dict]:
+        with self._index_lock:
+            parsed, blocks = self._indexes.get(day, (0, []))
+            try:
+                with open(self._index_path(day), "rb") as f:
+                    f.seek(parsed)
+                    data = f.read()
+            except FileNotFoundError:
+                return []
+            # Only complete lines: another worker may be halfway through writing one
+            data = data[:data.rfind(b"\n") + 1]
+            if data:
+                blocks = blocks + [json.loads(line) for line in data.splitlines() if line.strip()]
+                self._indexes[day] = (parsed + len(data), blocks)
+            return blocks
+
+    def _counter_path(self) -> str:
+        return os.path.join(self.root, _COUNTER_FILE)
+
+    def _last_id(self) -> int:
+        """Highest id handed out so far. Call with the append lock held."""
+        try:
+            with open(self._counter_path()) as f:
+                return int(f.read())
+        except FileNotFoundError:
+            # Store written before the counter existed: the highest id in any segment
+            return max((blocks[-1]["last_id"] for blocks in map(self._read_index, self.days()) if blocks), default=0)
+
+    def _set_last_id(self, last_id: int):
+        tmp_path = self._counter_path() + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(last_id))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._counter_path())
+
+    # --- Write ---
+    def append(self, entries: List[dict]) -> List[int]:
+        """
+        Append entries (dicts with action, target_id, details, actor_username, timestamp).
+        Assigns and returns increasing ids.
+        """
+        if not entries:
+            return []
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock, open(os.path.join(self.root, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            next_id = self._last_id() + 1
+            # Reserve the ids before writing: a crash may leave a gap, never a reused id
+            self._set_last_id(next_id + len(entries) - 1)
+
+            by_day = {}
+            ids = []
+            for entry in entries:
+                record = dict(entry, id=next_id)
+                ids.append(next_id)
+                next_id += 1
+                by_day.setdefault(_day_key(record["timestamp"]), []).append(record)
+
+            for day, records in by_day.items():
+                self._write_block(day, records)
+        return ids
+
+    def _write_block(self, day: str, records: List[dict]):
+        payload = "".join(json.dumps(_encode(r), separators=(",", ":")) + "\n" for r in records)
+        block = gzip.compress(payload.encode())
+        timestamps = [r["timestamp"] for r in records]
+
+        with open(self._log_path(day), "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(block)
+            f.flush()
+            os.fsync(f.fileno())
+
+        meta = {
+            "offset": offset,
+            "length": len(block),
+            "first_id": records[0]["id"],
+            "last_id": records[-1]["id"],
+            "min_ts": min(timestamps).isoformat(),
+            "max_ts": max(timestamps).isoformat(),
+            "count": len(records),
+        }
+        with open(self._index_path(day), "a") as f:
+            f.write(json.dumps(meta, separators=(",", ":")) + "\n")
+
+    # --- Read ---
+    def _read_block(self, day: str, meta: dict) -> List[dict]:
+        with open(self._log_path(day), "rb") as f:
+            f.seek(meta["offset"])
+            data = gzip.decompress(f.read(meta["length"]))
+        return [_decode(json.loads(line)) for line in data.decode().splitlines()]
+
+    def tail(self, limit: int = 100, before_id: Optional[int] = None) -> List[dict]:
+        """
+        Highest ids first, optionally only those with id < before_id. Ordered by
+        id, not day, so `before_id` pages never skip an entry that was appended
+        to an older day.
+        """
+        blocks = sorted(
+            (
+                (meta, day) for day in self.days() for meta in self._read_index(day)
+                if before_id is None or meta["first_id"] < before_id
+            ),
+            key=lambda block: block[0]["last_id"], reverse=True,
+        )
+        results = []
+        for meta, day in blocks:
+            # Every block left holds only lower ids than the page already has
+            if len(results) >= limit and meta["last_id"] < results[-1]["id"]:
+                break
+            results.extend(
+                record for record in self._read_block(day, meta)
+                if before_id is None or record["id"] < before_id
+            )
+            results = heapq.nlargest(limit, results, key=lambda record: record["id"])
+        return results
+
+    def scan(self, start: datetime, end: datetime, limit: Optional[int] = None) -> List[dict]:
+        """Entries with start <= timestamp < end, newest first."""
+        first_day, last_day = _day_key(start), _day_key(end)
+        start_iso, end_iso = start.isoformat(), end.isoformat()
+        results = []
+        for day in reversed(self.days()):
+            if day < first_day or day > last_day:
+                continue
+            for meta in reversed(self._read_index(day)):
+                if meta["max_ts"] < start_iso or meta["min_ts"] >= end_iso:
+                    continue
+                matched = [r for r in self._read_block(day, meta) if start <= r["timestamp"] < end]
+                results.extend(sorted(matched, key=lambda r: r["id"], reverse=True))
+                if limit is not None and len(results) >= limit:
+                    return results[:limit]
+        return results
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def store_for(institution: str) -> SegmentedAuditStore:
+    """The institution's store, created on first use."""
+    store = _stores.get(institution)
+    if store is None:
+        root = AUDIT_STORE_DIR if institution == DEFAULT_INSTITUTION else os.path.join(AUDIT_STORE_DIR, institution)
+        with _stores_lock:
+            store = _stores.setdefault(institution, SegmentedAuditStore(root))
+    return store
+
+
+# The default institution's store
+store = store_for(DEFAULT_INSTITUTION)
@@ -1,11 +1,12 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import NamedTuple, Optional, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from starlette.datastructures import Headers
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from . import models, schemas, database
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas, database, tracing
 
 # --- Config ---
 # For Hackathon MVP, HARDCODED IS OK. Do NOT do this in Prod.
@@ -13,18 +14,32 @@ SECRET_KEY = "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 3000
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # --- Password Helpers ---
+# passlib and jose are imported on first use rather than at import time, so
+# workers start without loading them.
+_pwd_context = None
+
+def password_context():
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+    return _pwd_context
+
+@tracing.traced("auth.verify_password")
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_context().verify(plain_password, hashed_password)
 
+@tracing.traced("auth.hash_password")
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return password_context().hash(password)
 
 # --- Token Helpers ---
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    from jose import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -35,29 +50,96 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 # --- Dependencies ---
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+get_db = database.get_db
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def token_identity(token: str) -> Optional[Tuple[str, str]]:
+    """
+    (username, institution) of a valid token, or None. Tokens issued before
+    tenancy carry no institution and belong to the default one.
+    """
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(username=username)
     except JWTError:
-        raise credentials_exception
+        return None
+    username = payload.get("sub")
+    institution = payload.get("inst", database.DEFAULT_INSTITUTION)
+    if not isinstance(username, str) or not isinstance(institution, str):
+        return None
+    return username, institution
+
+# --- Callers ---
+# Anonymous requests (registration, login, public verification) name their institution in this header
+INSTITUTION_HEADER = "x-institution"
+_CALLER_SCOPE_KEY = "trustcert.caller"
+
+class Caller(NamedTuple):
+    key: str # rate limiting and replica stickiness key
+    authenticated: bool
+    institution: str
+
+def caller_key(username: str, institution: str) -> str:
+    return f"user:{institution}:{username}"
+
+def request_caller(scope) -> Caller:
+    """
+    Who is calling, from an ASGI scope: the user of a valid bearer token, else
+    the client IP (with the institution from the X-Institution header).
+    Worked out once per request and kept in the scope.
+    """
+    caller = scope.get(_CALLER_SCOPE_KEY)
+    if caller is not None:
+        return caller
+    headers = Headers(scope=scope)
+    authorization = headers.get("authorization", "")
+    identity = token_identity(authorization[7:]) if authorization[:7].lower() == "bearer " else None
+    if identity is not None:
+        username, institution = identity
+        caller = Caller(caller_key(username, institution), True, institution)
+    else:
+        client = scope.get("client")
+        institution = headers.get(INSTITUTION_HEADER, "").strip().lower() or database.DEFAULT_INSTITUTION
+        caller = Caller(f"ip:{client[0] if client else 'unknown'}", False, institution)
+    scope[_CALLER_SCOPE_KEY] = caller
+    return caller
+
+@tracing.traced("auth.decode_token")
+def _username_from_token(token: str) -> str:
+    identity = token_identity(token)
+    if identity is None:
+        raise _credentials_exception()
+    return schemas.TokenData(username=identity[0]).username
+
+# Plain `def`: the lookup uses the sync session, so it must run in the threadpool
+# rather than block the event loop.
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    username = _username_from_token(token)
     
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
-    if user is None:
-        raise credentials_exception
+    with tracing.span("auth.load_user", username=username):
+        user = db.query(models.User).filter(models.User.username == username).first()
+    # The session is on the token's institution; its users all belong to it
+    if user is None or user.institution_id != database.institution_of(db):
+        raise _credentials_exception()
     return user
+
+async def user_from_token_async(token: str, db: AsyncSession):
+    username = _username_from_token(token)
+
+    with tracing.span("auth.load_user", username=username):
+        result = await db.execute(select(models.User).filter(models.User.username == username))
+        user = result.scalars().first()
+    if user is None or user.institution_id != database.institution_of(db):
+        raise _credentials_exception()
+    return user
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(database.get_async_db)):
+    """Same as `get_current_user`, for endpoints running on the async session."""
+    return await user_from_token_async(token, db)
@@ -0,0 +1,110 @@
+"""
+Offline verifier for TrustCert signed verification bundles.
+
+Self-contained on purpose (standard library + `cryptography` only) so it can be
+copied into a verifier's own tooling. Given a bundle and the issuer's public key
+(GET /bundles/public-key, fetched once), it checks:
+
+1. the Ed25519 signature over the canonical JSON payload;
+2. if the bundle carries an anchor whose batch is ANCHORED, that the certificate
+   digest recomputed from the bundle's fields matches and that the Merkle proof
+   folds up to the root. An anchor still waiting for its batch to reach the
+   chain is reported in `anchor_status` but not checked.
+
+Usage:
+    python -m backend.bundle_verifier bundle.json PUBLIC_KEY_B64
+"""
+import base64
+import hashlib
+import json
+import sys
+from typing import List
+
+BUNDLE_ALG = "Ed25519"
+
+
+def canonical_json(value) -> bytes:
+    return json.dumps(value, sort_keys=True, separators=(",", ":")).encode()
+
+
+# --- Certificate Digest & Merkle Proofs ---
+def certificate_digest_from_fields(fields: dict) -> str:
+    """Digest anchored on chain: SHA-256 over the certificate's immutable fields."""
+    payload = {key: fields.get(key) for key in ("id", "title", "student_id", "issuer_id", "document_hash", "created_at")}
+    return hashlib.sha256(canonical_json(payload)).hexdigest()
+
+
+def leaf_hash(digest_hex: str) -> bytes:
+    return hashlib.sha256(b"\x00" + bytes.fromhex(digest_hex)).digest()
+
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def verify_merkle_proof(digest_hex: str, proof: List[dict], root_hex: str) -> bool:
+    node = leaf_hash(digest_hex)
+    for step in proof:
+        sibling = bytes.fromhex(step["hash"])
+        node = node_hash(sibling, node) if step["side"] == "L" else node_hash(node, sibling)
+    return node.hex() == root_hex
+
+
+# --- Bundles ---
+def key_id(public_key_raw: bytes) -> str:
+    return hashlib.sha256(public_key_raw).hexdigest()[:16]
+
+
+def verify_bundle(bundle: dict, public_key_b64: str) -> dict:
+    """
+    Returns {"valid": bool, "signature": bool, "anchor": bool | None,
+             "anchor_status": str | None, "errors": [...]}.
+    `anchor` is None when the certificate has not been anchored yet, including
+    when its batch is not ANCHORED; `anchor_status` then says where the batch is.
+    """
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+    errors = []
+    public_key_raw = base64.b64decode(public_key_b64)
+
+    signature_ok = False
+    if bundle.get("alg") != BUNDLE_ALG:
+        errors.append(f"Unsupported algorithm {bundle.get('alg')!r}")
+    elif bundle.get("key_id") != key_id(public_key_raw):
+        errors.append("Bundle was signed with a different key")
+    else:
+        try:
+            Ed25519PublicKey.from_public_bytes(public_key_raw).verify(
+                base64.b64decode(bundle["signature"]), canonical_json(bundle["payload"])
+            )
+            signature_ok = True
+        except (InvalidSignature, KeyError, ValueError):
+            errors.append("Invalid signature")
+
+    anchor_ok = None
+    anchor = bundle.get("payload", {}).get("anchor")
+    anchor_status = anchor.get("batch_status") if anchor else None
+    if anchor and anchor_status == "ANCHORED":
+        digest = certificate_digest_from_fields(bundle["payload"]["certificate"])
+        anchor_ok = digest == anchor["digest"] and verify_merkle_proof(digest, anchor["proof"], anchor["merkle_root"])
+        if not anchor_ok:
+            errors.append("Anchor proof does not match the certificate")
+
+    return {
+        "valid": signature_ok and anchor_ok is not False,
+        "signature": signature_ok,
+        "anchor": anchor_ok,
+        "anchor_status": anchor_status,
+        "errors": errors,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(2)
+    with open(sys.argv[1]) as f:
+        result = verify_bundle(json.load(f), sys.argv[2])
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["valid"] else 1)
@@ -0,0 +1,177 @@
+"""
+Signed verification bundles.
+
+A bundle is a compact, self-contained statement about one certificate:
+its fields, condition status, the head hash of each of the student's record
+chains and, once anchored, its Merkle inclusion proof, all signed with the
+issuer's Ed25519 key. `bundle_verifier.verify_bundle` checks it offline.
+
+Bundles are built a chunk at a time with set-based queries and signed with a
+key loaded once per process. Signed bundles are cached like public responses.
+"""
+import base64
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, cache, anchoring, database
+from .bundle_verifier import BUNDLE_ALG, canonical_json, key_id
+
+BUNDLE_KEY_PATH = os.getenv("TRUSTCERT_BUNDLE_KEY_PATH", "./backend/bundle_signing_key.pem")
+BUNDLE_VERSION = 2
+# Bundles also carry record-chain heads and anchor status, which do not bump the
+# certificate version, so cached bundles are re-signed after this many seconds.
+BUNDLE_CACHE_SECONDS = float(os.getenv("TRUSTCERT_BUNDLE_CACHE_SECONDS", "60"))
+
+
+# --- Signing Key ---
+class BundleSigner:
+    def __init__(self, key_path: str = BUNDLE_KEY_PATH):
+        self.key_path = key_path
+        self._key = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+        if os.path.exists(self.key_path):
+            with open(self.key_path, "rb") as f:
+                return serialization.load_pem_private_key(f.read(), password=None)
+
+        # First run: create the issuer key. Verifiers pin its public half.
+        key = Ed25519PrivateKey.generate()
+        os.makedirs(os.path.dirname(self.key_path) or ".", exist_ok=True)
+        pem = key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+        fd = os.open(self.key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(pem)
+        return key
+
+    @property
+    def key(self):
+        if self._key is None:
+            with self._lock:
+                if self._key is None:
+                    self._key = self._load()
+        return self._key
+
+    def public_key_raw(self) -> bytes:
+        from cryptography.hazmat.primitives import serialization
+
+        return self.key.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+
+    def key_id(self) -> str:
+        return key_id(self.public_key_raw())
+
+    def sign_many(self, payloads: List[dict]) -> List[dict]:
+        key, kid = self.key, self.key_id()
+        return [
+            {
+                "alg": BUNDLE_ALG,
+                "key_id": kid,
+                "payload": payload,
+                "signature": base64.b64encode(key.sign(canonical_json(payload))).decode(),
+            }
+            for payload in payloads
+        ]
+
+
+signer = BundleSigner()
+public_bundles = cache.PublicCertificateCache()
+cache.register_certificate_cache(public_bundles)
+
+
+# --- Building ---
+def _payload(cert, student_username, heads, anchor_row) -> dict:
+    fields = anchoring.digest_fields(cert)
+    fields.update(status=cert.status, student_username=student_username)
+    anchor = None
+    if anchor_row is not None:
+        anchor_rec, batch = anchor_row
+        anchor = {
+            "digest": anchor_rec.digest,
+            "leaf_index": anchor_rec.leaf_index,
+            "proof": json.loads(anchor_rec.proof),
+            "merkle_root": batch.merkle_root,
+            "txid": batch.txid,
+            # Only an ANCHORED batch's root is on chain; verifiers don't trust the proof before that
+            "batch_status": batch.status,
+        }
+    return {
+        "version": BUNDLE_VERSION,
+        "certificate": fields,
+        "conditions": [
+            {
+                "type": c.condition_type,
+                "target_value": c.target_value,
+                "description": c.description,
+                "met": bool(c.is_met),
+            }
+            for c in cert.conditions
+        ],
+        "record_chain_heads": heads,
+        "anchor": anchor,
+        "issued_at": datetime.utcnow().isoformat(),
+    }
+
+
+async def build_bundles(db: AsyncSession, cert_ids: List[int]) -> Dict[int, cache.CachedResponse]:
+    """Build and sign bundles for many certificates: four queries per call, one signing pass."""
+    result = await db.execute(
+        select(models.Certificate, models.User.username)
+        .join(models.User, models.User.id == models.Certificate.student_id)
+        .options(selectinload(models.Certificate.conditions))
+        .filter(models.Certificate.id.in_(cert_ids))
+    )
+    rows = result.all()
+    if not rows:
+        return {}
+
+    # Head of each (student, category) record chain
+    student_ids = {cert.student_id for cert, _ in rows}
+    latest = select(func.max(models.RecordVersion.id)).filter(
+        models.RecordVersion.student_id.in_(student_ids)
+    ).group_by(models.RecordVersion.student_id, models.RecordVersion.category)
+    head_rows = await db.execute(
+        select(models.RecordVersion.student_id, models.RecordVersion.category, models.RecordVersion.data_hash)
+        .filter(models.RecordVersion.id.in_(latest))
+    )
+    heads = {}
+    for student_id, category, data_hash in head_rows:
+        heads.setdefault(student_id, {})[category] = data_hash
+
+    anchor_rows = await db.execute(
+        select(models.CertificateAnchor, models.AnchorBatch)
+        .join(models.AnchorBatch, models.AnchorBatch.id == models.CertificateAnchor.batch_id)
+        .filter(models.CertificateAnchor.certificate_id.in_(cert_ids))
+    )
+    anchors = {anchor.certificate_id: (anchor, batch) for anchor, batch in anchor_rows}
+
+    payloads = [
+        _payload(cert, username, heads.get(cert.student_id, {}), anchors.get(cert.id))
+        for cert, username in rows
+    ]
+    institution = database.institution_of(db)
+    built = {}
+    for (cert, _), bundle in zip(rows, signer.sign_many(payloads)):
+        entry = cache.CachedResponse(canonical_json(bundle), cache.certificate_version(cert))
+        public_bundles.put(institution, cert.id, entry)
+        built[cert.id] = entry
+    return built
+
+
+def cached_bundle(institution: str, cert_id: int):
+    """A cached bundle, if still within its freshness window."""
+    entry = public_bundles.get(institution, cert_id)
+    if entry is not None and entry.is_fresh(BUNDLE_CACHE_SECONDS):
+        return entry
+    return None
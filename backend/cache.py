@@ -0,0 +1,281 @@
+"""
+Response cache for the public certificate verification endpoint, and
+collection versions for conditional requests on list endpoints.
+
+Entries are keyed by certificate id and versioned by `Certificate.updated_at`.
+Within one worker an entry is dropped as soon as a transaction that changed the
+certificate (or one of its conditions) commits. Other workers cannot see that
+invalidation, so an entry older than PUBLIC_CACHE_FRESH_SECONDS is revalidated
+with a single primary-key lookup of `updated_at` before it is served again.
+
+List responses (/certificates/all, /my-certificates) are versioned per
+collection by a counter row in `collection_versions`, bumped in the same
+transaction as any certificate change. Their weak ETags are built from that
+counter, so answering a revalidation with 304 costs one primary-key lookup
+instead of building (or hashing) the list. Because the counters live in the
+database, every worker agrees on them.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, List, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import database, models
+
+PUBLIC_CACHE_MAX_ENTRIES = int(os.getenv("TRUSTCERT_PUBLIC_CACHE_MAX_ENTRIES", "50000"))
+PUBLIC_CACHE_FRESH_SECONDS = float(os.getenv("TRUSTCERT_PUBLIC_CACHE_FRESH_SECONDS", "5"))
+
+_CHANGED_KEY = "changed_certificates"
+_COLLECTIONS_KEY = "changed_collections"
+_RESOLVE_KEY = "changed_collections_certificates"
+
+# Collection names
+CERTIFICATES = "certificates"
+EPOCH = "_epoch" # random per database, so a recreated database never reuses an ETag
+_BUMP_CHUNK = 500
+# One-statement increment-or-create where the dialect has INSERT ... ON CONFLICT
+_UPSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+class CachedResponse:
+    __slots__ = ("body", "etag", "version", "last_modified", "checked_at")
+
+    def __init__(self, body: bytes, version: datetime):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.version = version
+        self.last_modified = format_datetime(version.replace(microsecond=0, tzinfo=timezone.utc), usegmt=True)
+        self.checked_at = time.monotonic()
+
+    def is_fresh(self, max_age: Optional[float] = None) -> bool:
+        if max_age is None:
+            max_age = PUBLIC_CACHE_FRESH_SECONDS
+        return time.monotonic() - self.checked_at < max_age
+
+    def mark_checked(self):
+        self.checked_at = time.monotonic()
+
+
+class PublicCertificateCache:
+    """Keyed by (institution, certificate id): each institution's database numbers its own certificates."""
+
+    def __init__(self, max_entries: int = PUBLIC_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, institution: str, cert_id: int) -> Optional[CachedResponse]:
+        key = (institution, cert_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, institution: str, cert_id: int, entry: CachedResponse):
+        key = (institution, cert_id)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, institution: str, cert_ids: Iterable[int]):
+        with self._lock:
+            for cert_id in cert_ids:
+                self._entries.pop((institution, cert_id), None)
+
+
+public_certificates = PublicCertificateCache()
+
+# Every cache keyed by certificate id; all are invalidated together on change
+_certificate_caches = [public_certificates]
+
+
+def register_certificate_cache(certificate_cache: PublicCertificateCache):
+    _certificate_caches.append(certificate_cache)
+
+
+def certificate_version(cert: models.Certificate) -> datetime:
+    return cert.updated_at or cert.created_at or datetime.min
+
+
+def conditional_response(request: Request, entry: CachedResponse) -> Response:
+    """Serve `entry`, or a bodyless 304 if the client's validators still match."""
+    headers = {
+        "ETag": entry.etag,
+        "Last-Modified": entry.last_modified,
+        "Cache-Control": "no-cache",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag_matches(if_none_match, entry.etag):
+            return Response(status_code=304, headers=headers)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).replace(tzinfo=None)
+            except (TypeError, ValueError):
+                since = None
+            if since is not None and entry.version.replace(microsecond=0) <= since:
+                return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires."""
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == opaque:
+            return True
+    return False
+
+
+# --- Collection Versions ---
+def student_certificates(student_id: int) -> str:
+    return f"{CERTIFICATES}:student:{student_id}"
+
+
+def collection_version_query(name: str):
+    """Execute on the request's session (sync or async) and pass the rows to `collection_etag`."""
+    version = models.CollectionVersion
+    return select(version.name, version.version).where(version.name.in_((EPOCH, name)))
+
+
+def collection_etag(name: str, rows) -> str:
+    versions = dict(rows.all())
+    return f'W/"{versions.get(EPOCH, 0)}.{name}.{versions.get(name, 0)}"'
+
+
+def validator_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """
+    A bodyless 304 if the client already holds `etag`, else None.
+    Read the version before the list: a write in between then only makes the
+    ETag older than the body, which costs one extra full response later.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=validator_headers(etag))
+    return None
+
+
+def bump_collections(conn, names: Iterable[str]):
+    """Increment the named counters (creating them at 1) on `conn`, inside its transaction."""
+    table = models.CollectionVersion.__table__
+    names = sorted(set(names)) # fixed order, so concurrent bumps lock rows alike
+    if not names:
+        return
+    upsert = _UPSERTS.get(conn.dialect.name)
+    if upsert is not None:
+        statement = upsert(table).on_conflict_do_update(
+            index_elements=[table.c.name], set_={"version": table.c.version + 1}
+        )
+        conn.execute(statement, [{"name": name, "version": 1} for name in names])
+        return
+    for i in range(0, len(names), _BUMP_CHUNK):
+        chunk = names[i:i + _BUMP_CHUNK]
+        conn.execute(update(table).where(table.c.name.in_(chunk)).values(version=table.c.version + 1))
+        existing = set(conn.execute(select(table.c.name).where(table.c.name.in_(chunk))).scalars())
+        missing = [name for name in chunk if name not in existing]
+        if missing:
+            conn.execute(insert(table), [{"name": name, "version": 1} for name in missing])
+
+
+def _certificate_collections(student_ids: Iterable[int]) -> List[str]:
+    return [CERTIFICATES] + [student_certificates(s) for s in student_ids if s is not None]
+
+
+# --- Change Tracking ---
+def mark_certificates_changed(db: Session, cert_ids: Iterable[int]):
+    """
+    Record certificates changed outside the ORM unit of work (bulk UPDATEs).
+    Their cache entries are dropped, and their collections bumped, when `db` commits.
+    """
+    cert_ids = set(cert_ids)
+    db.info.setdefault(_CHANGED_KEY, set()).update(cert_ids)
+    db.info.setdefault(_RESOLVE_KEY, set()).update(cert_ids)
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_changes(session, flush_context, instances):
+    changed = session.info.setdefault(_CHANGED_KEY, set())
+    now = datetime.utcnow()
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.Certificate) and obj.id is not None:
+            changed.add(obj.id)
+        elif isinstance(obj, models.Condition) and obj.certificate_id is not None:
+            changed.add(obj.certificate_id)
+            # A condition change is a change to its certificate's representation
+            cert = session.get(models.Certificate, obj.certificate_id)
+            if cert is not None and cert not in session.deleted:
+                cert.updated_at = now
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_collections(session, flush_context):
+    # Objects still carry their ids (and deleted ones their student_id) here
+    student_ids, resolve = set(), session.info.setdefault(_RESOLVE_KEY, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.Certificate):
+            student_ids.add(obj.student_id)
+        elif isinstance(obj, models.Condition) and obj.certificate_id is not None:
+            resolve.add(obj.certificate_id)
+    if student_ids:
+        session.info.setdefault(_COLLECTIONS_KEY, set()).update(_certificate_collections(student_ids))
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_collections(session):
+    session.flush() # the commit's own flush only runs after this hook; a no-op when clean
+    names = session.info.pop(_COLLECTIONS_KEY, set())
+    resolve = list(session.info.pop(_RESOLVE_KEY, ()))
+    if not names and not resolve:
+        return
+    # Certificates loaded in the session need no query (unless expired: that would be one per row)
+    student_ids, unresolved = set(), []
+    for cert_id in resolve:
+        cert = session.identity_map.get(Session.identity_key(models.Certificate, cert_id))
+        if cert is not None and "student_id" in cert.__dict__:
+            student_ids.add(cert.student_id)
+        else:
+            unresolved.append(cert_id)
+    conn = session.connection()
+    for i in range(0, len(unresolved), _BUMP_CHUNK):
+        student_ids.update(conn.execute(
+            select(models.Certificate.student_id).where(models.Certificate.id.in_(unresolved[i:i + _BUMP_CHUNK]))
+        ).scalars())
+    if resolve:
+        names.update(_certificate_collections(student_ids))
+    if names:
+        bump_collections(conn, names)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed(session):
+    changed = session.info.pop(_CHANGED_KEY, None)
+    if changed:
+        institution = database.institution_of(session)
+        for certificate_cache in _certificate_caches:
+            certificate_cache.invalidate(institution, changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop(_CHANGED_KEY, None)
+    session.info.pop(_COLLECTIONS_KEY, None)
+    session.info.pop(_RESOLVE_KEY, None)
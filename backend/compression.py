@@ -0,0 +1,157 @@
+"""
+Response compression, negotiated from Accept-Encoding.
+
+Brotli is used when the client accepts it and the `brotli` package is
+installed, gzip otherwise. Responses are left alone when:
+- their type is not text-like (JSON, NDJSON, plain text, CSV, HTML);
+- they are already encoded, or are 204/304;
+- the whole body arrives at once and is smaller than TRUSTCERT_COMPRESS_MIN_BYTES.
+Server-sent events are never compressed, so each event reaches the browser
+when it is sent. Other streamed bodies (the NDJSON batch verification) are
+compressed chunk by chunk with a sync flush after each, so they stay
+incremental.
+
+A compressed body is a different representation. Strong ETags are therefore
+made weak, which keeps the collection ETags (already weak) and conditional
+requests working for both encodings.
+"""
+import os
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError: # optional; gzip is always available
+    brotli = None
+
+# --- Config ---
+COMPRESS_MIN_BYTES = int(os.getenv("TRUSTCERT_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("TRUSTCERT_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("TRUSTCERT_BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/plain", "text/csv", "text/html")
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """"br", "gzip" or None, from an Accept-Encoding header (q=0 excludes a coding)."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip()] = q
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+class _GzipEncoder:
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+_ENCODERS = {"gzip": _GzipEncoder, "br": _BrotliEncoder}
+
+
+def _compressible(headers: Headers, status: int) -> bool:
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    return (
+        content_type in COMPRESSIBLE_TYPES
+        and "content-encoding" not in headers
+        and status not in (204, 304)
+    )
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _Responder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+class _Responder:
+    """Holds back the start message until the first body chunk shows whether to compress."""
+
+    def __init__(self, app, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.wrapped_send)
+
+    async def wrapped_send(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body, more_body = message.get("body", b""), message.get("more_body", False)
+        if self.encoder is None:
+            headers = MutableHeaders(raw=self.start["headers"])
+            if not _compressible(headers, self.start["status"]) or (not more_body and len(body) < self.minimum_size):
+                if headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES):
+                    headers.add_vary_header("Accept-Encoding")
+                self.passthrough = True
+                await self.send(self.start)
+                await self.send(message)
+                return
+            self.encoder = _ENCODERS[self.encoding]()
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+            if more_body:
+                del headers["content-length"]
+            else:
+                body = self.encoder.finish(body)
+                headers["Content-Length"] = str(len(body))
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            await self.send(self.start)
+
+        data = self.encoder.chunk(body) if more_body else self.encoder.finish(body)
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
@@ -1,14 +1,180 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import os
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+SQLALCHEMY_DATABASE_URL = os.getenv("TRUSTCERT_DATABASE_URL", "sqlite:///./backend/chronovault.db")
+# Read replicas of the primary (comma-separated); see replicas.py
+REPLICA_URLS = [url.strip() for url in os.getenv("TRUSTCERT_DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+
+# Institutions with a database of their own: "<institution>=<url or schema:<name>>",
+# comma-separated; see tenancy.py. The default institution lives in the primary.
+DEFAULT_INSTITUTION = "default"
+
+def _parse_tenants(value: str) -> dict:
+    tenants = {}
+    for entry in value.split(","):
+        if entry.strip():
+            institution, _, target = entry.partition("=")
+            tenants[institution.strip()] = target.strip()
+    return tenants
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./backend/chronovault.db"
+TENANT_DATABASES = _parse_tenants(os.getenv("TRUSTCERT_TENANT_DATABASES", ""))
 
 # Setting `check_same_thread=False` because FastAPI might use multiple threads for requests,
 # and SQLite connection objects can only be used in the creating thread by default.
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def _connect_args(url: str) -> dict:
+    return {"check_same_thread": False} if url.startswith("sqlite") else {}
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=_connect_args(SQLALCHEMY_DATABASE_URL))
+replica_engines = [create_engine(url, connect_args=_connect_args(url)) for url in REPLICA_URLS]
 
 Base = declarative_base()
+
+# --- Async Engine ---
+# Same database, driven through an async driver so read-heavy endpoints can run
+# on the event loop instead of occupying a threadpool worker per request.
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def to_async_url(url: str) -> str:
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+ASYNC_SQLALCHEMY_DATABASE_URL = to_async_url(SQLALCHEMY_DATABASE_URL)
+
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL, connect_args=_connect_args(SQLALCHEMY_DATABASE_URL),
+)
+async_replica_engines = [
+    create_async_engine(to_async_url(url), connect_args=_connect_args(url)) for url in REPLICA_URLS
+]
+
+# --- Tenants ---
+class Tenant:
+    """The engines holding one institution's data (`schema` is set for a Postgres schema tenant)."""
+    __slots__ = ("institution", "engine", "async_engine", "schema")
+
+    def __init__(self, institution: str, engine, async_engine, schema: Optional[str] = None):
+        self.institution = institution
+        self.engine = engine
+        self.async_engine = async_engine
+        self.schema = schema
+
+def _tenant(institution: str, target: str) -> Tenant:
+    if target.startswith("schema:"):
+        schema = target[len("schema:"):]
+        if not SQLALCHEMY_DATABASE_URL.startswith("postgresql"):
+            raise ValueError(f"Tenant {institution}: schema tenants need a PostgreSQL primary database")
+        # A pool of its own on the primary server, with the tenant's schema searched first
+        return Tenant(
+            institution,
+            create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"options": f"-csearch_path={schema}"}),
+            create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, connect_args={"server_settings": {"search_path": schema}}),
+            schema,
+        )
+    return Tenant(
+        institution,
+        create_engine(target, connect_args=_connect_args(target)),
+        create_async_engine(to_async_url(target), connect_args=_connect_args(target)),
+    )
+
+def _tenants() -> dict:
+    targets = list(TENANT_DATABASES.values())
+    if DEFAULT_INSTITUTION in TENANT_DATABASES:
+        raise ValueError(f"The {DEFAULT_INSTITUTION!r} institution always uses TRUSTCERT_DATABASE_URL")
+    if len(set(targets)) != len(targets) or SQLALCHEMY_DATABASE_URL in targets:
+        raise ValueError("Every tenant in TRUSTCERT_TENANT_DATABASES needs a database (or schema) of its own")
+    tenants = {DEFAULT_INSTITUTION: Tenant(DEFAULT_INSTITUTION, engine, async_engine)}
+    for institution, target in TENANT_DATABASES.items():
+        tenants[institution] = _tenant(institution, target)
+    return tenants
+
+tenants = _tenants()
+
+# --- Read/Write Routing ---
+_REPLICA_KEY = "replica"
+_INSTITUTION_KEY = "institution"
+
+class RoutingSession(Session):
+    """
+    A session that reads from `info["replica"]` when a read-only request set
+    it. Writes always go to the primary: the first flush or DML statement
+    drops the replica, and the rest of the session (including reads of what
+    it just wrote) stays on the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get(_REPLICA_KEY)
+        if replica is not None:
+            if not getattr(clause, "is_dml", False):
+                return replica
+            del self.info[_REPLICA_KEY]
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+@event.listens_for(RoutingSession, "before_flush")
+def _flush_to_primary(session, flush_context, instances):
+    session.info.pop(_REPLICA_KEY, None)
+
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: attributes must stay loaded after commit, since
+# touching an expired attribute would need implicit (sync) IO.
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, sync_session_class=RoutingSession,
+    autoflush=False, expire_on_commit=False
+)
+
+def open_session(institution: str = DEFAULT_INSTITUTION, replica: Optional[int] = None) -> Session:
+    """A session on the institution's database, reading from replica_engines[replica] if given."""
+    db = SessionLocal(bind=tenants[institution].engine)
+    db.info[_INSTITUTION_KEY] = institution
+    if replica is not None:
+        db.info[_REPLICA_KEY] = replica_engines[replica]
+    return db
+
+def open_async_session(institution: str = DEFAULT_INSTITUTION, replica: Optional[int] = None) -> AsyncSession:
+    db = AsyncSessionLocal(bind=tenants[institution].async_engine)
+    db.info[_INSTITUTION_KEY] = institution
+    if replica is not None:
+        # The routing happens in the sync session, which binds sync engines
+        db.info[_REPLICA_KEY] = async_replica_engines[replica].sync_engine
+    return db
+
+def institution_of(db) -> str:
+    """The institution a session (sync, async, or the sync one in an event hook) belongs to."""
+    return db.info.get(_INSTITUTION_KEY, DEFAULT_INSTITUTION)
+
+def institution_of_engine(engine) -> str:
+    """The institution whose database a (sync) engine connects to; replicas are the primary's."""
+    for tenant in tenants.values():
+        if engine is tenant.engine or engine is tenant.async_engine.sync_engine:
+            return tenant.institution
+    return DEFAULT_INSTITUTION
+
+# --- Dependencies ---
+# One session per request: FastAPI caches a dependency for the duration of a
+# request, so `auth.get_current_user` and the endpoint both receive this same
+# session (one connection checkout), and the current user stays attached to it.
+# The app-wide tenancy.resolve_institution dependency leaves the request's
+# institution in request.state, and read-only routes (replicas.read_only) the
+# replica to use.
+def get_db(request: Request):
+    db = open_session(
+        getattr(request.state, "institution", DEFAULT_INSTITUTION), getattr(request.state, "db_replica", None)
+    )
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db(request: Request):
+    async with open_async_session(
+        getattr(request.state, "institution", DEFAULT_INSTITUTION), getattr(request.state, "db_replica", None)
+    ) as db:
+        yield db
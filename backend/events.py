@@ -0,0 +1,222 @@
+"""
+Push updates for the dashboards (server-sent events).
+
+Handlers attach events to their session with `emit`, and the events are only
+published once that session commits, so clients never see a change that was
+rolled back. The broker fans them out to every open /events/stream
+subscription on the channels they name:
+
+- "user:<id>"   one user (a student's certificates and records, a targeted faculty's approvals)
+- "role:<role>" every connected user with that role (shared approvals, the admin list)
+
+each qualified by the institution ("<institution>/user:<id>"): user ids are
+only unique within an institution's database, and roles span one institution.
+
+Payloads are deltas (one certificate, one record, an id + new status) that the
+dashboards merge into the lists they already hold instead of re-fetching them.
+
+The broker lives in the worker process: with several workers, a client only
+receives events for changes committed by the worker it is connected to, and
+falls back to its normal fetch on every (re)connect.
+"""
+import asyncio
+import itertools
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import database, models, schemas
+
+# --- Config ---
+EVENTS_QUEUE_SIZE = int(os.getenv("TRUSTCERT_EVENTS_QUEUE_SIZE", "256"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("TRUSTCERT_EVENTS_HEARTBEAT_SECONDS", "15"))
+EVENTS_RETRY_MS = 3000
+
+_PENDING_KEY = "events_pending"
+
+# Event types
+CERTIFICATE_CREATED = "certificate.created"
+CERTIFICATE_STATUS = "certificate.status"
+CERTIFICATE_DELETED = "certificate.deleted"
+APPROVAL_PENDING = "approval.pending"
+APPROVAL_RESOLVED = "approval.resolved"
+RECORD_ADDED = "record.added"
+
+
+# --- Channels ---
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def role_channel(role) -> str:
+    return f"role:{getattr(role, 'value', role)}".lower()
+
+
+def institution_channels(institution: str, channels: Iterable[str]) -> List[str]:
+    return [f"{institution}/{channel}" for channel in channels]
+
+
+def subscriber_channels(user: models.User) -> List[str]:
+    return institution_channels(user.institution_id, [user_channel(user.id), role_channel(user.role)])
+
+
+def approval_channels(target_recipient_id: Optional[int]) -> List[str]:
+    """Who sees an approval in their inbox: the targeted faculty, or every faculty and admin."""
+    if target_recipient_id is not None:
+        return [user_channel(target_recipient_id)]
+    return [role_channel(models.UserRole.FACULTY), role_channel(models.UserRole.ADMIN)]
+
+
+def certificate_channels(student_id: int) -> List[str]:
+    """Who lists a certificate: its student and the admin overview."""
+    return [user_channel(student_id), role_channel(models.UserRole.ADMIN)]
+
+
+# --- Broker ---
+class Subscription:
+    def __init__(self, channels: List[str], loop: asyncio.AbstractEventLoop, max_queue: int):
+        self.channels = channels
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def _deliver(self, message: bytes):
+        # Runs on the subscriber's event loop
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # A client this far behind is told to re-fetch instead of being sent a backlog
+            self.overflowed = True
+
+
+class EventBroker:
+    def __init__(self, max_queue: int = EVENTS_QUEUE_SIZE):
+        self.max_queue = max_queue
+        self._channels: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, channels: List[str]) -> Subscription:
+        """Must be called from the event loop that will read the subscription."""
+        sub = Subscription(channels, asyncio.get_running_loop(), self.max_queue)
+        with self._lock:
+            for channel in channels:
+                self._channels.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            for channel in sub.channels:
+                subs = self._channels.get(channel)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._channels[channel]
+
+    def publish(self, channels: Iterable[str], event_type: str, data: dict):
+        """Thread-safe: called from request threads as well as the event loop."""
+        with self._lock:
+            targets = set()
+            for channel in channels:
+                targets.update(self._channels.get(channel, ()))
+        if not targets:
+            return
+        message = format_event(event_type, data, event_id=next(self._ids))
+        for sub in targets:
+            try:
+                sub.loop.call_soon_threadsafe(sub._deliver, message)
+            except RuntimeError:
+                # Loop already closed (shutdown); the stream is gone
+                self.unsubscribe(sub)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len({sub for subs in self._channels.values() for sub in subs})
+
+
+broker = EventBroker()
+
+
+# --- Wire Format ---
+def format_event(event_type: str, data: dict, event_id: Optional[int] = None) -> bytes:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append("data: " + json.dumps(data, separators=(",", ":"), default=str))
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+async def stream(sub: Subscription, heartbeat: float = EVENTS_HEARTBEAT_SECONDS):
+    """
+    The body of one /events/stream response. Starts with a "ready" event (clients
+    re-fetch on every reconnect after the first), then relays events, sending a
+    comment line when idle so proxies keep the connection open.
+    """
+    try:
+        yield f"retry: {EVENTS_RETRY_MS}\n\n".encode() + format_event("ready", {"channels": sub.channels})
+        while True:
+            try:
+                message = await asyncio.wait_for(sub.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            if sub.overflowed:
+                sub.overflowed = False
+                while not sub.queue.empty():
+                    sub.queue.get_nowait()
+                yield format_event("resync", {})
+                continue
+            yield message
+    finally:
+        broker.unsubscribe(sub)
+
+
+# --- Emitting ---
+def emit(db: Session, channels: Iterable[str], event_type: str, data: dict):
+    """Attach an event to `db`; it is published when `db` commits."""
+    channels = institution_channels(database.institution_of(db), channels)
+    db.info.setdefault(_PENDING_KEY, []).append((channels, event_type, data))
+
+
+def certificate_created(db: Session, cert: models.Certificate, data: dict, conditions: List[models.Condition]):
+    """`data` is the certificate rendered by verification.render_certificate."""
+    emit(db, certificate_channels(cert.student_id), CERTIFICATE_CREATED, data)
+    for cond in conditions:
+        if cond.condition_type == "approval" and not cond.is_met:
+            emit(db, approval_channels(cond.target_recipient_id), APPROVAL_PENDING, data)
+
+
+def certificate_status_changed(db: Session, cert_id: int, student_id: int, status: str):
+    emit(db, certificate_channels(student_id), CERTIFICATE_STATUS, {"id": cert_id, "status": status})
+
+
+def certificate_deleted(db: Session, cert: models.Certificate):
+    channels = certificate_channels(cert.student_id) + [role_channel(models.UserRole.FACULTY)]
+    emit(db, channels, CERTIFICATE_DELETED, {"id": cert.id})
+
+
+def approval_resolved(db: Session, cert_id: int, target_recipient_id: Optional[int]):
+    emit(db, approval_channels(target_recipient_id), APPROVAL_RESOLVED, {"certificate_id": cert_id})
+
+
+def record_added(db: Session, record: models.RecordVersion):
+    data = schemas.RecordResponse.model_validate(record).model_dump(mode="json")
+    emit(db, [user_channel(record.student_id), user_channel(record.issuer_id)], RECORD_ADDED, data)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        for channels, event_type, data in pending:
+            broker.publish(channels, event_type, data)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,85 @@
+"""
+Per-request database instrumentation.
+
+Counts connection checkouts, executed statements and time spent in them for
+the request that is currently being handled. Every statement's latency also
+goes into the metrics histograms (and, in sampled traces, a span), and
+statements slower than TRUSTCERT_SLOW_QUERY_MS into the slow-query log.
+Listeners are attached to the `Engine` class, so every engine (including the
+sync engine behind the async one) is covered.
+"""
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+from . import database, metrics, profiling, tracing
+
+
+class RequestStats:
+    __slots__ = ("queries", "checkouts", "db_seconds", "scope")
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.queries = 0
+        self.checkouts = 0
+        self.db_seconds = 0.0
+        self.scope = scope # ASGI scope, for the matched route once routing has happened
+
+    def route(self) -> Optional[str]:
+        route = self.scope.get("route") if self.scope else None
+        return route.path if route is not None else None
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_db_stats", default=None)
+
+
+def begin_request(scope: Optional[dict] = None):
+    """Start collecting stats for the current request. Returns (stats, token)."""
+    stats = RequestStats(scope)
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+@event.listens_for(Pool, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    stats = _current.get()
+    if stats is not None:
+        stats.checkouts += 1
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _on_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+    context._instrumentation_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _on_executed(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._instrumentation_started
+    operation = metrics.statement_operation(statement)
+    metrics.DB_STATEMENT_LATENCY.observe(elapsed, operation)
+    if tracing.current_trace_id() is not None:
+        end_ns = time.time_ns()
+        tracing.record_span(f"db.{operation}", end_ns - int(elapsed * 1e9), end_ns, statement=statement[:200])
+    stats = _current.get()
+    if stats is not None:
+        stats.db_seconds += elapsed
+    if elapsed * 1000 >= profiling.SLOW_QUERY_MS:
+        profiling.slow_queries.record(
+            statement, parameters, executemany, elapsed,
+            stats.scope.get("method") if stats is not None and stats.scope else None,
+            stats.route() if stats is not None else None,
+            database.institution_of_engine(conn.engine),
+        )
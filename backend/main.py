@@ -1,22 +1,74 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Response
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Response, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
 from typing import List, Optional
-from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta, timezone
 import secrets
 import os
 import hashlib
+import json
+import base64
+import time
 
 # Internal modules
-from . import models, schemas, database, auth, ai_logic
-from algosdk.v2client import algod
+from . import models, schemas, database, auth, ai_logic, migrations, instrumentation, audit, audit_store, cache, verification, anchoring, bundles, events, approvals, metrics, profiling, tracing, serialization, compression, ratelimit, replicas, tenancy
 
 # --- Configuration ---
-ALGOD_ADDRESS = "http://localhost:4001"
-ALGOD_TOKEN = "aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa"
+ALGOD_ADDRESS = os.getenv("ALGOD_ADDRESS", "http://localhost:4001")
+ALGOD_TOKEN = os.getenv("ALGOD_TOKEN", "aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa")
+# Apply pending migrations at startup instead of via `python init_db.py` (single-process dev only)
+AUTO_MIGRATE = os.getenv("TRUSTCERT_AUTO_MIGRATE", "0") == "1"
 
-app = FastAPI(title="ChronoVault Backend (Auth + DB)")
+# --- Algod Client ---
+# Created by the lifespan handler; importing this module builds no clients.
+algod_client = None
+
+def create_algod_client():
+    from algosdk.v2client import algod
+
+    try:
+        return algod.AlgodClient(ALGOD_TOKEN, ALGOD_ADDRESS)
+    except Exception:
+        return None
+
+# --- Lifespan ---
+@asynccontextmanager
+async def lifespan(app):
+    global algod_client
+    if AUTO_MIGRATE:
+        migrations.upgrade_tenants()
+    else:
+        for institution, pending in migrations.pending_tenant_migrations().items():
+            if pending:
+                print(f"WARNING: {len(pending)} pending migration(s) for institution {institution}; "
+                      "run `python init_db.py` (or set TRUSTCERT_AUTO_MIGRATE=1)")
+    algod_client = create_algod_client()
+    audit.sink.start()
+    anchoring.anchorer.start(algod_client)
+    yield
+    anchoring.anchorer.stop()
+    audit.sink.stop()
+    tracing.exporter.stop()
+    for tenant in database.tenants.values():
+        await tenant.async_engine.dispose()
+    for replica in database.async_replica_engines:
+        await replica.dispose()
+
+# Every route runs on the database of the request's institution (see tenancy.py)
+app = FastAPI(
+    title="ChronoVault Backend (Auth + DB)", lifespan=lifespan, dependencies=[Depends(tenancy.resolve_institution)]
+)
+
+# --- Rate Limiting & Admission ---
+# Per-caller token buckets (429) and a per-worker in-flight limit that sheds
+# low-priority traffic first (503); see ratelimit.py. Added before CORS so
+# rejections still carry the CORS headers.
+app.add_middleware(ratelimit.AdmissionMiddleware)
 
 # --- CORS ---
 app.add_middleware(
@@ -27,25 +79,55 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# --- Startup ---
-@app.on_event("startup")
-def startup():
-    # Create Tables if not exist
-    models.Base.metadata.create_all(bind=database.engine)
+# --- Compression ---
+# gzip/brotli for text-like responses over TRUSTCERT_COMPRESS_MIN_BYTES (see compression.py)
+app.add_middleware(compression.CompressionMiddleware)
 
-# --- Algod Client ---
-try:
-    algod_client = algod.AlgodClient(ALGOD_TOKEN, ALGOD_ADDRESS)
-except Exception:
-    algod_client = None
-
-# --- Dependency ---
-def get_db():
-    db = database.SessionLocal()
+# --- Request Instrumentation ---
+# Per-request DB counters (also returned as X-DB-* headers), the /metrics
+# series, the root tracing span and opt-in profiling. Routes are labelled by
+# their path template so label sets stay bounded.
+@app.middleware("http")
+async def request_instrumentation(request, call_next):
+    stats, token = instrumentation.begin_request(request.scope)
+    trace, trace_token = tracing.start_request(request.headers.get("traceparent"), request.method, **{"http.path": request.url.path})
+    profile = (
+        profiling.sampler.start_session(request, auth.request_caller(request.scope).institution)
+        if profiling.should_profile(request) else None
+    )
+    metrics.HTTP_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status_code = 500
     try:
-        yield db
+        response = await call_next(request)
+        status_code = response.status_code
     finally:
-        db.close()
+        elapsed = time.perf_counter() - started
+        metrics.HTTP_IN_FLIGHT.dec()
+        instrumentation.end_request(token)
+        route = stats.route() or "unmatched"
+        if profile is not None:
+            profile_id = profiling.sampler.finish_session(profile, status_code)
+        if trace is not None:
+            tracing.end_request(trace, trace_token, f"{request.method} {route}", status_code)
+        metrics.HTTP_REQUESTS.inc(request.method, route, str(status_code))
+        metrics.HTTP_LATENCY.observe(elapsed, request.method, route)
+        if stats.queries:
+            metrics.HTTP_DB_QUERIES.inc(request.method, route, amount=stats.queries)
+            metrics.HTTP_DB_SECONDS.inc(request.method, route, amount=stats.db_seconds)
+    response.headers["X-DB-Queries"] = str(stats.queries)
+    response.headers["X-DB-Checkouts"] = str(stats.checkouts)
+    if profile is not None:
+        response.headers["X-Profile-Id"] = str(profile_id)
+    if trace is not None:
+        response.headers["X-Trace-Id"] = trace.trace_id
+    return response
+
+# --- Dependency ---
+# Shared with auth.get_current_user so both resolve to the same request session
+get_db = database.get_db
+# Endpoints that only read: served from a read replica when configured (see replicas.py)
+READ_ONLY = [Depends(replicas.read_only)]
 
 # --- Auth Endpoints ---
 
@@ -57,13 +139,17 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Username already registered")
     
     hashed_pw = auth.get_password_hash(user.password)
-    new_user = models.User(username=user.username, email=user.email, hashed_password=hashed_pw, role=user.role)
+    new_user = models.User(
+        username=user.username, email=user.email, hashed_password=hashed_pw, role=user.role,
+        institution_id=database.institution_of(db),
+    )
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
+    replicas.mark_user_written(new_user.username, new_user.institution_id)
     
     # Auto-login
-    access_token = auth.create_access_token(data={"sub": new_user.username})
+    access_token = auth.create_access_token(data={"sub": new_user.username, "inst": new_user.institution_id})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/token", response_model=schemas.Token)
@@ -78,15 +164,15 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
     
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "inst": user.institution_id}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
-@app.get("/users/me", response_model=schemas.User)
+@app.get("/users/me", response_model=schemas.User, dependencies=READ_ONLY)
 async def read_users_me(current_user: models.User = Depends(auth.get_current_user)):
     return current_user
 
-@app.get("/users/role/{role}", response_model=List[schemas.User])
+@app.get("/users/role/{role}", response_model=List[schemas.User], dependencies=READ_ONLY)
 def get_users_by_role(role: str, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
     # Simple validation
     if role.upper() not in models.UserRole.__members__:
@@ -104,16 +190,28 @@ MOCK_IPFS_STORAGE = {
 def read_root():
     return {"message": "TrustCert API is running"}
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/ipfs/{ipfs_hash}")
-def get_ipfs_content(ipfs_hash: str):
+def get_ipfs_content(ipfs_hash: str, request: Request):
     """
     Mock IPFS Gateway.
     In real life this would stream bytes from an IPFS node.
+    Content is addressed by its hash, so the hash is its ETag and it never changes.
     """
-    content = MOCK_IPFS_STORAGE.get(ipfs_hash)
+    etag = f'"{ipfs_hash}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and ipfs_hash in MOCK_IPFS_STORAGE and cache.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    with metrics.timed_call("storage", "get"):
+        content = MOCK_IPFS_STORAGE.get(ipfs_hash)
     if not content:
         raise HTTPException(status_code=404, detail="Content not found on IPFS")
-    return Response(content=content, media_type="text/plain")
+    return Response(content=content, media_type="text/plain", headers=headers)
 
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
@@ -123,7 +221,8 @@ async def upload_file(file: UploadFile = File(...)):
     """
     content = await file.read()
     ipfs_hash = hashlib.sha256(content).hexdigest()[:16]
-    MOCK_IPFS_STORAGE[ipfs_hash] = content
+    with metrics.timed_call("storage", "put"):
+        MOCK_IPFS_STORAGE[ipfs_hash] = content
     return {"filename": file.filename, "ipfs_hash": ipfs_hash}
 
 @app.post("/store-key")
@@ -171,7 +270,8 @@ def release_decryption_key(app_id: int, db: Session = Depends(get_db)):
     is_unlocked = False
     try:
         if algod_client:
-            app_info = algod_client.application_info(app_id)
+            with metrics.timed_call("algod", "application_info"):
+                app_info = algod_client.application_info(app_id, headers=tracing.inject({}))
             global_state = app_info['params']['global-state']
             # Parse logic...
             # Assume success if variable IsUnlocked == 1
@@ -200,7 +300,7 @@ def release_decryption_key(app_id: int, db: Session = Depends(get_db)):
 
     return {"status": "unlocked", "key": vault.encrypted_key}
 
-@app.get("/my-vaults")
+@app.get("/my-vaults", dependencies=READ_ONLY)
 def get_my_vaults(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user)
@@ -240,7 +340,8 @@ def create_certificate(
          pass
 
     # 1. Resolve Student
-    student = db.query(models.User).filter(models.User.username == cert.student_username).first()
+    with tracing.span("certificate.lookup_student"):
+        student = db.query(models.User).filter(models.User.username == cert.student_username).first()
     if not student:
         raise HTTPException(status_code=404, detail="Student user not found")
 
@@ -310,7 +411,6 @@ def create_certificate(
     
     # Generate Key
     # simple random key
-    import secrets
     decryption_key = secrets.token_hex(16) 
     
     # Python generic AES encrypt is complex without libs like pycryptodome.
@@ -361,23 +461,27 @@ def create_certificate(
     # 3. Update Frontend `DashboardStudent.jsx` to try decrypt, but if fail, show/download raw.
     
     ipfs_content = doc_content
-    ipfs_hash = hashlib.sha256(ipfs_content.encode()).hexdigest()[:16]
-    MOCK_IPFS_STORAGE[ipfs_hash] = ipfs_content.encode() # Store bytes
+    with tracing.span("certificate.hash_document"):
+        ipfs_hash = hashlib.sha256(ipfs_content.encode()).hexdigest()[:16]
+    with metrics.timed_call("storage", "put"):
+        MOCK_IPFS_STORAGE[ipfs_hash] = ipfs_content.encode() # Store bytes
     
     new_cert = models.Certificate(
         title=cert.title,
         student_id=student.id,
         issuer_id=current_user.id,
+        institution_id=current_user.institution_id,
         encrypted_ipfs_hash=ipfs_hash,
         decryption_key="mock_key_plain_text", # storing a dummy key
         status="LOCKED",
         created_at=datetime.utcnow()
     )
-    db.add(new_cert)
-    db.commit()
-    db.refresh(new_cert)
+    with tracing.span("certificate.insert"):
+        db.add(new_cert)
+        db.flush() # assigns new_cert.id; committed with its conditions below
     
     # 4. Create Conditions
+    new_conditions = []
     for cond_data in parsed_conditions:
         new_cond = models.Condition(
             certificate_id=new_cert.id,
@@ -389,77 +493,192 @@ def create_certificate(
             target_recipient_id=cond_data.get("target_recipient_id") # Save restricted recipient
         )
         db.add(new_cond)
+        new_conditions.append(new_cond)
     
-    db.commit()
-    db.refresh(new_cert)
-    db.commit()
-    db.refresh(new_cert)
+    # Queue the certificate digest for Merkle-batched on-chain anchoring
+    anchoring.record_certificate(db, new_cert)
     
-    # Audit Log
+    # Audit Log (committed together with the conditions)
     log_action(db, "CREATE_CERT", str(new_cert.id), f"Created certificate for {cert.student_username}", current_user.username)
     
+    # Queue approvals in the faculty inbox and push to the student, the admin list and the approvers
+    with tracing.span("certificate.fan_out"):
+        cert_payload = verification.render_certificate(new_cert, student.username, new_conditions)
+        approvals.queue_approvals(db, new_cert.id, new_conditions, cert_payload)
+        events.certificate_created(db, new_cert, cert_payload, new_conditions)
+    
+    with tracing.span("certificate.commit", conditions=len(new_conditions)):
+        db.commit()
+        db.refresh(new_cert)
+    
     return new_cert
 
-@app.get("/my-certificates", response_model=List[schemas.CertificateResponse])
-def get_my_certificates(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+@app.get("/my-certificates", response_model=List[schemas.CertificateResponse], dependencies=READ_ONLY)
+async def get_my_certificates(
+    request: Request,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: models.User = Depends(auth.get_current_user_async)
 ):
-    # Sort by Created At Descending (Latest first)
-    certs = db.query(models.Certificate).filter(models.Certificate.student_id == current_user.id).order_by(models.Certificate.created_at.desc()).all()
-    
-    # Manually attach student username (though usually frontend knows it, good for completeness)
-    for c in certs:
-        c.student_username = current_user.username
-        
-    return certs
+    # Unchanged since the client's copy: 304 without loading anything
+    collection = cache.student_certificates(current_user.id)
+    etag = cache.collection_etag(collection, await db.execute(cache.collection_version_query(collection)))
+    unchanged = cache.not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
 
-@app.get("/certificates/public/{cert_id}", response_model=schemas.CertificateResponse)
-def verify_certificate_public(
+    # Sort by Created At Descending (Latest first); columns only, see serialization.py
+    mine = models.Certificate.student_id == current_user.id
+    certs = (await db.execute(
+        serialization.certificates_query(mine, order_by=models.Certificate.created_at.desc())
+    )).all()
+    conditions = (await db.execute(serialization.conditions_query(mine))).all()
+    return serialization.JSONListResponse(
+        serialization.certificate_list(certs, conditions), headers=cache.validator_headers(etag)
+    )
+
+@app.get("/certificates/public/{cert_id}", response_model=schemas.CertificateResponse, dependencies=READ_ONLY)
+async def verify_certificate_public(
     cert_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    format: Optional[str] = None,
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     """
     Public endpoint for verifiers. No Auth required.
+    Served from the response cache; supports ETag / Last-Modified conditional GETs.
+    `?format=bundle` returns a signed bundle that can be checked offline
+    with backend/bundle_verifier.py and the key from /bundles/public-key.
     """
-    cert = db.query(models.Certificate).filter(models.Certificate.id == cert_id).first()
-    if not cert:
-        raise HTTPException(status_code=404, detail="Certificate not found")
-    
-    # Attach student username for display
-    cert.student_username = cert.student.username
-    return cert
+    institution = database.institution_of(db)
+    if format == "bundle":
+        entry = bundles.cached_bundle(institution, cert_id)
+        if entry is None:
+            entry = (await bundles.build_bundles(db, [cert_id])).get(cert_id)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Certificate not found")
+        return cache.conditional_response(request, entry)
 
-@app.get("/pending-approvals", response_model=List[schemas.CertificateResponse])
-def get_pending_approvals(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
-):
-    # Retrieve all certificates with unmet 'approval' conditions
-    # This is a bit complex in SQL, for MVP: get all certs, filter in python or basic join
-    # optimized: join Conditions
-    
-    if current_user.role not in [models.UserRole.FACULTY, models.UserRole.ADMIN]:
-         raise HTTPException(status_code=403, detail="Not authorized")
+    entry = cache.public_certificates.get(institution, cert_id)
+    if entry is not None and not entry.is_fresh():
+        # Possibly changed by another worker: revalidate with one primary-key lookup
+        result = await db.execute(
+            select(models.Certificate.updated_at, models.Certificate.created_at)
+            .filter(models.Certificate.id == cert_id)
+        )
+        row = result.first()
+        if row is not None and (row.updated_at or row.created_at) == entry.version:
+            entry.mark_checked()
+        else:
+            cache.public_certificates.invalidate(institution, [cert_id])
+            entry = None
 
-    query = db.query(models.Certificate).join(models.Condition).filter(
-        models.Condition.condition_type == 'approval',
-        models.Condition.is_met == False
-    )
-    
-    # Filter by target recipient if set
-    # Logic: Show if (target_recipient_id IS NULL) OR (target_recipient_id == current_user.id)
-    # Since SQLAlchemy OR syntax is a bit verbose, we can do it in python for MVP or use or_
-    from sqlalchemy import or_
-    
-    query = query.filter(
-        or_(
-            models.Condition.target_recipient_id == None,
-            models.Condition.target_recipient_id == current_user.id
+    if entry is None:
+        result = await db.execute(
+            select(models.Certificate)
+            .options(joinedload(models.Certificate.student), selectinload(models.Certificate.conditions))
+            .filter(models.Certificate.id == cert_id)
         )
+        cert = result.scalars().first()
+        if not cert:
+            raise HTTPException(status_code=404, detail="Certificate not found")
+        
+        # Attach student username for display
+        entry = verification.render_public_certificate(cert, cert.student.username)
+        cache.public_certificates.put(institution, cert_id, entry)
+
+    return cache.conditional_response(request, entry)
+
+@app.get("/certificates/public/{cert_id}/anchor", dependencies=READ_ONLY)
+async def get_certificate_anchor(
+    cert_id: int,
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    """
+    Merkle inclusion proof for a certificate's on-chain anchor. No Auth required.
+    `verified` is checked locally: the digest is recomputed from the stored
+    certificate and the proof is folded up to the batch root.
+    """
+    result = await db.execute(
+        select(models.Certificate, models.CertificateAnchor, models.AnchorBatch)
+        .join(models.CertificateAnchor, models.CertificateAnchor.certificate_id == models.Certificate.id)
+        .outerjoin(models.AnchorBatch, models.AnchorBatch.id == models.CertificateAnchor.batch_id)
+        .filter(models.Certificate.id == cert_id)
+    )
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="No anchor record for this certificate")
+    cert, anchor, batch = row
+
+    digest = anchoring.certificate_digest(cert)
+    if batch is None or batch.merkle_root is None:
+        return {"certificate_id": cert_id, "digest": digest, "status": "QUEUED", "verified": False}
+
+    proof = json.loads(anchor.proof)
+    return {
+        "certificate_id": cert_id,
+        "digest": digest,
+        "status": batch.status,
+        "batch_id": batch.id,
+        "leaf_index": anchor.leaf_index,
+        "proof": proof,
+        "merkle_root": batch.merkle_root,
+        "txid": batch.txid,
+        "anchored_at": batch.anchored_at,
+        "verified": digest == anchor.digest and anchoring.verify_proof(digest, proof, batch.merkle_root),
+    }
+
+@app.get("/bundles/public-key")
+def get_bundle_public_key():
+    """Issuer key for offline bundle verification. Verifiers fetch and pin it once."""
+    return {
+        "alg": "Ed25519",
+        "key_id": bundles.signer.key_id(),
+        "public_key": base64.b64encode(bundles.signer.public_key_raw()).decode(),
+    }
+
+@app.post("/certificates/public/verify-batch")
+async def verify_certificates_batch(request: Request, format: Optional[str] = None):
+    """
+    Bulk public verification. No Auth required.
+    Body: JSON {"ids": [...]} or text/csv (certificate id in the first column).
+    Streams NDJSON back, one line per requested id, in request order:
+        {"id": 7, "found": true, "certificate": {...}}  /  {"id": 8, "found": false}
+    With `?format=bundle`, hits carry a signed "bundle" instead of "certificate".
+    Ids are resolved a chunk at a time with set-based queries.
+    """
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("text/csv"):
+            ids = await verification.read_csv_ids(request.stream())
+        else:
+            payload = schemas.BatchVerifyRequest.model_validate_json(await request.body())
+            ids = verification.parse_ids(payload.ids)
+    except verification.BatchTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Expected JSON {\"ids\": [...]} or a CSV of certificate ids")
+
+    return StreamingResponse(
+        verification.stream_batch_results(ids, as_bundle=(format == "bundle"), institution=request.state.institution),
+        media_type="application/x-ndjson"
     )
 
-    return query.all()
+@app.get("/pending-approvals", response_model=List[schemas.CertificateResponse], dependencies=READ_ONLY)
+async def get_pending_approvals(
+    limit: int = approvals.INBOX_PAGE_SIZE,
+    before_id: Optional[int] = None,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: models.User = Depends(auth.get_current_user_async)
+):
+    """
+    The caller's approval queue, newest first, served from the materialized inbox:
+    approvals targeted at them plus untargeted ones. Page with `before_id`.
+    """
+    if current_user.role not in [models.UserRole.FACULTY, models.UserRole.ADMIN]:
+         raise HTTPException(status_code=403, detail="Not authorized")
+
+    result = await db.execute(approvals.inbox_page_query(current_user.id, limit, before_id))
+    return approvals.inbox_response(result.scalars())
 
 @app.post("/certificates/{cert_id}/approve-condition/{condition_type}")
 def approve_condition(
@@ -469,34 +688,73 @@ def approve_condition(
     current_user: models.User = Depends(auth.get_current_user)
 ):
     # 1. Find Certificate & Condition
-    cert = db.query(models.Certificate).filter(models.Certificate.id == cert_id).first()
-    if not cert:
+    cert_status = db.query(models.Certificate.status).filter(models.Certificate.id == cert_id).scalar()
+    if cert_status is None:
         raise HTTPException(status_code=404, detail="Certificate not found")
         
-    # Find specific condition
-    # Retrieve all conditions first to check
-    conditions = db.query(models.Condition).filter(models.Condition.certificate_id == cert_id).all()
-    target_cond = next((c for c in conditions if c.condition_type == condition_type), None)
+    # Find specific condition(s)
+    target_conds = db.query(
+        models.Condition.id, models.Condition.target_recipient_id
+    ).filter(
+        models.Condition.certificate_id == cert_id,
+        models.Condition.condition_type == condition_type
+    ).order_by(models.Condition.id).all()
     
-    if not target_cond:
+    if not target_conds:
          raise HTTPException(status_code=404, detail="Condition type not found on this certificate")
 
-    # 2. Verify Permission (Mock: If condition is 'approval', check if user is Faculty)
+    # 2. Verify Permission: same rule as the batch path (untargeted approvals or those targeted at the caller)
+    approved = False
     if condition_type == "approval":
-        if current_user.role != models.UserRole.FACULTY and current_user.role != models.UserRole.ADMIN:
-             pass # Strict check disabled for MVP demo flow ease
+        if current_user.role not in [models.UserRole.FACULTY, models.UserRole.ADMIN]:
+            raise HTTPException(status_code=403, detail="Not authorized")
+        actionable = [c for c in target_conds if c.target_recipient_id in (None, current_user.id)]
+        if not actionable:
+            raise HTTPException(status_code=403, detail="This approval is assigned to another faculty member")
         
-        target_cond.is_met = True
-        target_cond.current_value = f"Approved by {current_user.username}"
-        db.commit()
+        # Compare-and-set: only one of several concurrent approvals flips it
+        for cond in actionable:
+            if approvals.set_condition_met(db, cond.id, f"Approved by {current_user.username}"):
+                approved = True
+                approvals.dequeue_conditions(db, [cond.id])
+                events.approval_resolved(db, cert_id, cond.target_recipient_id)
+                log_action(db, "APPROVE_CONDITION", str(cert_id), "Approval granted", current_user.username)
+        if approved:
+            approvals.touch_certificates(db, [cert_id])
 
-    # 3. Check if ALL met
-    all_met = all(c.is_met for c in conditions)
-    if all_met:
-        cert.status = "UNLOCKED"
-        db.commit()
+    # 3. Unlock if ALL met (conditional UPDATE, so concurrent callers cannot both unlock)
+    if cert_status != "UNLOCKED" and approvals.unlock_if_all_met(db, [cert_id]):
+        cert_status = "UNLOCKED"
+    db.commit()
         
-    return {"status": "success", "cert_status": cert.status}
+    return {"status": "success", "cert_status": cert_status, "approved": approved}
+
+@app.post("/certificates/approve-batch", response_model=schemas.BatchApproveResponse)
+def approve_conditions_batch(
+    payload: schemas.BatchApproveRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """
+    Approve many certificates in one transaction (faculty approval queues).
+    Only approvals the caller may act on are flipped: untargeted ones or those
+    targeted at them. Every id gets its own result.
+    """
+    if current_user.role not in [models.UserRole.FACULTY, models.UserRole.ADMIN]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    try:
+        results = approvals.approve_batch(db, payload.certificate_ids, current_user)
+    except approvals.BatchTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    db.commit()
+
+    approved = [r for r in results if r["result"] == approvals.APPROVED]
+    return {
+        "approved": len(approved),
+        "unlocked": sum(1 for r in approved if r["cert_status"] == "UNLOCKED"),
+        "results": results,
+    }
 
 @app.post("/certificates/{cert_id}/verify-conditions")
 def verify_conditions(
@@ -507,13 +765,18 @@ def verify_conditions(
     """
     Trigger re-evaluation of all conditions for a certificate.
     Useful for Time-based conditions or auto-updates.
+    Conditions are evaluated on a snapshot and then flipped with compare-and-set
+    UPDATEs, so concurrent evaluations and approvals never overwrite each other.
     """
-    cert = db.query(models.Certificate).filter(models.Certificate.id == cert_id).first()
+    cert = db.query(models.Certificate.student_id, models.Certificate.status).filter(models.Certificate.id == cert_id).first()
     if not cert:
         raise HTTPException(status_code=404, detail="Certificate not found")
     
-    conditions = db.query(models.Condition).filter(models.Condition.certificate_id == cert_id).all()
+    conditions = db.query(
+        models.Condition.id, models.Condition.condition_type, models.Condition.target_value, models.Condition.is_met
+    ).filter(models.Condition.certificate_id == cert_id).order_by(models.Condition.id).all()
     
+    newly_met = {} # condition id -> current_value
     for cond in conditions:
         if cond.is_met:
             continue
@@ -532,30 +795,26 @@ def verify_conditions(
                     continue # Invalid format
             
             if datetime.now() >= target_date:
-                cond.is_met = True
-                cond.current_value = datetime.now().isoformat()
+                newly_met[cond.id] = datetime.now().isoformat()
         
         
         # 2. Grade/Attendance Logic using Versioned Records
         if cond.condition_type in ["attendance", "grade"]:
-             # Fetch all records for this category
              # Note: category strings must match what is stored in records
              # For this demo, we assume "Attendance" and "Grade" are the categories
              category_map = {"attendance": "Attendance", "grade": "Grade"}
              target_cat = category_map.get(cond.condition_type, cond.condition_type.capitalize())
              
-             records = db.query(models.RecordVersion).filter(
+             # Simple Logic: Check if ANY record meets the criteria (or average)
+             # For MVP: Check if effective value >= target
+             # We take the LATEST record as the "Current Status"
+             latest_record = db.query(models.RecordVersion).filter(
                  models.RecordVersion.student_id == cert.student_id,
                  models.RecordVersion.category == target_cat
-             ).all()
+             ).order_by(models.RecordVersion.id.desc()).first()
              
-             if not records:
+             if not latest_record:
                  continue
-                 
-             # Simple Logic: Check if ANY record meets the criteria (or average)
-             # For MVP: Check if effective value >= target
-             # We take the LATEST record as the "Current Status"
-             latest_record = sorted(records, key=lambda x: x.id, reverse=True)[0]
              
              try:
                  current_val = float(latest_record.value)
@@ -563,26 +822,28 @@ def verify_conditions(
                  
                  # Operator check (Assuming '>' since most conditions are "min requirement")
                  if current_val >= target_val:
-                     cond.is_met = True
-                     cond.current_value = str(current_val)
+                     newly_met[cond.id] = str(current_val)
              except ValueError:
                  # String comparison (e.g. Grade 'A')
                  if latest_record.value == cond.target_value:
-                     cond.is_met = True
-                     cond.current_value = latest_record.value
+                     newly_met[cond.id] = latest_record.value
     
-    db.commit()
+    # Flip what we found met; a condition flipped concurrently is simply skipped
+    changed = [cond_id for cond_id, value in newly_met.items() if approvals.set_condition_met(db, cond_id, value)]
+    if changed:
+        approvals.touch_certificates(db, [cert_id])
 
     # Check if ALL conditions are now met
-    all_met = all(c.is_met for c in conditions)
-    if all_met and cert.status != "UNLOCKED":
-        cert.status = "UNLOCKED"
-        db.commit()
+    cert_status = cert.status
+    if cert_status != "UNLOCKED" and approvals.unlock_if_all_met(db, [cert_id]):
+        cert_status = "UNLOCKED"
+    db.commit()
     
     return {
         "status": "success", 
-        "cert_status": cert.status, 
-        "conditions": [{"type": c.condition_type, "met": c.is_met} for c in conditions]
+        "cert_status": cert_status, 
+        # In id order, like the certificate lists, so clients can merge them by position
+        "conditions": [{"type": c.condition_type, "met": bool(c.is_met or c.id in newly_met)} for c in conditions]
     }
 
 @app.delete("/certificates/{cert_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -600,47 +861,145 @@ def delete_certificate(
         
     # Delete associated conditions first (cascade usually handles this but being explicit)
     db.query(models.Condition).filter(models.Condition.certificate_id == cert_id).delete()
+    db.query(models.CertificateAnchor).filter(models.CertificateAnchor.certificate_id == cert_id).delete()
+    approvals.dequeue_certificates(db, [cert_id])
     db.delete(cert)
-    db.commit()
     
     # Audit Log
     log_action(db, "DELETE_CERT", str(cert_id), "Certificate record deleted", current_user.username)
+    events.certificate_deleted(db, cert)
+    db.commit()
 
     return None
 
+# --- Push Updates ---
+
+@app.get("/events/stream")
+async def stream_events(request: Request, token: Optional[str] = None):
+    """
+    Server-sent events for the dashboards: per-user deltas (certificate created /
+    unlocked / deleted, approval pending / resolved, record added).
+    EventSource cannot send headers, so the access token may be passed as `?token=`.
+    """
+    if token is None:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+
+    # `?token=` is not seen by resolve_institution: take the institution from the token itself
+    identity = auth.token_identity(token)
+    institution = identity[1] if identity else database.DEFAULT_INSTITUTION
+    if institution not in database.tenants:
+        raise HTTPException(status_code=404, detail=f"Unknown institution: {institution}")
+
+    # Short-lived session: the stream must not hold a connection while it is open
+    async with database.open_async_session(institution) as db:
+        user = await auth.user_from_token_async(token, db)
+    subscription = events.broker.subscribe(events.subscriber_channels(user))
+
+    return StreamingResponse(
+        events.stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # --- Audit Log Helper ---
 def log_action(db: Session, action: str, target_id: str, details: str, actor: str):
-    new_log = models.AuditLog(
-        action=action,
-        target_id=target_id,
-        details=details,
-        actor_username=actor
-    )
-    db.add(new_log)
-    db.commit()
+    """
+    Attach an audit entry to `db`. It is appended to the audit store once the
+    caller commits, directly or via the batched writer depending on audit.AUDIT_MODE.
+    """
+    audit.sink.record(db, action, target_id, details, actor)
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Audit timestamps are stored as naive UTC (datetime.utcnow)
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
 
 @app.get("/audit-logs", response_model=List[schemas.AuditLogResponse])
 def get_audit_logs(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    limit: int = 100,
+    before_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: models.User = Depends(auth.get_current_user),
+    store: audit_store.SegmentedAuditStore = Depends(audit.get_audit_store),
 ):
+    """
+    Newest entries first. Pass `before_id` to page backwards through the tail,
+    or `start`/`end` to scan a time window; only segments in the window are read.
+    """
     if current_user.role != models.UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Only Admins can view audit logs")
-    return db.query(models.AuditLog).order_by(models.AuditLog.timestamp.desc()).all()
+    limit = max(1, min(limit, 1000))
+    if start or end:
+        entries = store.scan(_naive_utc(start) or datetime.min, _naive_utc(end) or datetime.max, limit=limit)
+    else:
+        entries = store.tail(limit=limit, before_id=before_id)
+    return serialization.JSONListResponse(serialization.audit_log_list(entries))
+
+# --- Profiling & Slow Queries (admin) ---
+def require_admin(current_user: models.User = Depends(auth.get_current_user)) -> models.User:
+    if current_user.role != models.UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin only")
+    return current_user
+
+@app.get("/admin/profiling", response_model=schemas.ProfilingSettings)
+def get_profiling_settings(current_user: models.User = Depends(require_admin)):
+    return profiling.settings.as_dict()
+
+@app.put("/admin/profiling", response_model=schemas.ProfilingSettings)
+def update_profiling_settings(update: schemas.ProfilingSettings, current_user: models.User = Depends(require_admin)):
+    """Sample `sample_rate` of the requests under `path_prefix` (this process only)."""
+    profiling.settings.enabled = update.enabled
+    profiling.settings.path_prefix = update.path_prefix
+    profiling.settings.sample_rate = update.sample_rate
+    profiling.settings.interval_ms = update.interval_ms
+    return profiling.settings.as_dict()
 
-@app.get("/certificates/all", response_model=List[schemas.CertificateResponse])
+@app.get("/admin/profiles")
+def list_profiles(request: Request, current_user: models.User = Depends(require_admin)):
+    """Stored profiles of the caller's institution, newest first, without their stacks."""
+    return [
+        {k: v for k, v in profile.items() if k not in ("top", "folded")}
+        for profile in profiling.sampler.for_institution(request.state.institution)
+    ]
+
+@app.get("/admin/profiles/{profile_id}")
+def get_profile(request: Request, profile_id: int, format: str = "json", current_user: models.User = Depends(require_admin)):
+    """`format=folded` returns the stacks in the folded format flamegraph tools read."""
+    profile = profiling.sampler.get(profile_id, request.state.institution)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "folded":
+        return Response(content="\n".join(profile["folded"]) + "\n", media_type="text/plain")
+    return profile
+
+@app.get("/admin/slow-queries")
+def get_slow_queries(request: Request, limit: int = 50, current_user: models.User = Depends(require_admin)):
+    """The caller's institution's slow queries, explained against its own database."""
+    return profiling.slow_queries.entries(request.state.institution, limit)
+
+@app.get("/certificates/all", response_model=List[schemas.CertificateResponse], dependencies=READ_ONLY)
 def get_all_certificates(
+    request: Request,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     if current_user.role != models.UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Only Admin can view all certificates")
-    
-    certs = db.query(models.Certificate).order_by(models.Certificate.id.desc()).all()
-    # Populate Username
-    for c in certs:
-        c.student_username = c.student.username
-    return certs
+
+    etag = cache.collection_etag(cache.CERTIFICATES, db.execute(cache.collection_version_query(cache.CERTIFICATES)))
+    unchanged = cache.not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+
+    certs = db.execute(serialization.certificates_query()).all()
+    conditions = db.execute(serialization.conditions_query()).all()
+    return serialization.JSONListResponse(
+        serialization.certificate_list(certs, conditions), headers=cache.validator_headers(etag)
+    )
 
 # --- Record & Governance Endpoints ---
 
@@ -664,14 +1023,11 @@ def add_record(
         models.RecordVersion.category == record.category
     ).order_by(models.RecordVersion.id.desc()).first()
     
-    prev_hash = last_record.data_hash if last_record else "GENESIS_HASH"
+    prev_hash = last_record.data_hash if last_record else models.RecordVersion.GENESIS_HASH
     
     # 2. Compute New Hash
-    # Hash(Category + Value + Timestamp + PreviousHash)
-    # Using simple concatenation for MVP
     timestamp = datetime.utcnow()
-    raw_data = f"{record.category}{record.value}{timestamp.isoformat()}{prev_hash}"
-    new_hash = hashlib.sha256(raw_data.encode()).hexdigest()
+    new_hash = models.RecordVersion.compute_hash(record.category, record.value, timestamp, prev_hash)
     
     # 3. Save
     new_record = models.RecordVersion(
@@ -684,15 +1040,18 @@ def add_record(
         data_hash=new_hash
     )
     db.add(new_record)
-    db.commit()
-    db.refresh(new_record)
+    db.flush() # Assigns new_record.id for the audit entry
     
     # Audit Log
     log_action(db, "CREATE_RECORD", str(new_record.id), f"Added {record.category} record for {student.username}", current_user.username)
+    events.record_added(db, new_record)
+    
+    db.commit()
+    db.refresh(new_record)
     
     return new_record
 
-@app.get("/records/my-history", response_model=List[schemas.RecordResponse])
+@app.get("/records/my-history", response_model=List[schemas.RecordResponse], dependencies=READ_ONLY)
 def get_my_records(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user)
@@ -700,50 +1059,37 @@ def get_my_records(
     if current_user.role != models.UserRole.FACULTY:
          raise HTTPException(status_code=403, detail="Only Faculty can view their record history")
          
-    return db.query(models.RecordVersion).filter(
-        models.RecordVersion.issuer_id == current_user.id
-    ).order_by(models.RecordVersion.timestamp.desc()).all()
+    records = db.execute(serialization.records_query(
+        models.RecordVersion.issuer_id == current_user.id, order_by=models.RecordVersion.timestamp.desc()
+    )).all()
+    return serialization.JSONListResponse(serialization.as_dicts(serialization.RECORD_KEYS, records))
 
-@app.get("/certificates/pending-approval", response_model=List[schemas.CertificateResponse])
-def get_pending_approvals(
+@app.get("/certificates/pending-approval", response_model=List[schemas.CertificateResponse], dependencies=READ_ONLY)
+def get_pending_approval_certificates(
+    limit: int = approvals.INBOX_PAGE_SIZE,
+    before_id: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
+    """Same queue as /pending-approvals (kept for the faculty dashboard)."""
     if current_user.role not in [models.UserRole.FACULTY, models.UserRole.ADMIN]:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    # complex join to interpret "pending approval"
-    # Find certificates with a Condition of type 'approval' that is NOT met
-    # AND (target_recipient_id is NULL OR target_recipient_id == me)
-    
-    # 1. Get Cert IDs with unmet approval conditions targeting me
-    subquery = db.query(models.Condition.certificate_id).filter(
-        models.Condition.condition_type == 'approval',
-        models.Condition.is_met == False,
-        (models.Condition.target_recipient_id == None) | (models.Condition.target_recipient_id == current_user.id)
-    ).subquery()
-    
-    certs = db.query(models.Certificate).filter(
-        models.Certificate.id.in_(subquery)
-    ).all()
-    
-    # Populate Username
-    for c in certs:
-        c.student_username = c.student.username
-        
-    return certs
+    return approvals.inbox_response(db.execute(approvals.inbox_page_query(current_user.id, limit, before_id)).scalars())
 
-@app.get("/records/{student_username}", response_model=List[schemas.RecordResponse])
-def get_student_records(
+@app.get("/records/{student_username}", response_model=List[schemas.RecordResponse], dependencies=READ_ONLY)
+async def get_student_records(
     student_username: str,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: models.User = Depends(auth.get_current_user_async)
 ):
-    student = db.query(models.User).filter(models.User.username == student_username).first()
+    result = await db.execute(select(models.User).filter(models.User.username == student_username))
+    student = result.scalars().first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
-    return db.query(models.RecordVersion).filter(models.RecordVersion.student_id == student.id).order_by(models.RecordVersion.id.desc()).all()
+    result = await db.execute(serialization.records_query(models.RecordVersion.student_id == student.id))
+    return serialization.JSONListResponse(serialization.as_dicts(serialization.RECORD_KEYS, result.all()))
 
 @app.post("/governance/create", response_model=schemas.PolicyResponse)
 def create_policy(
@@ -0,0 +1,200 @@
+"""
+Prometheus metrics, exposed on /metrics in the text exposition format.
+
+Kept dependency-free: counters, gauges and histograms are plain dicts keyed by
+label values behind one lock per metric, so recording costs a dict lookup and
+an add. Histograms store per-bucket counts and are only made cumulative when
+scraped.
+
+What is recorded:
+- HTTP: per-route request counts by status, latency histograms, in-flight
+  requests, and per-route SQL statement counts and time (request middleware
+  in main.py, route = the matched path template).
+- SQL: per-statement latency by operation (instrumentation.py engine hooks).
+- External calls: latency and failures of algod and blob storage calls,
+  wrapped with `timed_call` (which also opens a tracing span).
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from . import tracing
+
+# Latency buckets in seconds
+HTTP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+EXTERNAL_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Iterable[float] = HTTP_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (+Inf last)..., sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            slots = self._values.get(labels)
+            if slots is None:
+                slots = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            slots[index] += 1
+            slots[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, list(slots)) for labels, slots in self._values.items())
+        lines = self.header()
+        for labels, slots in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), slots):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            base = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{base} {_format_value(slots[-1])}")
+            lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> bytes:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode()
+
+
+registry = Registry()
+
+# --- HTTP ---
+HTTP_REQUESTS = Counter(
+    "trustcert_http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status")
+)
+HTTP_LATENCY = Histogram(
+    "trustcert_http_request_duration_seconds", "Time until the response headers were ready.", ("method", "route"),
+    buckets=HTTP_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge("trustcert_http_requests_in_flight", "Requests currently being handled.")
+HTTP_DB_QUERIES = Counter(
+    "trustcert_http_db_queries_total", "SQL statements executed while handling a route.", ("method", "route")
+)
+HTTP_DB_SECONDS = Counter(
+    "trustcert_http_db_seconds_total", "Time spent in SQL statements while handling a route.", ("method", "route")
+)
+HTTP_REJECTED = Counter(
+    "trustcert_http_rejected_total", "Requests turned away by rate limiting (429) or admission control (503).",
+    ("route_class", "reason"),
+)
+RATE_LIMIT_STORE_ERRORS = Counter(
+    "trustcert_rate_limit_store_errors_total", "Rate limit store failures; the request was let through unlimited.",
+)
+
+# --- SQL ---
+DB_STATEMENT_LATENCY = Histogram(
+    "trustcert_db_statement_duration_seconds", "SQL statement execution time by operation.", ("operation",),
+    buckets=DB_BUCKETS,
+)
+DB_READ_ROUTING = Counter(
+    "trustcert_db_read_routing_total", "Read-only requests by where they were sent (replica, or primary when sticky).",
+    ("target",),
+)
+
+# --- External calls ---
+EXTERNAL_LATENCY = Histogram(
+    "trustcert_external_call_duration_seconds", "Calls to algod and blob storage.", ("service", "operation"),
+    buckets=EXTERNAL_BUCKETS,
+)
+EXTERNAL_ERRORS = Counter(
+    "trustcert_external_call_errors_total", "Failed calls to algod and blob storage.", ("service", "operation")
+)
+
+
+@contextmanager
+def timed_call(service: str, operation: str):
+    """Time (and trace) a call to an external dependency, counting it as an error if it raises."""
+    started = time.perf_counter()
+    try:
+        with tracing.span(f"{service}.{operation}"):
+            yield
+    except Exception:
+        EXTERNAL_ERRORS.inc(service, operation)
+        raise
+    finally:
+        EXTERNAL_LATENCY.observe(time.perf_counter() - started, service, operation)
+
+
+def statement_operation(statement: str) -> str:
+    """SELECT / INSERT / UPDATE / DELETE, or OTHER (PRAGMA, DDL, savepoints...)."""
+    keyword = statement.lstrip()[:6].upper()
+    return keyword if keyword in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
@@ -0,0 +1,248 @@
+"""
+Minimal schema migration runner.
+
+`Base.metadata.create_all` only creates missing tables; it never touches a
+table that already exists, so new columns and indexes never reach an existing
+database. Each migration here is a numbered step applied once, in order, and
+recorded in the `schema_migrations` table.
+
+Migrations are an explicit deploy step; the app only applies them at startup
+when TRUSTCERT_AUTO_MIGRATE=1 (convenient for a single dev process, racy with
+several workers).
+
+Every tenant database (see tenancy.py) is migrated the same way.
+
+Usage:
+    python init_db.py            # apply all pending migrations, to every tenant
+"""
+import json
+import secrets
+from datetime import datetime
+
+from sqlalchemy import inspect, insert, text
+from sqlalchemy.orm import Session, selectinload
+
+from . import models, audit_store, cache, database, verification
+
+MIGRATIONS = []
+
+# conn.info key: the institution whose database is being migrated
+_INSTITUTION_KEY = "migrating_institution"
+
+
+def migration(version: int, name: str):
+    """Register a migration step. Versions must be unique and increasing."""
+    def decorator(fn):
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+
+# --- Helpers ---
+def _create_table_if_missing(conn, model):
+    model.__table__.create(bind=conn, checkfirst=True)
+
+
+def _institution(conn) -> str:
+    return conn.info.get(_INSTITUTION_KEY, database.DEFAULT_INSTITUTION)
+
+
+def _create_index_if_missing(conn, model, index_name):
+    index = next(i for i in model.__table__.indexes if i.name == index_name)
+    index.create(bind=conn, checkfirst=True)
+
+
+def _add_column_if_missing(conn, model, column_name):
+    table = model.__tablename__
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column_name in existing:
+        return
+    column = model.__table__.c[column_name]
+    ddl_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column_name} {ddl_type}"))
+
+
+# --- Migrations ---
+@migration(1, "baseline_tables")
+def _baseline(conn):
+    for model in (
+        models.User,
+        models.Vault,
+        models.Certificate,
+        models.Condition,
+        models.RecordVersion,
+        models.GovernancePolicy,
+        models.AuditLog,
+    ):
+        _create_table_if_missing(conn, model)
+
+
+@migration(2, "hot_path_indexes")
+def _hot_path_indexes(conn):
+    for model, index_name in (
+        (models.Vault, "ix_vaults_owner_id_id"),
+        (models.Certificate, "ix_certificates_student_id_created_at"),
+        (models.Condition, "ix_conditions_certificate_id"),
+        (models.Condition, "ix_conditions_target_recipient_id"),
+        (models.Condition, "ix_conditions_type_met_target"),
+        (models.RecordVersion, "ix_record_versions_student_category_id"),
+        (models.RecordVersion, "ix_record_versions_student_id_id"),
+        (models.RecordVersion, "ix_record_versions_issuer_id_timestamp"),
+        (models.AuditLog, "ix_audit_logs_timestamp"),
+    ):
+        _create_index_if_missing(conn, model, index_name)
+
+
+@migration(3, "audit_logs_to_segment_store")
+def _audit_logs_to_segments(conn):
+    # Audit entries now live in the append-only segment store; carry over existing rows
+    # into the store of the institution being migrated. The audit_logs table is left
+    # in place, read-only.
+    rows = conn.execute(text(
+        "SELECT action, target_id, details, actor_username, timestamp FROM audit_logs ORDER BY id"
+    )).mappings().all()
+    entries = [dict(row) for row in rows]
+    for entry in entries:
+        if isinstance(entry["timestamp"], str):
+            entry["timestamp"] = datetime.fromisoformat(entry["timestamp"])
+    audit_store.store_for(_institution(conn)).append(entries)
+
+
+@migration(4, "certificates_updated_at")
+def _certificates_updated_at(conn):
+    _add_column_if_missing(conn, models.Certificate, "updated_at")
+    conn.execute(text("UPDATE certificates SET updated_at = created_at WHERE updated_at IS NULL"))
+
+
+@migration(5, "certificate_anchoring")
+def _certificate_anchoring(conn):
+    _create_table_if_missing(conn, models.AnchorBatch)
+    _create_table_if_missing(conn, models.CertificateAnchor)
+
+
+@migration(6, "approval_inbox")
+def _approval_inbox(conn):
+    _create_table_if_missing(conn, models.ApprovalInboxItem)
+    _create_index_if_missing(conn, models.ApprovalInboxItem, "ix_approval_inbox_faculty_certificate")
+
+    # Backfill from the unmet approval conditions, a page of certificates at a time
+    db = Session(bind=conn)
+    last_id = 0
+    while True:
+        certs = db.query(models.Certificate).options(
+            selectinload(models.Certificate.conditions), selectinload(models.Certificate.student)
+        ).filter(
+            models.Certificate.id > last_id,
+            models.Certificate.id.in_(
+                db.query(models.Condition.certificate_id).filter(
+                    models.Condition.condition_type == "approval",
+                    models.Condition.is_met == False
+                )
+            )
+        ).order_by(models.Certificate.id).limit(1000).all()
+        if not certs:
+            break
+        rows = []
+        for cert in certs:
+            payload = verification.render_certificate(cert, cert.student.username if cert.student else None, cert.conditions)
+            body = json.dumps(payload, separators=(",", ":"))
+            for cond in cert.conditions:
+                if cond.condition_type == "approval" and not cond.is_met:
+                    rows.append({
+                        "faculty_id": cond.target_recipient_id or models.SHARED_INBOX,
+                        "certificate_id": cert.id,
+                        "condition_id": cond.id,
+                        "payload": body,
+                        "created_at": datetime.utcnow(),
+                    })
+        conn.execute(insert(models.ApprovalInboxItem), rows)
+        last_id = certs[-1].id
+        db.expunge_all()
+
+
+
+@migration(7, "collection_versions")
+def _collection_versions(conn):
+    _create_table_if_missing(conn, models.CollectionVersion)
+    conn.execute(insert(models.CollectionVersion).values(name=cache.EPOCH, version=secrets.randbits(31)))
+
+
+@migration(8, "institution_ids")
+def _institution_ids(conn):
+    # Rows from before tenancy belong to the default institution
+    for model in (models.User, models.Certificate):
+        _add_column_if_missing(conn, model, "institution_id")
+        conn.execute(
+            text(f"UPDATE {model.__tablename__} SET institution_id = :institution WHERE institution_id IS NULL"),
+            {"institution": database.DEFAULT_INSTITUTION},
+        )
+
+
+@migration(9, "anchor_batch_claims")
+def _anchor_batch_claims(conn):
+    _add_column_if_missing(conn, models.AnchorBatch, "claimed_at")
+
+
+
+# --- Runner ---
+def _ensure_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at DATETIME NOT NULL)"
+    ))
+
+
+def applied_versions(engine):
+    """Read-only: an empty set if the database has never been migrated."""
+    with engine.connect() as conn:
+        if not inspect(conn).has_table("schema_migrations"):
+            return set()
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def pending_migrations(engine):
+    done = applied_versions(engine)
+    return [m for m in MIGRATIONS if m[0] not in done]
+
+
+def upgrade(engine, verbose: bool = False, institution: str = database.DEFAULT_INSTITUTION):
+    """Apply every pending migration to `institution`'s database, each in its own transaction."""
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+    applied = []
+    for version, name, fn in pending_migrations(engine):
+        with engine.begin() as conn:
+            conn.info[_INSTITUTION_KEY] = institution
+            fn(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": version, "n": name, "t": datetime.utcnow()},
+            )
+        applied.append(version)
+        if verbose:
+            print(f"  Applied migration {version:03d} {name}")
+    return applied
+
+
+def upgrade_tenants(verbose: bool = False):
+    """`upgrade` every tenant database (creating schemas of schema tenants first). Returns {institution: applied}."""
+    applied = {}
+    for institution, tenant in database.tenants.items():
+        if verbose and len(database.tenants) > 1:
+            print(f"Institution {institution}:")
+        if tenant.schema is not None:
+            with database.engine.begin() as conn:
+                conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{tenant.schema}"'))
+        applied[institution] = upgrade(tenant.engine, verbose=verbose, institution=institution)
+    return applied
+
+
+def pending_tenant_migrations():
+    """{institution: pending migrations} for the tenants that have any."""
+    pending = {}
+    for institution, tenant in database.tenants.items():
+        tenant_pending = pending_migrations(tenant.engine)
+        if tenant_pending:
+            pending[institution] = tenant_pending
+    return pending
@@ -1,8 +1,9 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Enum
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Enum, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
-from .database import Base
+import hashlib
+from .database import Base, DEFAULT_INSTITUTION
 
 class UserRole(str, enum.Enum):
     ADMIN = "admin"
@@ -18,6 +19,8 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     role = Column(String, default=UserRole.STUDENT) # TrustCert Role
+    # Tenant: decides which database holds the user (see tenancy.py)
+    institution_id = Column(String, nullable=False, default=DEFAULT_INSTITUTION)
 
     vaults = relationship("Vault", back_populates="owner")
     certificates = relationship("Certificate", back_populates="student")
@@ -41,6 +44,11 @@ class Vault(Base):
 
     owner = relationship("User", back_populates="vaults")
 
+    __table_args__ = (
+        # /my-vaults: owner_id = ? ORDER BY id DESC
+        Index("ix_vaults_owner_id_id", "owner_id", "id"),
+    )
+
 class Certificate(Base):
     __tablename__ = "certificates"
 
@@ -48,19 +56,27 @@ class Certificate(Base):
     title = Column(String)
     student_id = Column(Integer, ForeignKey("users.id"))
     issuer_id = Column(Integer) # ID of admin/faculty who created it
+    institution_id = Column(String, nullable=False, default=DEFAULT_INSTITUTION) # the issuer's
     encrypted_ipfs_hash = Column(String)
     decryption_key = Column(String) 
     status = Column(String, default="LOCKED") # LOCKED, PENDING_APPROVAL, UNLOCKED
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped on any change to the certificate or its conditions (cache validator)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     student = relationship("User", back_populates="certificates")
     conditions = relationship("Condition", back_populates="certificate")
 
+    __table_args__ = (
+        # /my-certificates: student_id = ? ORDER BY created_at DESC
+        Index("ix_certificates_student_id_created_at", "student_id", "created_at"),
+    )
+
 class Condition(Base):
     __tablename__ = "conditions"
     
     id = Column(Integer, primary_key=True, index=True)
-    certificate_id = Column(Integer, ForeignKey("certificates.id"))
+    certificate_id = Column(Integer, ForeignKey("certificates.id"), index=True)
     condition_type = Column(String) # time, attendance, approval, grade
     target_value = Column(String) 
     current_value = Column(String) # e.g. "85%"
@@ -68,10 +84,15 @@ class Condition(Base):
     description = Column(String)
     
     # New: For targeted approvals
-    target_recipient_id = Column(Integer, ForeignKey("users.id"), nullable=True) 
+    target_recipient_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True) 
     
     certificate = relationship("Certificate", back_populates="conditions")
 
+    __table_args__ = (
+        # Approval queues: condition_type = 'approval' AND is_met = 0 AND target_recipient_id IN (NULL, ?)
+        Index("ix_conditions_type_met_target", "condition_type", "is_met", "target_recipient_id"),
+    )
+
 class RecordVersion(Base):
     """
     Immutable record for Attendance/Grades.
@@ -90,6 +111,90 @@ class RecordVersion(Base):
     
     student = relationship("User", back_populates="records")
 
+    GENESIS_HASH = "GENESIS_HASH" # previous_hash of the first record in a chain
+
+    @staticmethod
+    def compute_hash(category: str, value: str, timestamp: datetime, previous_hash: str) -> str:
+        # Hash(Category + Value + Timestamp + PreviousHash), simple concatenation
+        return hashlib.sha256(f"{category}{value}{timestamp.isoformat()}{previous_hash}".encode()).hexdigest()
+
+    __table_args__ = (
+        # Hash chain head lookup and condition evaluation: (student_id, category) ORDER BY id DESC
+        Index("ix_record_versions_student_category_id", "student_id", "category", "id"),
+        # /records/{student_username}: student_id = ? ORDER BY id DESC
+        Index("ix_record_versions_student_id_id", "student_id", "id"),
+        # /records/my-history: issuer_id = ? ORDER BY timestamp DESC
+        Index("ix_record_versions_issuer_id_timestamp", "issuer_id", "timestamp"),
+    )
+
+class AnchorBatch(Base):
+    """
+    One on-chain anchoring transaction: the Merkle root over a batch of
+    certificate digests.
+    """
+    __tablename__ = "anchor_batches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    merkle_root = Column(String, index=True)
+    leaf_count = Column(Integer)
+    status = Column(String, default="PENDING") # PENDING (root built, not on chain), SUBMITTING (claimed by an anchorer), ANCHORED
+    txid = Column(String, nullable=True) # Algorand transaction carrying the root in its note
+    created_at = Column(DateTime, default=datetime.utcnow)
+    claimed_at = Column(DateTime, nullable=True) # when an anchorer claimed it for submission
+    anchored_at = Column(DateTime, nullable=True)
+
+class CertificateAnchor(Base):
+    """
+    A certificate's digest and its Merkle inclusion proof in an AnchorBatch.
+    batch_id stays NULL until the digest has been batched.
+    """
+    __tablename__ = "certificate_anchors"
+
+    id = Column(Integer, primary_key=True, index=True)
+    certificate_id = Column(Integer, ForeignKey("certificates.id"), unique=True, index=True)
+    digest = Column(String)
+    batch_id = Column(Integer, ForeignKey("anchor_batches.id"), nullable=True, index=True)
+    leaf_index = Column(Integer, nullable=True)
+    proof = Column(String, nullable=True) # JSON list of {"side": "L"|"R", "hash": hex}
+
+    batch = relationship("AnchorBatch")
+
+# faculty_id of inbox items any faculty (or admin) may act on
+SHARED_INBOX = 0
+
+class ApprovalInboxItem(Base):
+    """
+    Materialized approval queue: one row per unmet approval condition, keyed by
+    the targeted faculty's id (SHARED_INBOX for untargeted approvals). `payload`
+    is the certificate rendered as CertificateResponse JSON when it was queued;
+    it cannot change while the approval is pending, so pages are served as-is.
+    """
+    __tablename__ = "approval_inbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    faculty_id = Column(Integer, nullable=False)
+    certificate_id = Column(Integer, ForeignKey("certificates.id"), nullable=False, index=True)
+    condition_id = Column(Integer, ForeignKey("conditions.id"), nullable=False, unique=True)
+    payload = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Inbox page: faculty_id IN (0, ?) ORDER BY certificate_id DESC
+        Index("ix_approval_inbox_faculty_certificate", "faculty_id", "certificate_id"),
+    )
+
+class CollectionVersion(Base):
+    """
+    Change counter for a list response ("certificates", or one student's
+    "certificates:student:<id>"), bumped in the transaction that changes it.
+    The row named "_epoch" holds a random per-database value instead.
+    See cache.py.
+    """
+    __tablename__ = "collection_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
 class GovernancePolicy(Base):
     __tablename__ = "governance_policies"
     
@@ -101,6 +206,10 @@ class GovernancePolicy(Base):
     is_frozen = Column(Boolean, default=False) # Cannot edit if frozen
 
 class AuditLog(Base):
+    """
+    Legacy audit table, kept read-only. New entries go to the segment store
+    (see audit_store.py); migration 3 copies these rows there.
+    """
     __tablename__ = "audit_logs"
     
     id = Column(Integer, primary_key=True, index=True)
@@ -108,4 +217,4 @@ class AuditLog(Base):
     target_id = Column(String) # ID of the object affected (e.g. Cert ID)
     details = Column(String) # JSON or text description
     actor_username = Column(String) # Who performed it
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,262 @@
+"""
+On-demand request profiling and the slow-query log.
+
+Profiling is opt-in per request:
+- a request carrying `X-Profile: <TRUSTCERT_PROFILE_SECRET>` is always profiled;
+- an admin can switch on sampling (PUT /admin/profiling) for a path prefix at a
+  given rate, which is cheap enough to leave on under load at low rates.
+
+A profiled request registers a session with the sampler thread, which wakes
+every `interval_ms`, reads every thread's current frame and keeps the stacks
+that pass through the request's endpoint or one of its dependencies (so
+requests to other routes running at the same time stay out of it). When the
+request's response is ready the session becomes a profile of folded stacks and
+per-function self/total sample counts, kept in a bounded in-memory store and
+served by the /admin/profiles endpoints. The response carries `X-Profile-Id`.
+
+The slow-query log keeps every SQL statement slower than
+TRUSTCERT_SLOW_QUERY_MS with the route that issued it. Its query plan
+(EXPLAIN QUERY PLAN on SQLite) is resolved when the log is read, against the
+database of the institution that ran it, so the statement path never pays
+for it. Profiles and slow queries both carry their institution, and each
+institution's admins only see their own.
+"""
+import hmac
+import inspect
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import List, Optional
+
+from . import database
+
+# --- Config ---
+PROFILE_SECRET = os.getenv("TRUSTCERT_PROFILE_SECRET", "")
+PROFILE_STORE_SIZE = int(os.getenv("TRUSTCERT_PROFILE_STORE_SIZE", "50"))
+PROFILE_INTERVAL_MS = float(os.getenv("TRUSTCERT_PROFILE_INTERVAL_MS", "5"))
+SLOW_QUERY_MS = float(os.getenv("TRUSTCERT_SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("TRUSTCERT_SLOW_QUERY_LOG_SIZE", "200"))
+
+PROFILE_HEADER = "x-profile"
+TOP_FUNCTIONS = 25
+
+
+class Settings:
+    """Admin-controlled sampling of requests (per process)."""
+
+    def __init__(self):
+        self.enabled = False
+        self.path_prefix = "/"
+        self.sample_rate = 0.01
+        self.interval_ms = PROFILE_INTERVAL_MS
+
+    def as_dict(self) -> dict:
+        return {"enabled": self.enabled, "path_prefix": self.path_prefix,
+                "sample_rate": self.sample_rate, "interval_ms": self.interval_ms}
+
+
+settings = Settings()
+
+
+def should_profile(request) -> bool:
+    requested = request.headers.get(PROFILE_HEADER)
+    if requested and PROFILE_SECRET and hmac.compare_digest(requested, PROFILE_SECRET):
+        return True
+    return (
+        settings.enabled
+        and request.url.path.startswith(settings.path_prefix)
+        and random.random() < settings.sample_rate
+    )
+
+
+# --- Sampling profiler ---
+def _code_of(call):
+    fn = call if inspect.isfunction(call) or inspect.ismethod(call) else getattr(call, "__call__", None)
+    return getattr(getattr(fn, "__func__", fn), "__code__", None)
+
+
+def _route_codes(route) -> set:
+    """Code objects of the endpoint and all its dependencies."""
+    codes = set()
+    pending = [route.dependant] if getattr(route, "dependant", None) is not None else []
+    while pending:
+        dependant = pending.pop()
+        code = _code_of(dependant.call) if dependant.call is not None else None
+        if code is not None:
+            codes.add(code)
+        pending.extend(dependant.dependencies)
+    endpoint_code = _code_of(getattr(route, "endpoint", None))
+    if endpoint_code is not None:
+        codes.add(endpoint_code)
+    return codes
+
+
+def _frame_name(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class ProfileSession:
+    def __init__(self, method: str, scope: dict, institution: str):
+        self.method = method
+        self.institution = institution
+        self.path = scope.get("path", "")
+        self.scope = scope
+        self.started_at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.codes = None
+        self.stacks = Counter()
+        self.samples = 0
+
+    def sample(self, frames: dict, skip_thread: int):
+        if self.codes is None:
+            route = self.scope.get("route")
+            if route is None:
+                return # not routed yet
+            self.codes = _route_codes(route)
+        for thread_id, frame in frames.items():
+            if thread_id == skip_thread:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            # Keep from the outermost endpoint/dependency frame inwards
+            for depth in range(len(stack) - 1, -1, -1):
+                if stack[depth] in self.codes:
+                    self.stacks[tuple(_frame_name(code) for code in reversed(stack[:depth + 1]))] += 1
+                    self.samples += 1
+                    break
+
+    def result(self, profile_id: int, status_code: int) -> dict:
+        route = self.scope.get("route")
+        self_counts, total_counts = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            self_counts[stack[-1]] += count
+            for name in set(stack):
+                total_counts[name] += count
+        return {
+            "id": profile_id,
+            "institution": self.institution,
+            "method": self.method,
+            "path": self.path,
+            "route": route.path if route is not None else None,
+            "status": status_code,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": (time.perf_counter() - self.started) * 1000,
+            "interval_ms": settings.interval_ms,
+            "samples": self.samples,
+            "top": [
+                {"function": name, "self": self_counts[name], "total": total}
+                for name, total in total_counts.most_common(TOP_FUNCTIONS)
+            ],
+            "folded": [";".join(stack) + f" {count}" for stack, count in self.stacks.most_common()],
+        }
+
+
+class Sampler:
+    """Background thread that runs only while at least one session is active."""
+
+    def __init__(self, store_size: int = PROFILE_STORE_SIZE):
+        self._sessions = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._ids = itertools.count(1)
+        self.profiles = deque(maxlen=store_size)
+
+    def start_session(self, request, institution: str) -> ProfileSession:
+        session = ProfileSession(request.method, request.scope, institution)
+        with self._lock:
+            self._sessions.add(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trustcert-profiler", daemon=True)
+                self._thread.start()
+        return session
+
+    def finish_session(self, session: ProfileSession, status_code: int) -> int:
+        with self._lock:
+            self._sessions.discard(session)
+            profile_id = next(self._ids)
+        self.profiles.append(session.result(profile_id, status_code))
+        return profile_id
+
+    def for_institution(self, institution: str) -> List[dict]:
+        """Stored profiles of one institution's requests, newest first."""
+        return [profile for profile in reversed(self.profiles) if profile["institution"] == institution]
+
+    def get(self, profile_id: int, institution: str) -> Optional[dict]:
+        for profile in self.profiles:
+            if profile["id"] == profile_id and profile["institution"] == institution:
+                return profile
+        return None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            time.sleep(settings.interval_ms / 1000)
+            # Sampling under the lock, so a finishing session is never read mid-sample
+            with self._lock:
+                if not self._sessions:
+                    self._thread = None
+                    return
+                frames = sys._current_frames()
+                for session in self._sessions:
+                    session.sample(frames, own_id)
+                del frames
+
+
+sampler = Sampler()
+
+
+# --- Slow-query log ---
+class SlowQueryLog:
+    def __init__(self, size: int = SLOW_QUERY_LOG_SIZE):
+        self._entries = deque(maxlen=size)
+        self._ids = itertools.count(1)
+
+    def record(self, statement: str, parameters, executemany: bool, elapsed: float,
+               method: Optional[str], route: Optional[str], institution: str = database.DEFAULT_INSTITUTION):
+        if statement.lstrip()[:7].upper() == "EXPLAIN":
+            return
+        if executemany and parameters:
+            parameters = parameters[0]
+        self._entries.append({
+            "id": next(self._ids),
+            "timestamp": datetime.utcnow().isoformat(),
+            "duration_ms": elapsed * 1000,
+            "institution": institution,
+            "method": method,
+            "route": route,
+            "statement": statement,
+            "_parameters": parameters,
+            "plan": None,
+        })
+
+    def entries(self, institution: str, limit: int = 50) -> List[dict]:
+        """One institution's entries, newest first, with query plans resolved (and cached) on the way out."""
+        selected = [entry for entry in self._entries if entry["institution"] == institution][-limit:][::-1]
+        for entry in selected:
+            if entry["plan"] is None:
+                entry["plan"] = explain(entry["statement"], entry.pop("_parameters", None), institution)
+        return [{k: v for k, v in entry.items() if not k.startswith("_")} for entry in selected]
+
+
+def explain(statement: str, parameters, institution: str = database.DEFAULT_INSTITUTION) -> List[str]:
+    engine = database.tenants[institution].engine
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    try:
+        with engine.connect() as conn:
+            rows = conn.exec_driver_sql(prefix + statement, parameters if parameters is not None else ())
+            if engine.dialect.name == "sqlite":
+                # (id, parent, notused, detail)
+                return [row[3] for row in rows]
+            return [" ".join(str(col) for col in row) for row in rows]
+    except Exception as e:
+        return [f"EXPLAIN failed: {e}"]
+
+
+slow_queries = SlowQueryLog()
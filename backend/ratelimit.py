@@ -0,0 +1,278 @@
+"""
+Rate limiting and admission control.
+
+Each request is put in a route class (login, public verification, faculty
+approvals, other reads and writes; see ROUTE_CLASSES) and must pass two
+checks in AdmissionMiddleware before it reaches a route:
+
+1. Rate limit: a token bucket per (class, caller). The caller is the user
+   named in a valid bearer token, otherwise the client IP. When the bucket is
+   empty the answer is 429, with Retry-After set to the seconds until a token
+   is back. Buckets live in this process ("memory"), or in a SQLite file
+   shared by every worker on the host ("sqlite", TRUSTCERT_RATE_LIMIT_DB), so
+   limits hold however requests are spread over workers. SQLite takes run in
+   a small thread pool of their own, never on the event loop.
+2. Admission: at most TRUSTCERT_MAX_IN_FLIGHT requests run at once in this
+   worker, and lower priorities only get a share of that. Anonymous traffic
+   is shed first and faculty approvals last. A shed request gets 503 with
+   Retry-After straight away instead of queueing behind work the worker
+   cannot finish in time. Long-lived streams (/events/stream) do not count.
+
+Client IPs come from the ASGI scope. Behind a proxy, run uvicorn with
+--proxy-headers so the scope reflects X-Forwarded-For.
+"""
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import anyio
+from starlette.responses import JSONResponse
+
+from . import auth, metrics
+
+# --- Config ---
+RATE_LIMIT_ENABLED = os.getenv("TRUSTCERT_RATE_LIMIT", "1") == "1"
+RATE_LIMIT_STORE = os.getenv("TRUSTCERT_RATE_LIMIT_STORE", "memory") # memory or sqlite
+RATE_LIMIT_DB = os.getenv("TRUSTCERT_RATE_LIMIT_DB", "./backend/ratelimit.db")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("TRUSTCERT_RATE_LIMIT_MAX_KEYS", "100000"))
+# 0 disables admission control; the default matches the threadpool sync endpoints run in
+MAX_IN_FLIGHT = int(os.getenv("TRUSTCERT_MAX_IN_FLIGHT", "40"))
+OVERLOAD_RETRY_AFTER = int(os.getenv("TRUSTCERT_OVERLOAD_RETRY_AFTER", "1"))
+# Threads for blocking bucket stores (sqlite), apart from the endpoint threadpool
+RATE_LIMIT_THREADS = int(os.getenv("TRUSTCERT_RATE_LIMIT_THREADS", "4"))
+
+# --- Priorities ---
+CRITICAL, NORMAL, LOW = 0, 1, 2
+# Share of MAX_IN_FLIGHT a priority may fill
+PRIORITY_SHARES = {CRITICAL: 1.0, NORMAL: 0.85, LOW: 0.5}
+
+
+class RouteClass:
+    __slots__ = ("name", "rate", "burst", "priority", "admitted")
+
+    def __init__(self, name: str, rate: float, burst: float, priority: int, admitted: bool = True):
+        # TRUSTCERT_RATE_LIMIT_<NAME>="<tokens per second>/<burst>" overrides the default
+        override = os.getenv(f"TRUSTCERT_RATE_LIMIT_{name.upper()}")
+        if override:
+            rate, burst = (float(v) for v in override.split("/"))
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.priority = priority
+        self.admitted = admitted # counted by the admission controller
+
+
+ROUTE_CLASSES = {
+    c.name: c for c in (
+        RouteClass("login", 0.5, 20, LOW),
+        RouteClass("verify", 5, 30, LOW),
+        RouteClass("approval", 20, 100, CRITICAL),
+        RouteClass("read", 20, 100, NORMAL),
+        RouteClass("write", 10, 50, NORMAL),
+        RouteClass("stream", 1, 5, NORMAL, admitted=False),
+    )
+}
+
+# (methods or None for any, path pattern, class); first match wins, then read/write by method
+_RULES = [
+    ({"POST"}, re.compile(r"/(token|register)"), "login"),
+    ({"POST"}, re.compile(r"/certificates/(approve-batch|[^/]+/approve-condition/[^/]+)"), "approval"),
+    (None, re.compile(r"/certificates/public(/.*)?"), "verify"),
+    ({"POST"}, re.compile(r"/certificates/[^/]+/verify-conditions"), "verify"),
+    (None, re.compile(r"/events/stream"), "stream"),
+]
+# Health check and metrics scrapes are never limited
+EXEMPT_PATHS = {"/", "/metrics"}
+_READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def classify(method: str, path: str) -> Optional[RouteClass]:
+    if path in EXEMPT_PATHS:
+        return None
+    for methods, pattern, name in _RULES:
+        if (methods is None or method in methods) and pattern.fullmatch(path):
+            return ROUTE_CLASSES[name]
+    return ROUTE_CLASSES["read" if method in _READ_METHODS else "write"]
+
+
+# --- Token buckets ---
+def _take(tokens: float, elapsed: float, rate: float, burst: float):
+    """Refill by `elapsed` seconds and take one token: (tokens left, seconds to wait or 0)."""
+    tokens = min(burst, tokens + max(0.0, elapsed) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class MemoryBucketStore:
+    """Buckets in this process; the least recently used are dropped (i.e. refilled) past max_keys."""
+
+    blocking = False # a take only holds a lock briefly: safe on the event loop
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict() # key -> [tokens, updated]
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [burst, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            bucket[0], wait = _take(bucket[0], now - bucket[1], rate, burst)
+            bucket[1] = now
+            return wait
+
+
+class SQLiteBucketStore:
+    """
+    Buckets in a SQLite file shared by the workers on one host. Each take is one
+    short IMMEDIATE transaction; if the file is busy the request is let through
+    rather than delayed, and counted in RATE_LIMIT_STORE_ERRORS.
+    """
+
+    blocking = True # may wait on the file lock: run off the event loop
+    PRUNE_EVERY = 10_000
+    IDLE_SECONDS = 3600
+
+    def __init__(self, path: str = RATE_LIMIT_DB):
+        self.path = path
+        self._local = threading.local()
+        self._takes = 0
+        self._failing = False
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=0.05, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF") # losing buckets in a crash only refills them
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        now = time.time() # wall clock: compared across processes
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens, updated = row if row else (burst, now)
+                tokens, wait = _take(tokens, now - updated, rate, burst)
+                conn.execute(
+                    "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                    (key, tokens, now),
+                )
+                self._takes += 1
+                if self._takes % self.PRUNE_EVERY == 0:
+                    conn.execute("DELETE FROM buckets WHERE updated < ?", (now - self.IDLE_SECONDS,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.OperationalError as e:
+            metrics.RATE_LIMIT_STORE_ERRORS.inc()
+            if not self._failing:
+                self._failing = True
+                print(f"Rate limit store unavailable, letting requests through: {e}")
+            return 0.0
+        if self._failing:
+            self._failing = False
+            print("Rate limit store available again")
+        return wait
+
+
+def make_store(kind: str = RATE_LIMIT_STORE):
+    if kind == "memory":
+        return MemoryBucketStore()
+    if kind == "sqlite":
+        return SQLiteBucketStore()
+    raise ValueError(f"Unknown rate limit store: {kind}")
+
+
+# --- Admission ---
+class AdmissionController:
+    """
+    Counts requests in flight in this worker. Only touched from the event loop,
+    so it needs no lock.
+    """
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+
+    def try_enter(self, priority: int) -> bool:
+        if self.max_in_flight > 0 and self.in_flight >= self.max_in_flight * PRIORITY_SHARES[priority]:
+            return False
+        self.in_flight += 1
+        return True
+
+    def leave(self):
+        self.in_flight -= 1
+
+
+# --- Middleware ---
+def _reject(status_code: int, retry_after: float, detail: str) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail}, status_code=status_code, headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, store=None, controller: Optional[AdmissionController] = None,
+                 enabled: bool = RATE_LIMIT_ENABLED):
+        self.app = app
+        self.store = store if store is not None else make_store()
+        self.controller = controller if controller is not None else AdmissionController()
+        self.enabled = enabled
+        self._limiter = None # created on first use, inside the event loop
+
+    async def _take(self, key: str, route_class: RouteClass) -> float:
+        if not self.store.blocking:
+            return self.store.take(key, route_class.rate, route_class.burst)
+        if self._limiter is None:
+            self._limiter = anyio.CapacityLimiter(RATE_LIMIT_THREADS)
+        return await anyio.to_thread.run_sync(
+            self.store.take, key, route_class.rate, route_class.burst, limiter=self._limiter
+        )
+
+    async def __call__(self, scope, receive, send):
+        route_class = classify(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        caller = auth.request_caller(scope)
+        if self.enabled:
+            wait = await self._take(f"{route_class.name}:{caller.key}", route_class)
+            if wait:
+                metrics.HTTP_REJECTED.inc(route_class.name, "rate_limited")
+                await _reject(429, wait, "Too many requests")(scope, receive, send)
+                return
+
+        if not route_class.admitted:
+            await self.app(scope, receive, send)
+            return
+        priority = route_class.priority if caller.authenticated else max(route_class.priority, LOW)
+        if not self.controller.try_enter(priority):
+            metrics.HTTP_REJECTED.inc(route_class.name, "overloaded")
+            await _reject(503, OVERLOAD_RETRY_AFTER, "Server busy, retry shortly")(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.leave()
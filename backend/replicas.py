@@ -0,0 +1,112 @@
+"""
+Read replicas with read-your-writes stickiness.
+
+TRUSTCERT_DATABASE_REPLICA_URLS lists read replicas of the primary
+(TRUSTCERT_DATABASE_URL), comma-separated: Postgres standbys, or for local
+testing SQLite copies kept up to date by replicate_sqlite.py. Without it
+everything runs on the primary, as before.
+
+Endpoints that only read declare `dependencies=[Depends(replicas.read_only)]`.
+Their request sessions (get_db / get_async_db, shared with the auth
+dependency) then read from a replica, chosen round robin. Writes never reach
+a replica: database.RoutingSession moves a session to the primary on its
+first flush or DML statement.
+
+Replicas copy the primary, so they only serve the default institution; other
+tenants (see tenancy.py) always read their own database.
+
+Read-your-writes: once a caller commits a write, their read-only requests go
+to the primary for TRUSTCERT_REPLICA_STICKY_SECONDS (keep it above the
+replication lag). Callers are identified like in rate limiting: the user
+from the bearer token, else the client IP. Stickiness is tracked per worker,
+so with several workers the load balancer should keep a client on one worker
+(or the window should cover the lag on its own). Anonymous public reads are
+not sticky to anyone else's writes and may trail the primary by the lag.
+"""
+import itertools
+import os
+import threading
+import time
+from typing import Dict
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import auth, database, instrumentation, metrics
+
+# --- Config ---
+STICKY_SECONDS = float(os.getenv("TRUSTCERT_REPLICA_STICKY_SECONDS", "5"))
+STICKY_MAX_KEYS = 100_000
+
+_WROTE_KEY = "replicas_wrote"
+
+_sticky: Dict[str, float] = {} # caller -> primary-only until (monotonic)
+_sticky_lock = threading.Lock()
+_next_replica = itertools.cycle(range(len(database.replica_engines)))
+
+
+def mark_written(caller: str):
+    with _sticky_lock:
+        if len(_sticky) >= STICKY_MAX_KEYS:
+            now = time.monotonic()
+            for key in [key for key, until in _sticky.items() if until <= now]:
+                del _sticky[key]
+        _sticky[caller] = time.monotonic() + STICKY_SECONDS
+
+
+def mark_user_written(username: str, institution: str):
+    """Stick a user to the primary, e.g. right after creating them (their token is not in use yet)."""
+    if database.replica_engines:
+        mark_written(auth.caller_key(username, institution))
+
+
+def recently_wrote(caller: str) -> bool:
+    until = _sticky.get(caller)
+    if until is None:
+        return False
+    if until > time.monotonic():
+        return True
+    with _sticky_lock:
+        _sticky.pop(caller, None)
+    return False
+
+
+# --- Dependency ---
+async def read_only(request: Request):
+    """Route-level dependency: read this request from a replica unless the caller just wrote."""
+    caller = auth.request_caller(request.scope)
+    # Replicas serve the primary database, i.e. the default institution
+    if not database.replica_engines or caller.institution != database.DEFAULT_INSTITUTION:
+        return
+    if recently_wrote(caller.key):
+        metrics.DB_READ_ROUTING.inc("primary")
+        return
+    request.state.db_replica = next(_next_replica)
+    metrics.DB_READ_ROUTING.inc("replica")
+
+
+# --- Session Hooks ---
+@event.listens_for(Session, "after_flush")
+def _note_flush(session, flush_context):
+    session.info[_WROTE_KEY] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info[_WROTE_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _stick_to_primary(session):
+    if not session.info.pop(_WROTE_KEY, False) or not database.replica_engines:
+        return
+    stats = instrumentation.current_stats()
+    if stats is not None and stats.scope is not None:
+        mark_written(auth.request_caller(stats.scope).key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_writes(session):
+    session.info.pop(_WROTE_KEY, None)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -35,6 +35,7 @@ class VaultInfo(BaseModel):
 class User(UserBase):
     id: int
     role: str
+    institution_id: str
     vaults: List[VaultInfo] = []
     
     class Config:
@@ -54,6 +55,7 @@ class ConditionBase(BaseModel):
     condition_type: str
     target_value: str
     description: Optional[str] = None
+    is_met: bool = False
     
     class Config:
         from_attributes = True
@@ -85,6 +87,22 @@ class CertificateResponse(BaseModel):
     class Config:
         from_attributes = True 
 
+class BatchVerifyRequest(BaseModel):
+    ids: List[int]
+
+class BatchApproveRequest(BaseModel):
+    certificate_ids: List[int]
+
+class BatchApproveItem(BaseModel):
+    certificate_id: int
+    result: str # approved, already_approved, not_targeted, no_approval_condition, not_found
+    cert_status: Optional[str] = None
+
+class BatchApproveResponse(BaseModel):
+    approved: int
+    unlocked: int
+    results: List[BatchApproveItem]
+
 class RecordCreate(BaseModel):
     student_username: str
     category: str # "Attendance", "Grade"
@@ -116,6 +134,12 @@ class PolicyResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ProfilingSettings(BaseModel):
+    enabled: bool
+    path_prefix: str = "/"
+    sample_rate: float = Field(0.01, ge=0, le=1)
+    interval_ms: float = Field(5, gt=0)
+
 class AuditLogResponse(BaseModel):
     id: int
     action: str
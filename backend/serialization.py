@@ -0,0 +1,129 @@
+"""
+Fast path for large list responses.
+
+The list endpoints used to load ORM objects and validate each through a
+`from_attributes` schema before encoding. For tens of thousands of rows that
+dominated the request. Here they instead:
+- select only the columns of the response schema, as plain row tuples (no ORM
+  instances, no identity map);
+- zip them into dicts keyed by the schema's field names;
+- encode the list in one call with orjson when it is installed, or the
+  standard library json module otherwise.
+
+The endpoints keep their `response_model` for the OpenAPI docs, but return a
+`JSONListResponse`, which FastAPI sends as is. The output matches what
+the schemas produced: the same keys in the same order, ISO-8601 datetimes,
+and nested condition lists for certificates.
+"""
+import json
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Sequence
+
+from fastapi import Response
+from sqlalchemy import select
+
+from . import models
+
+try:
+    import orjson
+except ImportError: # optional; the json fallback produces the same output
+    orjson = None
+
+
+# --- Encoding ---
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class JSONListResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def as_dicts(keys: Sequence[str], rows: Iterable[tuple]) -> List[dict]:
+    return [dict(zip(keys, row)) for row in rows]
+
+
+# --- Column sets (field order of the response schemas) ---
+CERTIFICATE_COLUMNS = (
+    models.Certificate.id,
+    models.Certificate.title,
+    models.Certificate.status,
+    models.Certificate.student_id,
+    models.User.username.label("student_username"),
+    models.Certificate.created_at,
+    models.Certificate.encrypted_ipfs_hash,
+    models.Certificate.decryption_key,
+)
+CERTIFICATE_KEYS = tuple(column.key for column in CERTIFICATE_COLUMNS)
+
+CONDITION_COLUMNS = (
+    models.Condition.certificate_id,
+    models.Condition.condition_type,
+    models.Condition.target_value,
+    models.Condition.description,
+    models.Condition.is_met,
+)
+CONDITION_KEYS = tuple(column.key for column in CONDITION_COLUMNS[1:])
+
+RECORD_COLUMNS = (
+    models.RecordVersion.id,
+    models.RecordVersion.category,
+    models.RecordVersion.value,
+    models.RecordVersion.timestamp,
+    models.RecordVersion.issuer_id,
+    models.RecordVersion.data_hash,
+    models.RecordVersion.previous_hash,
+)
+RECORD_KEYS = tuple(column.key for column in RECORD_COLUMNS)
+
+AUDIT_LOG_KEYS = ("id", "action", "target_id", "details", "actor_username", "timestamp")
+
+
+# --- Queries ---
+def certificates_query(*criteria, order_by=None):
+    """CertificateResponse rows (without conditions), newest first by default."""
+    return (
+        select(*CERTIFICATE_COLUMNS)
+        .outerjoin(models.User, models.User.id == models.Certificate.student_id)
+        .where(*criteria)
+        .order_by(order_by if order_by is not None else models.Certificate.id.desc())
+    )
+
+
+def conditions_query(*criteria):
+    """Condition rows for the certificates matching `criteria`, in insertion order."""
+    query = select(*CONDITION_COLUMNS)
+    if criteria:
+        query = query.join(models.Certificate, models.Certificate.id == models.Condition.certificate_id).where(*criteria)
+    return query.order_by(models.Condition.id)
+
+
+def records_query(*criteria, order_by=None):
+    return select(*RECORD_COLUMNS).where(*criteria).order_by(
+        order_by if order_by is not None else models.RecordVersion.id.desc()
+    )
+
+
+def certificate_list(cert_rows: Iterable[tuple], condition_rows: Iterable[tuple]) -> List[dict]:
+    by_certificate: Dict[int, List[dict]] = {}
+    for cert_id, *values in condition_rows:
+        by_certificate.setdefault(cert_id, []).append(dict(zip(CONDITION_KEYS, values)))
+    certificates = as_dicts(CERTIFICATE_KEYS, cert_rows)
+    for cert in certificates:
+        cert["conditions"] = by_certificate.get(cert["id"], [])
+    return certificates
+
+
+def audit_log_list(entries: Iterable[dict]) -> List[dict]:
+    return [{key: entry.get(key) for key in AUDIT_LOG_KEYS} for entry in entries]
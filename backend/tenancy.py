@@ -0,0 +1,42 @@
+"""
+Per-institution data partitioning.
+
+Every user and certificate carries an `institution_id`, and each institution
+lives in a database of its own, so one college's issuance burst neither
+competes for another's connections nor holds its locks:
+
+- the default institution ("default") in the primary, TRUSTCERT_DATABASE_URL
+  (plus its read replicas, see replicas.py);
+- every institution listed in TRUSTCERT_TENANT_DATABASES in its own database,
+  given as "<institution>=<url>" pairs, comma-separated. With a PostgreSQL
+  primary, "<institution>=schema:<name>" instead puts the institution in its
+  own schema there, with a connection pool of its own.
+
+    TRUSTCERT_TENANT_DATABASES=northfield=sqlite:///./backend/tenants/northfield.db,lakeside=schema:lakeside
+
+The institution of a request is the one in its bearer token (issued at
+registration and login), else the X-Institution header (registration, login
+and public verification are anonymous), else "default". resolve_institution
+runs for every route and leaves it in request.state, where get_db /
+get_async_db open the session on that institution's database
+(database.open_session). A token always wins over the header, and the auth
+dependencies only accept users of the session's institution.
+
+Per-process state keyed by database ids is qualified by institution: the
+public certificate and bundle caches and event channels. Audit entries go to
+a segment store per institution (TRUSTCERT_AUDIT_DIR/<institution>/, see
+audit_store.py), picked like the database. `python init_db.py` migrates every
+tenant database; the background anchorer batches each one separately.
+"""
+from fastapi import HTTPException, Request
+
+from . import auth, database
+
+
+async def resolve_institution(request: Request):
+    """App-wide dependency (async: no threadpool hop): the request's institution, which must have a database."""
+    institution = auth.request_caller(request.scope).institution
+    if institution not in database.tenants:
+        raise HTTPException(status_code=404, detail=f"Unknown institution: {institution}")
+    request.state.institution = institution
+    return institution
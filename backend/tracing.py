@@ -0,0 +1,271 @@
+"""
+Lightweight span tracing with W3C `traceparent` propagation.
+
+The request middleware opens a root span per request. Its trace id is taken
+from an incoming `traceparent` header, or a new one is made. Code under the
+request opens child spans with
+
+    with tracing.span("certificate.render_document", title=cert.title):
+        ...
+
+or the `@tracing.traced("name")` decorator. The current span lives in a
+context variable, so spans nest across `await` and into threadpool-run sync
+endpoints. SQL statements (instrumentation.py) and external calls
+(metrics.timed_call) become spans automatically. `inject(headers)` adds a
+`traceparent` to outgoing requests.
+
+Sampling is decided once per trace, at the root:
+- an incoming `traceparent` keeps the caller's decision (its sampled flag);
+- otherwise a fraction TRUSTCERT_TRACE_SAMPLE_RATE of traces are kept,
+  decided from the trace id so every service agrees on it.
+Unsampled requests carry no span objects at all: `span()` returns a shared
+no-op.
+
+Finished spans are handed to a bounded queue. A background exporter writes
+them in batches as JSON lines to TRUSTCERT_TRACE_FILE ("file"), or POSTs
+them as a JSON array to TRUSTCERT_TRACE_COLLECTOR_URL ("http"). When the
+queue is full, spans are dropped and counted rather than slowing requests.
+"""
+import functools
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+# --- Config ---
+TRACE_SAMPLE_RATE = float(os.getenv("TRUSTCERT_TRACE_SAMPLE_RATE", "0"))
+TRACE_EXPORTER = os.getenv("TRUSTCERT_TRACE_EXPORTER", "file") # file, http or none
+TRACE_FILE = os.getenv("TRUSTCERT_TRACE_FILE", "./backend/traces.jsonl")
+TRACE_COLLECTOR_URL = os.getenv("TRUSTCERT_TRACE_COLLECTOR_URL", "")
+TRACE_BATCH_SIZE = int(os.getenv("TRUSTCERT_TRACE_BATCH_SIZE", "256"))
+TRACE_FLUSH_INTERVAL = float(os.getenv("TRUSTCERT_TRACE_FLUSH_INTERVAL", "1.0"))
+TRACE_QUEUE_SIZE = int(os.getenv("TRUSTCERT_TRACE_QUEUE_SIZE", "10000"))
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attributes", "start_ns", "end_ns", "status", "_token")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, attributes: dict):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = "ok"
+        self._token = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        if exc is not None:
+            self.status = "error"
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"[:200]
+        self.finish()
+        return False
+
+    def finish(self):
+        self.end_ns = time.time_ns()
+        exporter.export(self)
+
+    def as_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": datetime.fromtimestamp(self.start_ns / 1e9, timezone.utc).isoformat(),
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+
+# --- Sampling & propagation ---
+class Sampler:
+    def __init__(self, rate: float = TRACE_SAMPLE_RATE):
+        self.rate = rate
+
+    def should_sample(self, trace_id: str) -> bool:
+        # Ratio sampling on the low 64 bits of the trace id
+        return int(trace_id[16:], 16) < self.rate * 2 ** 64
+
+
+sampler = Sampler()
+
+
+def start_request(traceparent: Optional[str], name: str, **attributes):
+    """Open the root span for a request. Returns (span, token), or (None, None) if not sampled."""
+    match = _TRACEPARENT.match(traceparent.strip().lower()) if traceparent else None
+    if match:
+        trace_id, parent_id, flags = match.groups()
+        sampled = bool(int(flags, 16) & 1)
+    else:
+        trace_id, parent_id = secrets.token_hex(16), None
+        sampled = sampler.should_sample(trace_id)
+    if not sampled:
+        return None, None
+    root = Span(trace_id, parent_id, name, attributes)
+    return root, _current.set(root)
+
+
+def end_request(root: Span, token, name: str, status_code: int):
+    _current.reset(token)
+    root.name = name
+    root.attributes["http.status_code"] = status_code
+    if status_code >= 500:
+        root.status = "error"
+    root.finish()
+
+
+def span(name: str, **attributes):
+    """Child span of the current one; a no-op outside a sampled trace."""
+    parent = _current.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.trace_id, parent.span_id, name, attributes)
+
+
+def traced(name: str):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_span(name: str, start_ns: int, end_ns: int, **attributes):
+    """Report work that was already timed elsewhere as a child of the current span."""
+    parent = _current.get()
+    if parent is None:
+        return
+    child = Span(parent.trace_id, parent.span_id, name, attributes)
+    child.start_ns = start_ns
+    child.end_ns = end_ns
+    exporter.export(child)
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current.get()
+    return current.trace_id if current is not None else None
+
+
+def inject(headers: dict) -> dict:
+    """Add a `traceparent` for the current span to outgoing request headers."""
+    current = _current.get()
+    if current is not None:
+        headers["traceparent"] = f"00-{current.trace_id}-{current.span_id}-01"
+    return headers
+
+
+# --- Exporter ---
+class Exporter:
+    def __init__(self, kind: str = TRACE_EXPORTER, path: str = TRACE_FILE, url: str = TRACE_COLLECTOR_URL,
+                 batch_size: int = TRACE_BATCH_SIZE, flush_interval: float = TRACE_FLUSH_INTERVAL,
+                 max_queue: int = TRACE_QUEUE_SIZE):
+        if kind not in ("file", "http", "none"):
+            raise ValueError(f"Unknown trace exporter: {kind}")
+        self.kind = kind
+        self.path = path
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def export(self, finished: Span):
+        if self.kind == "none":
+            return
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(finished)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="trustcert-trace-exporter", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def _run(self):
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write([s.as_dict() for s in batch])
+            if self._stop.is_set() and self._queue.empty():
+                return
+
+    def _write(self, spans):
+        try:
+            if self.kind == "file":
+                with open(self.path, "a") as f:
+                    f.write("".join(json.dumps(s, separators=(",", ":")) + "\n" for s in spans))
+            else:
+                request = urllib.request.Request(
+                    self.url, data=json.dumps(spans).encode(), headers={"Content-Type": "application/json"}
+                )
+                urllib.request.urlopen(request, timeout=5).close()
+        except Exception as e:
+            self.dropped += len(spans)
+            print(f"Trace export failed, dropped {len(spans)} spans: {e}")
+
+
+exporter = Exporter()
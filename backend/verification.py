@@ -0,0 +1,138 @@
+"""
+Public certificate verification helpers shared by the single and batch endpoints.
+"""
+import json
+import os
+from typing import AsyncIterator, Iterable, List
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, schemas, database, cache, bundles
+
+# Max ids accepted by one batch verification request
+BATCH_VERIFY_MAX_IDS = int(os.getenv("TRUSTCERT_BATCH_VERIFY_MAX_IDS", "10000"))
+# Ids resolved per round trip (kept well under SQLite's bound-parameter limit)
+BATCH_VERIFY_CHUNK_SIZE = 2000
+
+
+class BatchTooLarge(ValueError):
+    pass
+
+
+def render_certificate(cert: models.Certificate, student_username: str, conditions: List[models.Condition]) -> dict:
+    """CertificateResponse as a JSON-ready dict, with an explicit condition list."""
+    cert.student_username = student_username
+    data = schemas.CertificateResponse.model_validate(cert).model_dump(mode="json", exclude={"conditions"})
+    data["conditions"] = [schemas.ConditionBase.model_validate(c).model_dump(mode="json") for c in conditions]
+    return data
+
+
+def render_public_certificate(cert: models.Certificate, student_username: str) -> cache.CachedResponse:
+    """Render a certificate's public JSON once and wrap it as a cacheable response."""
+    cert.student_username = student_username
+    body = schemas.CertificateResponse.model_validate(cert).model_dump_json().encode()
+    return cache.CachedResponse(body, cache.certificate_version(cert))
+
+
+async def load_public_certificates(db: AsyncSession, cert_ids: List[int]) -> dict:
+    """Resolve many certificates with two set-based queries. Returns {id: CachedResponse}."""
+    result = await db.execute(
+        select(models.Certificate, models.User.username)
+        .join(models.User, models.User.id == models.Certificate.student_id)
+        .options(selectinload(models.Certificate.conditions))
+        .filter(models.Certificate.id.in_(cert_ids))
+    )
+    institution = database.institution_of(db)
+    rendered = {}
+    for cert, username in result.all():
+        entry = render_public_certificate(cert, username)
+        cache.public_certificates.put(institution, cert.id, entry)
+        rendered[cert.id] = entry
+    return rendered
+
+
+def parse_ids(values: Iterable) -> List:
+    """
+    Normalise raw ids (ints or CSV cells). Invalid values are kept as strings so
+    they can be reported back per item. Raises BatchTooLarge past the limit.
+    """
+    ids = []
+    for value in values:
+        if isinstance(value, str):
+            value = value.strip()
+            if not value:
+                continue
+            try:
+                value = int(value)
+            except ValueError:
+                pass
+        ids.append(value)
+        if len(ids) > BATCH_VERIFY_MAX_IDS:
+            raise BatchTooLarge(f"At most {BATCH_VERIFY_MAX_IDS} ids per request")
+    return ids
+
+
+async def read_csv_ids(chunks: AsyncIterator[bytes]) -> List:
+    """
+    Parse ids from a streamed CSV body: first column of each line, header row allowed.
+    The limit is enforced while reading, so oversized uploads are rejected early.
+    """
+    ids = []
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        ids.extend(parse_ids(line.decode().split(",", 1)[0] for line in lines))
+        if len(ids) > BATCH_VERIFY_MAX_IDS:
+            raise BatchTooLarge(f"At most {BATCH_VERIFY_MAX_IDS} ids per request")
+    if pending:
+        ids.extend(parse_ids([pending.decode().split(",", 1)[0]]))
+    # Drop a header row such as "cert_id"
+    if ids and isinstance(ids[0], str):
+        ids = ids[1:]
+    return ids
+
+
+async def stream_batch_results(
+    ids: List, as_bundle: bool = False, institution: str = database.DEFAULT_INSTITUTION
+) -> AsyncIterator[bytes]:
+    """
+    Yield one NDJSON line per requested id, in request order, chunk by chunk.
+    Fresh cache entries are reused as-is; everything else is resolved per chunk.
+    With `as_bundle`, each hit carries a signed bundle instead of the plain certificate.
+    """
+    field = b"bundle" if as_bundle else b"certificate"
+    async with database.open_async_session(institution) as db:
+        for start in range(0, len(ids), BATCH_VERIFY_CHUNK_SIZE):
+            chunk = ids[start:start + BATCH_VERIFY_CHUNK_SIZE]
+
+            resolved = {}
+            missing = []
+            for cert_id in chunk:
+                if not isinstance(cert_id, int):
+                    continue
+                if as_bundle:
+                    entry = bundles.cached_bundle(institution, cert_id)
+                else:
+                    entry = cache.public_certificates.get(institution, cert_id)
+                    if entry is not None and not entry.is_fresh():
+                        entry = None
+                if entry is not None:
+                    resolved[cert_id] = entry
+                else:
+                    missing.append(cert_id)
+            if missing:
+                load = bundles.build_bundles if as_bundle else load_public_certificates
+                resolved.update(await load(db, list(set(missing))))
+
+            lines = []
+            for cert_id in chunk:
+                if not isinstance(cert_id, int):
+                    lines.append(json.dumps({"input": cert_id, "found": False, "error": "Invalid certificate id"}).encode())
+                elif cert_id in resolved:
+                    lines.append(b'{"id":%d,"found":true,"%s":%s}' % (cert_id, field, resolved[cert_id].body))
+                else:
+                    lines.append(b'{"id":%d,"found":false}' % cert_id)
+            yield b"\n".join(lines) + b"\n"
@@ -0,0 +1,62 @@
+"""
+Compare two benchmark result files and flag regressions.
+
+A benchmark regresses when its median in NEW is more than --threshold slower
+than in BASE (default 10%). Exits 1 if anything regressed, so it can gate CI.
+
+Usage:
+    python -m benchmarks.compare benchmarks/results/abc1234.json benchmarks/results/def5678.json
+    python -m benchmarks.compare base.json new.json --threshold 0.05
+"""
+import argparse
+import json
+import sys
+
+
+def compare(base: dict, new: dict, threshold: float):
+    """Yield (size, name, base_ms, new_ms, change, status) for benchmarks present in both files."""
+    for size, benchmarks in new["results"].items():
+        base_benchmarks = base["results"].get(size, {})
+        for name, result in benchmarks.items():
+            if name not in base_benchmarks:
+                yield size, name, None, result["median_ms"], None, "new"
+                continue
+            base_ms, new_ms = base_benchmarks[name]["median_ms"], result["median_ms"]
+            change = (new_ms - base_ms) / base_ms if base_ms else 0.0
+            if change > threshold:
+                status = "REGRESSION"
+            elif change < -threshold:
+                status = "faster"
+            else:
+                status = "ok"
+            yield size, name, base_ms, new_ms, change, status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed median slowdown (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print(f"base {base['meta']['commit']}  ->  new {new['meta']['commit']}  (threshold {args.threshold:.0%})")
+    print(f"{'size':<8} {'benchmark':<45} {'base ms':>10} {'new ms':>10} {'change':>8}  status")
+    regressions = 0
+    for size, name, base_ms, new_ms, change, status in compare(base, new, args.threshold):
+        base_col = f"{base_ms:10.3f}" if base_ms is not None else f"{'-':>10}"
+        change_col = f"{change:+8.1%}" if change is not None else f"{'-':>8}"
+        print(f"{size:<8} {name:<45} {base_col} {new_ms:10.3f} {change_col}  {status}")
+        regressions += status == "REGRESSION"
+
+    if regressions:
+        print(f"\n{regressions} regression(s) beyond {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
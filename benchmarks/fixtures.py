@@ -0,0 +1,100 @@
+"""
+Deterministic datasets for the benchmarks.
+
+`seed(size)` fills the configured database with the same users, certificates,
+conditions and record chains every time for a given size, so numbers from two
+commits are measured against identical data.
+"""
+import random
+from datetime import datetime, timedelta
+
+from backend import auth, database, migrations, models
+
+SIZES = {
+    # name: (students, certificates, records per student)
+    "small": (20, 100, 5),
+    "medium": (200, 2000, 10),
+    "large": (1000, 10000, 20),
+}
+
+PASSWORD = "bench"
+BASE_TIME = datetime(2025, 1, 1)
+
+
+class Dataset:
+    """Ids and credentials the benchmarks refer to."""
+
+    def __init__(self, size):
+        self.size = size
+        self.admin = "bench_admin"
+        self.faculty = "bench_faculty"
+        self.students = []
+        self.cert_ids = []
+        self.ipfs_hash = None
+
+
+def seed(size: str) -> Dataset:
+    n_students, n_certs, n_records = SIZES[size]
+    rng = random.Random(f"trustcert-bench-{size}")
+    dataset = Dataset(size)
+    migrations.upgrade(database.engine)
+
+    db = database.SessionLocal()
+    try:
+        hashed = auth.get_password_hash(PASSWORD)
+        admin = models.User(username=dataset.admin, email="admin@bench", hashed_password=hashed, role="admin")
+        faculty = models.User(username=dataset.faculty, email="faculty@bench", hashed_password=hashed, role="faculty")
+        students = [
+            models.User(username=f"bench_student{i}", email=f"s{i}@bench", hashed_password=hashed, role="student")
+            for i in range(n_students)
+        ]
+        db.add_all([admin, faculty] + students)
+        db.flush()
+        dataset.students = [s.username for s in students]
+
+        # Record chains: Attendance and Grade per student
+        records = []
+        for student in students:
+            for category in ("Attendance", "Grade"):
+                prev_hash = models.RecordVersion.GENESIS_HASH
+                for i in range(n_records // 2):
+                    value = str(rng.randint(50, 100))
+                    timestamp = BASE_TIME + timedelta(days=i)
+                    data_hash = models.RecordVersion.compute_hash(category, value, timestamp, prev_hash)
+                    records.append({
+                        "student_id": student.id, "category": category, "value": value,
+                        "timestamp": timestamp, "issuer_id": faculty.id,
+                        "previous_hash": prev_hash, "data_hash": data_hash,
+                    })
+                    prev_hash = data_hash
+        db.bulk_insert_mappings(models.RecordVersion, records)
+
+        certs = []
+        for i in range(n_certs):
+            certs.append(models.Certificate(
+                title=f"Bench Certificate {i}",
+                student_id=students[rng.randrange(n_students)].id,
+                issuer_id=admin.id,
+                encrypted_ipfs_hash=f"bench{i:08d}",
+                decryption_key="mock_key_plain_text",
+                status="LOCKED",
+                created_at=BASE_TIME + timedelta(minutes=i),
+                updated_at=BASE_TIME + timedelta(minutes=i),
+            ))
+        db.add_all(certs)
+        db.flush()
+        conditions = []
+        for cert in certs:
+            conditions.append({"certificate_id": cert.id, "condition_type": "attendance",
+                               "target_value": str(rng.randint(60, 90)), "description": "Attendance",
+                               "current_value": "0", "is_met": False})
+            if rng.random() < 0.5:
+                conditions.append({"certificate_id": cert.id, "condition_type": "approval",
+                                   "target_value": "", "description": "Requires Faculty Approval",
+                                   "current_value": "0", "is_met": False})
+        db.bulk_insert_mappings(models.Condition, conditions)
+        db.commit()
+        dataset.cert_ids = [cert.id for cert in certs]
+    finally:
+        db.close()
+    return dataset
@@ -0,0 +1,228 @@
+"""
+Micro-benchmarks for the hot functions and endpoints.
+
+Each dataset size runs in its own process against a fresh SQLite database
+seeded by benchmarks.fixtures. Endpoints are called in-process through the
+ASGI app (no network, no server); plain functions are called directly.
+Results are written as JSON, by default to benchmarks/results/<commit>.json,
+for benchmarks.compare.
+
+Usage:
+    python -m benchmarks.run                          # small + medium
+    python -m benchmarks.run --sizes small,medium,large --out before.json
+    python -m benchmarks.run --only "GET /certificates/all" --iterations 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+AI_SAMPLES = [
+    "Release after 2026-06-15 if attendance > 75%",
+    "after 15 June 2026, approved by faculty",
+    "attendance > 80% and grade A",
+    "Requires approval by the head of department",
+]
+
+
+# --- Benchmarks ---
+def define_benchmarks(dataset, http, tokens):
+    """name -> (kind, callable(i)); kind is "sync" or "async". HTTP errors abort the run."""
+    from backend import ai_logic, auth, database
+
+    admin, faculty = tokens["admin"], tokens["faculty"]
+    cert_ids, students = dataset.cert_ids, dataset.students
+
+    def get_current_user(i):
+        db = database.SessionLocal()
+        try:
+            auth.get_current_user(token=admin["token"], db=db)
+        finally:
+            db.close()
+
+    def parse_condition(i):
+        ai_logic.AI_Condition_Parser.parse_condition(AI_SAMPLES[i % len(AI_SAMPLES)])
+
+    async def create_certificate(i):
+        (await http.post("/certificates/create", headers=admin["headers"], json={
+            "title": f"Bench Issued {i}",
+            "encrypted_ipfs_hash": "bench",
+            "decryption_key": "bench",
+            "student_username": students[i % len(students)],
+            "conditions_text": AI_SAMPLES[i % len(AI_SAMPLES)],
+            "require_approval": True,
+        })).raise_for_status()
+
+    async def verify_conditions(i):
+        (await http.post(f"/certificates/{cert_ids[i % len(cert_ids)]}/verify-conditions")).raise_for_status()
+
+    async def add_record(i):
+        (await http.post("/records/add", headers=faculty["headers"], json={
+            "student_username": students[i % len(students)],
+            "category": "Attendance" if i % 2 else "Grade",
+            "value": str(50 + i % 50),
+        })).raise_for_status()
+
+    async def all_certificates(i):
+        (await http.get("/certificates/all", headers=admin["headers"])).raise_for_status()
+
+    async def ipfs(i):
+        (await http.get("/ipfs/Qmu3dplt")).raise_for_status()
+
+    return {
+        "auth.get_current_user": ("sync", get_current_user),
+        "AI_Condition_Parser.parse_condition": ("sync", parse_condition),
+        "POST /certificates/create": ("async", create_certificate),
+        "POST /certificates/{id}/verify-conditions": ("async", verify_conditions),
+        "POST /records/add": ("async", add_record),
+        "GET /certificates/all": ("async", all_certificates),
+        "GET /ipfs/{ipfs_hash}": ("async", ipfs),
+    }
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * len(ordered))) - 1)]
+    return {
+        "samples": len(samples),
+        "median_ms": statistics.median(ordered) * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "min_ms": ordered[0] * 1000,
+        "p95_ms": p95 * 1000,
+        "stdev_ms": (statistics.stdev(ordered) if len(ordered) > 1 else 0.0) * 1000,
+        "ops_per_s": len(ordered) / sum(ordered) if sum(ordered) else 0.0,
+    }
+
+
+async def time_benchmark(kind, fn, iterations, warmup, max_seconds):
+    """Run `fn` up to `iterations` times (at least 5) or until `max_seconds` is spent."""
+    for i in range(warmup):
+        result = fn(i)
+        if kind == "async":
+            await result
+    samples = []
+    budget_end = time.perf_counter() + max_seconds
+    for i in range(warmup, warmup + iterations):
+        started = time.perf_counter()
+        result = fn(i)
+        if kind == "async":
+            await result
+        samples.append(time.perf_counter() - started)
+        if len(samples) >= 5 and time.perf_counter() > budget_end:
+            break
+    return summarize(samples)
+
+
+async def run_size(size, args):
+    import httpx
+    from benchmarks import fixtures
+    from backend import auth, audit, main
+
+    dataset = fixtures.seed(size)
+    tokens = {}
+    for role, username in (("admin", dataset.admin), ("faculty", dataset.faculty)):
+        token = auth.create_access_token({"sub": username})
+        tokens[role] = {"token": token, "headers": {"Authorization": f"Bearer {token}"}}
+
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        for name, (kind, fn) in define_benchmarks(dataset, http, tokens).items():
+            if args.only and name not in args.only:
+                continue
+            results[name] = await time_benchmark(kind, fn, args.iterations, args.warmup, args.max_seconds)
+            print(f"  [{size}] {name:<45} median {results[name]['median_ms']:8.3f} ms "
+                  f"({results[name]['samples']} samples)", file=sys.stderr)
+    audit.sink.stop()
+    return results
+
+
+def worker(size, args):
+    """Child process: isolate one dataset size in its own scratch database."""
+    workdir = tempfile.mkdtemp(prefix=f"trustcert-bench-{size}-")
+    os.environ["TRUSTCERT_DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["TRUSTCERT_AUDIT_DIR"] = os.path.join(workdir, "audit_segments")
+    os.environ["TRUSTCERT_BUNDLE_KEY_PATH"] = os.path.join(workdir, "bundle_signing_key.pem")
+    os.environ["TRUSTCERT_RATE_LIMIT"] = "0" # measure the endpoints, not the limiter
+    try:
+        results = asyncio.run(run_size(size, args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    with open(args.worker_out, "w") as f:
+        json.dump(results, f)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="small,medium", help="comma-separated: small, medium, large")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="time budget per benchmark")
+    parser.add_argument("--only", action="append", help="run only this benchmark (repeatable)")
+    parser.add_argument("--out", help="results file (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args)
+        return
+
+    from benchmarks.fixtures import SIZES
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+        },
+        "results": {},
+    }
+    for size in args.sizes.split(","):
+        if size not in SIZES:
+            raise SystemExit(f"Unknown size {size!r}; choose from {', '.join(SIZES)}")
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+            worker_out = tmp.name
+        cmd = [sys.executable, "-m", "benchmarks.run", "--worker", size, "--worker-out", worker_out,
+               "--iterations", str(args.iterations), "--warmup", str(args.warmup),
+               "--max-seconds", str(args.max_seconds)]
+        for name in args.only or []:
+            cmd += ["--only", name]
+        print(f"--- {size} ---", file=sys.stderr)
+        subprocess.run(cmd, cwd=REPO_ROOT, check=True)
+        with open(worker_out) as f:
+            report["results"][size] = json.load(f)
+        os.remove(worker_out)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+List endpoint serialization: ORM + schema validation vs. column tuples.
+
+Generates a database with init_db.py (--rows certificates, default 50k),
+then calls each list endpoint through the ASGI app two ways:
+- "orm": the previous implementation (ORM objects validated through the
+  `from_attributes` response schemas), mounted on the app under /legacy so it
+  runs behind the same middleware;
+- "fast": the current endpoint (column tuples + serialization.dumps).
+Authentication is skipped (legacy) or overridden with a fixed user (fast), so
+only the query and the serialization are compared. The two bodies are checked
+to be identical JSON before anything is timed.
+
+Usage:
+    python -m benchmarks.serialization
+    python -m benchmarks.serialization --rows 10000 --iterations 10
+    python -m benchmarks.serialization --stdlib-json   # the fallback encoder
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+from benchmarks.run import REPO_ROOT
+
+
+def legacy_router(student_username: str):
+    """The list endpoints as they were before the column-tuple fast path."""
+    from fastapi import APIRouter, Depends
+    from sqlalchemy import select
+    from sqlalchemy.orm import Session, selectinload
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from backend import audit_store, database, models, schemas
+
+    router = APIRouter(prefix="/legacy")
+
+    @router.get("/certificates/all", response_model=List[schemas.CertificateResponse])
+    def get_all_certificates(db: Session = Depends(database.get_db)):
+        certs = db.query(models.Certificate).order_by(models.Certificate.id.desc()).all()
+        for c in certs:
+            c.student_username = c.student.username
+        return certs
+
+    @router.get("/records/{student_username}", response_model=List[schemas.RecordResponse])
+    async def get_student_records(student_username: str, db: AsyncSession = Depends(database.get_async_db)):
+        student = (await db.execute(select(models.User).filter(models.User.username == student_username))).scalars().first()
+        result = await db.execute(
+            select(models.RecordVersion)
+            .filter(models.RecordVersion.student_id == student.id)
+            .order_by(models.RecordVersion.id.desc())
+        )
+        return result.scalars().all()
+
+    @router.get("/my-certificates", response_model=List[schemas.CertificateResponse])
+    async def get_my_certificates(db: AsyncSession = Depends(database.get_async_db)):
+        student = (await db.execute(select(models.User).filter(models.User.username == student_username))).scalars().first()
+        result = await db.execute(
+            select(models.Certificate)
+            .options(selectinload(models.Certificate.conditions))
+            .filter(models.Certificate.student_id == student.id)
+            .order_by(models.Certificate.created_at.desc())
+        )
+        certs = result.scalars().all()
+        for c in certs:
+            c.student_username = student.username
+        return certs
+
+    @router.get("/audit-logs", response_model=List[schemas.AuditLogResponse])
+    def get_audit_logs(limit: int = 100):
+        return audit_store.store.tail(limit=limit)
+
+    return router
+
+
+async def time_endpoint(http, path, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        (await http.get(path)).raise_for_status()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+async def run(args):
+    import httpx
+    from sqlalchemy import func, select
+    from backend import auth, database, main, models, serialization
+
+    db = database.SessionLocal()
+    try:
+        admin = db.execute(select(models.User).where(models.User.role == models.UserRole.ADMIN)).scalars().first()
+        # The student with the most certificates, for /my-certificates
+        student_id = db.execute(
+            select(models.Certificate.student_id).group_by(models.Certificate.student_id)
+            .order_by(func.count().desc()).limit(1)
+        ).scalar()
+        student = db.get(models.User, student_id)
+        db.expunge_all()
+    finally:
+        db.close()
+
+    endpoints = {
+        "/certificates/all": (auth.get_current_user, admin),
+        f"/records/{student.username}": (auth.get_current_user_async, admin),
+        "/my-certificates": (auth.get_current_user_async, student),
+        "/audit-logs?limit=1000": (auth.get_current_user, admin),
+    }
+    main.app.include_router(legacy_router(student.username))
+    if args.stdlib_json:
+        serialization.orjson = None
+    print(f"encoder: {'orjson' if serialization.orjson is not None else 'json'}")
+    print(f"{'endpoint':<40} {'rows':>7} {'orm ms':>10} {'fast ms':>10} {'speedup':>8}")
+    for path, (dependency, user) in endpoints.items():
+        main.app.dependency_overrides = {dependency: lambda user=user: user}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as http:
+            old_body, new_body = (await http.get("/legacy" + path)).json(), (await http.get(path)).json()
+            if old_body != new_body:
+                raise SystemExit(f"{path}: fast path output differs from the schema-validated output")
+            orm_ms = await time_endpoint(http, "/legacy" + path, args.iterations)
+            fast_ms = await time_endpoint(http, path, args.iterations)
+        print(f"{path.split('?')[0][:40]:<40} {len(new_body):>7} {orm_ms:10.1f} {fast_ms:10.1f} {orm_ms / fast_ms:7.1f}x")
+    main.app.dependency_overrides = {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000, help="certificates to generate")
+    parser.add_argument("--records-per-student", type=int, default=1_000)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--stdlib-json", action="store_true", help="encode with json instead of orjson")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="trustcert-serialization-")
+    os.environ["TRUSTCERT_DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["TRUSTCERT_AUDIT_DIR"] = os.path.join(workdir, "audit_segments")
+    os.environ["TRUSTCERT_RATE_LIMIT"] = "0" # measure the endpoints, not the limiter
+    try:
+        subprocess.run(
+            [sys.executable, os.path.join(REPO_ROOT, "init_db.py"), "--generate", "small",
+             "--users", "100", "--certificates", str(args.rows), "--records-per-student", str(args.records_per_student),
+             "--vaults", "0", "--audit-logs", "1000"],
+            cwd=workdir, check=True, stdout=subprocess.DEVNULL,
+        )
+        asyncio.run(run(args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
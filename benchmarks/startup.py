@@ -0,0 +1,123 @@
+"""
+Startup-time benchmark: how long a fresh worker takes to accept traffic.
+
+Measured in fresh subprocesses, so nothing is warm:
+- import: `import backend.main` (interpreter start subtracted, using a bare
+  `python -c pass` baseline);
+- ready: spawning uvicorn until the first 200 on GET /, against a database
+  that was migrated beforehand (as in a deploy, where `python init_db.py`
+  runs once before the workers start).
+
+Exits 1 if the median time to ready exceeds --target (default 1s).
+
+Usage:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --json
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.run import REPO_ROOT
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _elapsed(cmd, env, cwd) -> float:
+    started = time.perf_counter()
+    subprocess.run(cmd, env=env, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def _answers(port: int) -> bool:
+    # A bare http.client probe: an httpx client per poll (SSL context, CA bundle) costs more than startup itself
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+    try:
+        conn.request("GET", "/")
+        return conn.getresponse().status == 200
+    except OSError:
+        return False
+    finally:
+        conn.close()
+
+
+def time_to_ready(env, cwd, timeout: float = 30.0) -> float:
+    port = _free_port()
+    cmd = [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"]
+    started = time.perf_counter()
+    server = subprocess.Popen(cmd, env=env, cwd=cwd)
+    try:
+        while time.perf_counter() - started < timeout:
+            if _answers(port):
+                return time.perf_counter() - started
+            if server.poll() is not None:
+                raise SystemExit("uvicorn exited during startup")
+            time.sleep(0.005)
+        raise SystemExit(f"uvicorn did not answer within {timeout:.0f}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def summarize(samples):
+    return {
+        "runs": len(samples),
+        "median_ms": statistics.median(samples) * 1000,
+        "min_ms": min(samples) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target", type=float, default=1.0, help="max median seconds to first 200")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="trustcert-startup-")
+    os.makedirs(os.path.join(workdir, "backend"))
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, TRUSTCERT_AUTO_MIGRATE="0")
+    try:
+        subprocess.run([sys.executable, os.path.join(REPO_ROOT, "init_db.py")], env=env, cwd=workdir, check=True,
+                       stdout=subprocess.DEVNULL)
+        baseline, imports, ready = [], [], []
+        for _ in range(args.runs):
+            baseline.append(_elapsed([sys.executable, "-c", "pass"], env, workdir))
+            imports.append(_elapsed([sys.executable, "-c", "import backend.main"], env, workdir))
+            ready.append(time_to_ready(env, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    interpreter = statistics.median(baseline)
+    results = {
+        "interpreter": summarize(baseline),
+        "import": summarize([max(0.0, t - interpreter) for t in imports]),
+        "ready": summarize(ready),
+        "target_ms": args.target * 1000,
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name in ("interpreter", "import", "ready"):
+            r = results[name]
+            print(f"{name:<12} median {r['median_ms']:8.1f} ms   min {r['min_ms']:8.1f}   max {r['max_ms']:8.1f}")
+    if results["ready"]["median_ms"] > results["target_ms"]:
+        print(f"Median time to first 200 is over the {args.target:.1f}s target", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
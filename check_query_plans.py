@@ -0,0 +1,85 @@
+"""
+Query-plan check for the hot read paths.
+
+Builds a throwaway migrated SQLite database, runs EXPLAIN QUERY PLAN on the
+queries issued by the hot endpoints in backend/main.py and exits non-zero if
+any of them falls back to a full table scan.
+
+Usage:
+    python check_query_plans.py
+"""
+import sys
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import migrations, models, approvals
+
+STUDENT_ID = 1
+FACULTY_ID = 2
+
+
+def hot_queries(db):
+    """(endpoint, query) pairs mirroring the filters used in backend/main.py."""
+    yield "/my-certificates", db.query(models.Certificate).filter(
+        models.Certificate.student_id == STUDENT_ID
+    ).order_by(models.Certificate.created_at.desc())
+
+    yield "/my-vaults", db.query(models.Vault).filter(
+        models.Vault.owner_id == STUDENT_ID
+    ).order_by(models.Vault.id.desc())
+
+    yield "/certificates/public/{cert_id} (conditions)", db.query(models.Condition).filter(
+        models.Condition.certificate_id == 1
+    )
+
+    yield "/pending-approvals", approvals.inbox_page_query(FACULTY_ID, before_id=1000)
+
+    yield "/records/{student_username}", db.query(models.RecordVersion).filter(
+        models.RecordVersion.student_id == STUDENT_ID
+    ).order_by(models.RecordVersion.id.desc())
+
+    yield "/records/add (chain head)", db.query(models.RecordVersion).filter(
+        models.RecordVersion.student_id == STUDENT_ID,
+        models.RecordVersion.category == "Attendance"
+    ).order_by(models.RecordVersion.id.desc()).limit(1)
+
+    yield "/records/my-history", db.query(models.RecordVersion).filter(
+        models.RecordVersion.issuer_id == FACULTY_ID
+    ).order_by(models.RecordVersion.timestamp.desc())
+
+
+def full_scans(conn, sql):
+    """Return plan lines that scan a table without using any index (scans of bounded subqueries are fine)."""
+    plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    details = [row[-1] for row in plan]
+    return [
+        d for d in details
+        if d.startswith("SCAN") and "INDEX" not in d and d.split()[1] in models.Base.metadata.tables
+    ]
+
+
+def run_check():
+    engine = create_engine("sqlite://")
+    migrations.upgrade(engine)
+    db = sessionmaker(bind=engine)()
+
+    failures = 0
+    with engine.connect() as conn:
+        for endpoint, query in hot_queries(db):
+            statement = getattr(query, "statement", query)
+            sql = str(statement.compile(engine, compile_kwargs={"literal_binds": True}))
+            scans = full_scans(conn, sql)
+            if scans:
+                failures += 1
+                print(f"    FAILURE: {endpoint} -> {'; '.join(scans)}")
+            else:
+                print(f"    OK: {endpoint}")
+
+    db.close()
+    return failures
+
+
+if __name__ == "__main__":
+    print("--- Checking Query Plans ---")
+    sys.exit(1 if run_check() else 0)
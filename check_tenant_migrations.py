@@ -0,0 +1,72 @@
+"""
+Tenant migration check.
+
+Builds a throwaway primary database and one tenant database ("north"), gives
+the tenant a pre-segment-store audit_logs row, runs migrations.upgrade_tenants
+and exits non-zero unless the row was carried over into the tenant's own
+audit store (TRUSTCERT_AUDIT_DIR/north/) and nothing reached the default
+institution's store.
+
+Usage:
+    python check_tenant_migrations.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+
+# Configure the tenants before backend reads its settings at import
+WORKDIR = tempfile.mkdtemp(prefix="trustcert-tenants-")
+TENANT = "north"
+os.environ["TRUSTCERT_DATABASE_URL"] = f"sqlite:///{os.path.join(WORKDIR, 'primary.db')}"
+os.environ["TRUSTCERT_TENANT_DATABASES"] = f"{TENANT}=sqlite:///{os.path.join(WORKDIR, 'north.db')}"
+os.environ["TRUSTCERT_AUDIT_DIR"] = os.path.join(WORKDIR, "audit_segments")
+
+from sqlalchemy import insert
+
+from backend import audit_store, database, migrations, models
+
+def seed_legacy_audit_row():
+    """A tenant database from before the segment store: baseline tables holding one audit row."""
+    with database.tenants[TENANT].engine.begin() as conn:
+        migrations._baseline(conn) # idempotent; upgrade_tenants then applies every migration
+        conn.execute(insert(models.AuditLog).values(
+            action="CREATE_CERT", target_id="1", details="legacy north entry",
+            actor_username="north_admin", timestamp=datetime(2024, 1, 1),
+        ))
+
+
+def run_check() -> bool:
+    """True if the check failed."""
+    seed_legacy_audit_row()
+    migrations.upgrade_tenants()
+
+    tenant_entries = audit_store.store_for(TENANT).tail()
+    default_entries = audit_store.store_for(database.DEFAULT_INSTITUTION).tail()
+    tenant_root = os.path.join(os.environ["TRUSTCERT_AUDIT_DIR"], TENANT)
+
+    failed = False
+    if audit_store.store_for(TENANT).root != tenant_root or not audit_store.store_for(TENANT).days():
+        print(f"    FAIL: no audit segments under {tenant_root}")
+        failed = True
+    if [e["details"] for e in tenant_entries] != ["legacy north entry"]:
+        print(f"    FAIL: {TENANT} store holds {len(tenant_entries)} entries, expected its one legacy row")
+        failed = True
+    if default_entries:
+        print(f"    FAIL: {len(default_entries)} entries leaked into the default institution's store")
+        failed = True
+    if not failed:
+        print(f"    OK: legacy audit rows of {TENANT} migrated into {tenant_root}")
+    return failed
+
+
+if __name__ == "__main__":
+    print("--- Checking Tenant Migrations ---")
+    try:
+        failed = run_check()
+    finally:
+        for tenant in database.tenants.values():
+            tenant.engine.dispose()
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+    sys.exit(1 if failed else 0)
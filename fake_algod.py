@@ -0,0 +1,102 @@
+"""
+Local algod stand-in for development, anchoring checks and load tests.
+
+Implements just enough of the algod v2 REST API for the backend:
+suggested params, transaction submission (the note field is kept so anchored
+Merkle roots can be inspected), pending transaction info and status.
+Signatures are not checked and every transaction confirms immediately.
+
+Usage:
+    python fake_algod.py [--port 4001]
+    python init_db.py && ALGOD_ADDRESS=http://127.0.0.1:4001 uvicorn backend.main:app
+"""
+import argparse
+import base64
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import msgpack
+
+GENESIS_HASH = base64.b64encode(hashlib.sha256(b"trustcert-fake-algod").digest()).decode()
+
+
+class FakeLedger:
+    def __init__(self):
+        self.round = 1000
+        self.transactions = {}
+        self.lock = threading.Lock()
+
+    def submit(self, raw: bytes) -> str:
+        signed = msgpack.unpackb(raw, raw=True, strict_map_key=False)
+        txn = signed.get(b"txn", {})
+        txid = base64.b32encode(hashlib.sha512(raw).digest()[:32]).decode().rstrip("=")
+        with self.lock:
+            self.round += 1
+            self.transactions[txid] = {
+                "confirmed-round": self.round,
+                "pool-error": "",
+                "txn": {"txn": {"note": base64.b64encode(txn.get(b"note", b"")).decode()}},
+            }
+        return txid
+
+
+def make_handler(ledger: FakeLedger):
+    class Handler(BaseHTTPRequestHandler):
+        def _json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.startswith("/health"):
+                return self._json(200, {})
+            if self.path.startswith("/v2/status"):
+                return self._json(200, {"last-round": ledger.round})
+            if self.path.startswith("/v2/transactions/params"):
+                return self._json(200, {
+                    "consensus-version": "fake",
+                    "fee": 0,
+                    "min-fee": 1000,
+                    "genesis-hash": GENESIS_HASH,
+                    "genesis-id": "fake-v1",
+                    "last-round": ledger.round,
+                })
+            if self.path.startswith("/v2/transactions/pending/"):
+                txid = self.path.rsplit("/", 1)[-1].split("?")[0]
+                info = ledger.transactions.get(txid)
+                if info is None:
+                    return self._json(404, {"message": "txn not found"})
+                return self._json(200, info)
+            return self._json(404, {"message": "not implemented by fake algod"})
+
+        def do_POST(self):
+            if self.path.startswith("/v2/transactions"):
+                length = int(self.headers.get("Content-Length", 0))
+                txid = ledger.submit(self.rfile.read(length))
+                return self._json(200, {"txId": txid})
+            return self._json(404, {"message": "not implemented by fake algod"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(port: int = 4001):
+    ledger = FakeLedger()
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(ledger))
+    return server, ledger
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=4001)
+    args = parser.parse_args()
+    server, _ = serve(args.port)
+    print(f"Fake algod listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
@@ -4,6 +4,7 @@ import {
     FaShieldAlt, FaPlus, FaCheck, FaTimes, FaLock, FaGlobe,
     FaFileAlt, FaHistory, FaCog, FaSearch, FaMagic
 } from 'react-icons/fa';
+import useEventStream from './useEventStream';
 
 const API_base = "http://127.0.0.1:8000";
 
@@ -45,12 +46,6 @@ const DashboardAdmin = ({ token, user, activeTab, setActiveTab }) => {
                 headers: { Authorization: `Bearer ${token}` }
             });
             setCertificates(res.data);
-
-            // Update stats based on real data if desirable, or keep mock for "Wow" factor as requested
-            const locked = res.data.filter(c => c.status === 'LOCKED').length;
-            const active = res.data.filter(c => c.status === 'UNLOCKED').length;
-            setStats(prev => ({ ...prev, locked, active }));
-
         } catch (err) {
             console.error("Failed to fetch certs", err);
         }
@@ -70,13 +65,29 @@ const DashboardAdmin = ({ token, user, activeTab, setActiveTab }) => {
 
     // Fetch Data
     useEffect(() => {
-        if (activeTab === 'dashboard') {
-            fetchCertificates();
-        } else if (activeTab === 'audit') {
+        fetchCertificates();
+    }, []);
+
+    useEffect(() => {
+        if (activeTab === 'audit') {
             fetchAuditLogs();
         }
     }, [activeTab]);
 
+    // Live updates: merge pushed deltas into the certificate list instead of re-fetching it
+    useEventStream(token, {
+        'certificate.created': (cert) => setCertificates(prev => [cert, ...prev.filter(c => c.id !== cert.id)]),
+        'certificate.status': ({ id, status }) => setCertificates(prev => prev.map(c => c.id === id ? { ...c, status } : c)),
+        'certificate.deleted': ({ id }) => setCertificates(prev => prev.filter(c => c.id !== id))
+    }, fetchCertificates);
+
+    // Update stats based on real data if desirable, or keep mock for "Wow" factor as requested
+    useEffect(() => {
+        const locked = certificates.filter(c => c.status === 'LOCKED').length;
+        const active = certificates.filter(c => c.status === 'UNLOCKED').length;
+        setStats(prev => ({ ...prev, locked, active }));
+    }, [certificates]);
+
     // Live NLP Parsing (Mock Logic for UI responsiveness)
     useEffect(() => {
         const text = formData.conditions_text.toLowerCase();
@@ -123,7 +134,7 @@ const DashboardAdmin = ({ token, user, activeTab, setActiveTab }) => {
 
             alert("Certificate Created Successfully!");
             setFormData({ ...formData, title: '', student_username: '', conditions_text: '', manual_date: '' });
-            fetchCertificates();
+            // The new certificate arrives over the event stream
             setActiveTab('dashboard'); // Redirect to dashboard to see it
         } catch (err) {
             alert("Error creating certificate: " + (err.response?.data?.detail || err.message));
@@ -169,7 +180,7 @@ const DashboardAdmin = ({ token, user, activeTab, setActiveTab }) => {
                 headers: { Authorization: `Bearer ${token}` }
             });
             console.log("Delete successful");
-            fetchCertificates();
+            setCertificates(prev => prev.filter(c => c.id !== id));
         } catch (err) {
             console.error("Delete error:", err);
             if (err.response) {
@@ -3,6 +3,7 @@ import axios from 'axios';
 import {
     FaUserGraduate, FaClipboardCheck, FaHistory, FaPlus, FaCheck, FaTimes, FaList
 } from 'react-icons/fa';
+import useEventStream from './useEventStream';
 
 const API_base = "http://127.0.0.1:8000";
 
@@ -36,7 +37,6 @@ const DashboardFaculty = ({ token, user, activeTab, setActiveTab }) => {
                 headers: { Authorization: `Bearer ${token}` }
             });
             setMyRecords(res.data);
-            setStats(prev => ({ ...prev, recordsWritten: res.data.length }));
         } catch (err) {
             console.error("Error fetching records", err);
         }
@@ -48,7 +48,6 @@ const DashboardFaculty = ({ token, user, activeTab, setActiveTab }) => {
                 headers: { Authorization: `Bearer ${token}` }
             });
             setPendingCerts(res.data);
-            setStats(prev => ({ ...prev, pendingApprovals: res.data.length }));
         } catch (err) {
             console.error("Error fetching approvals", err);
         }
@@ -58,7 +57,24 @@ const DashboardFaculty = ({ token, user, activeTab, setActiveTab }) => {
     useEffect(() => {
         fetchMyRecords();
         fetchPendingApprovals();
-    }, [activeTab]); // Refresh when tab changes
+    }, []);
+
+    // Live updates: merge pushed deltas instead of re-fetching on every tab change
+    useEventStream(token, {
+        'approval.pending': (cert) => setPendingCerts(prev => [cert, ...prev.filter(c => c.id !== cert.id)]),
+        'approval.resolved': ({ certificate_id }) => setPendingCerts(prev => prev.filter(c => c.id !== certificate_id)),
+        'certificate.deleted': ({ id }) => setPendingCerts(prev => prev.filter(c => c.id !== id)),
+        'record.added': (record) => {
+            if (record.issuer_id === user?.id) setMyRecords(prev => [record, ...prev.filter(r => r.id !== record.id)]);
+        }
+    }, () => {
+        fetchMyRecords();
+        fetchPendingApprovals();
+    });
+
+    useEffect(() => {
+        setStats({ recordsWritten: myRecords.length, pendingApprovals: pendingCerts.length });
+    }, [myRecords, pendingCerts]);
 
     // --- Handlers ---
     const handleWriteRecord = async () => {
@@ -68,8 +84,7 @@ const DashboardFaculty = ({ token, user, activeTab, setActiveTab }) => {
             });
             alert("Record added successfully!");
             setRecordForm({ student_username: '', category: 'Attendance', value: '' });
-            fetchMyRecords();
-            setActiveTab('ledger');
+            setActiveTab('ledger'); // The new record arrives over the event stream
         } catch (err) {
             alert("Failed to add record: " + (err.response?.data?.detail || err.message));
         }
@@ -81,7 +96,7 @@ const DashboardFaculty = ({ token, user, activeTab, setActiveTab }) => {
                 headers: { Authorization: `Bearer ${token}` }
             });
             alert("Certificate Approved!");
-            fetchPendingApprovals();
+            setPendingCerts(prev => prev.filter(c => c.id !== certId));
         } catch (err) {
             alert("Failed to approve");
         }
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { FiLock, FiUnlock, FiDownload, FiClock, FiCheckCircle, FiXCircle, FiCopy, FiHome, FiAward, FiList, FiShield, FiUser } from 'react-icons/fi';
 import CryptoJS from 'crypto-js';
+import useEventStream from './useEventStream';
 
 const API_BASE = "http://127.0.0.1:8000";
 
@@ -259,6 +260,14 @@ const DashboardStudent = ({ token, activeTab, setActiveTab }) => {
         }
     };
 
+    // Live updates: merge pushed deltas instead of re-fetching the lists
+    useEventStream(token, {
+        'certificate.created': (cert) => setCerts(prev => [cert, ...prev.filter(c => c.id !== cert.id)]),
+        'certificate.status': ({ id, status }) => setCerts(prev => prev.map(c => c.id === id ? { ...c, status } : c)),
+        'certificate.deleted': ({ id }) => setCerts(prev => prev.filter(c => c.id !== id)),
+        'record.added': (record) => setRecords(prev => [record, ...prev.filter(r => r.id !== record.id)])
+    }, fetchCerts);
+
     const copyToClipboard = (text) => {
         navigator.clipboard.writeText(text);
         setMessage({ type: 'success', text: "ID Copied to clipboard!" });
@@ -316,7 +325,16 @@ const DashboardStudent = ({ token, activeTab, setActiveTab }) => {
 
             if (res.data.status === "success") {
                 setMessage({ type: 'success', text: "Conditions updated!" });
-                fetchCerts(); // Refresh to see if unlocked
+                // Only an unlock is pushed over the event stream: apply the new status and
+                // condition flags right away (both lists are in condition id order)...
+                const met = res.data.conditions.map(cond => cond.met);
+                setCerts(prev => prev.map(c => c.id === certId ? {
+                    ...c,
+                    status: res.data.cert_status,
+                    conditions: c.conditions.map((cond, i) => (i < met.length ? { ...cond, is_met: met[i] } : cond)),
+                } : c));
+                // ...then reload, since the stream only carries this worker's events
+                fetchCerts();
             }
         } catch (err) {
             console.error(err);
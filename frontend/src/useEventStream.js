@@ -0,0 +1,52 @@
+import { useEffect, useRef } from 'react';
+
+const API_BASE = "http://127.0.0.1:8000";
+
+const EVENT_TYPES = [
+    'certificate.created',
+    'certificate.status',
+    'certificate.deleted',
+    'approval.pending',
+    'approval.resolved',
+    'record.added'
+];
+
+// Subscribes to the backend's push updates (/events/stream) and calls
+// handlers[type](data) for each delta. `onResync` runs when the stream
+// reconnects or the server reports dropped events: re-fetch once then.
+const useEventStream = (token, handlers, onResync) => {
+    const handlersRef = useRef(handlers);
+    const resyncRef = useRef(onResync);
+
+    useEffect(() => {
+        handlersRef.current = handlers;
+        resyncRef.current = onResync;
+    });
+
+    useEffect(() => {
+        if (!token) return;
+
+        // EventSource cannot send an Authorization header
+        const source = new EventSource(`${API_BASE}/events/stream?token=${encodeURIComponent(token)}`);
+        let connectedOnce = false;
+
+        source.addEventListener('ready', () => {
+            // Events may have been missed while disconnected
+            if (connectedOnce && resyncRef.current) resyncRef.current();
+            connectedOnce = true;
+        });
+        source.addEventListener('resync', () => {
+            if (resyncRef.current) resyncRef.current();
+        });
+        EVENT_TYPES.forEach(type => {
+            source.addEventListener(type, (e) => {
+                const handler = handlersRef.current[type];
+                if (handler) handler(JSON.parse(e.data));
+            });
+        });
+
+        return () => source.close();
+    }, [token]);
+};
+
+export default useEventStream;
@@ -1,14 +1,353 @@
-from backend import database, models
+"""
+Create or upgrade the schema, and optionally fill it with synthetic data.
+
+    python init_db.py                                  # apply migrations only
+    python init_db.py --generate medium                # + a preset volume of data
+    python init_db.py --generate large --workers 8
+    python init_db.py --generate small --certificates 50000 --seed 7
+
+Generated rows are appended to whatever is already in the database (ids are
+allocated above the current maximum). Rows are built in worker processes and
+bulk-inserted by this process in chunks, since SQLite only has one writer.
+Record chains carry valid hashes, certificates with unmet approvals get their
+approval inbox entries, and audit entries go to the segment store. All
+generated users share the password printed at the end. Migrations are applied
+to every tenant database; generated data goes to the primary (the default
+institution).
+"""
+import argparse
+import json
+import multiprocessing
 import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, func, insert, select
+
+from backend import audit_store, auth, cache, database, migrations, models, verification
+
+# --- Presets ---
+# users, certificates, records per student, vaults, audit entries
+SCALES = {
+    "small": (1_000, 5_000, 10, 1_000, 10_000),
+    "medium": (20_000, 200_000, 20, 20_000, 200_000),
+    "large": (200_000, 2_000_000, 20, 200_000, 2_000_000),
+}
+
+# Share of generated users per role (the rest are students)
+ROLE_SHARES = [(models.UserRole.ADMIN, 0.001), (models.UserRole.FACULTY, 0.02), (models.UserRole.VERIFIER, 0.01)]
+
+# Condition mixes, cycled by certificate index so condition ids can be computed without coordination
+CONDITION_MIXES = [
+    ("time",),
+    ("attendance",),
+    ("time", "approval"),
+    ("attendance", "grade"),
+    ("approval",),
+    ("time", "attendance", "approval"),
+    ("grade",),
+]
+_MIX_OFFSETS = [sum(len(m) for m in CONDITION_MIXES[:i]) for i in range(len(CONDITION_MIXES))]
+_CONDITIONS_PER_CYCLE = sum(len(m) for m in CONDITION_MIXES)
+
+RECORD_CATEGORIES = ["Attendance", "Grade", "Behavior"]
+GRADES = ["A", "A", "B", "B", "B", "C", "C", "D"]
+BEHAVIORS = ["Good", "Good", "Good", "Warning", "Suspended"]
+AUDIT_ACTIONS = ["LOGIN", "CREATE_CERT", "APPROVE_CONDITION", "CREATE_RECORD", "DELETE_CERT"]
+
+GENERATED_PASSWORD = "password"
+TASK_SIZE = 5_000 # certificates / students / vaults / audit entries per worker task
+START_TIME = datetime(2024, 1, 1)
+SPAN_SECONDS = 365 * 24 * 3600
+
 
 def init_db():
     print("Connecting to DB at:", database.SQLALCHEMY_DATABASE_URL)
     try:
-        models.Base.metadata.create_all(bind=database.engine)
-        print("Tables created successfully.")
+        applied = migrations.upgrade_tenants(verbose=True)
+        count = sum(len(versions) for versions in applied.values())
+        if count:
+            print(f"Applied {count} migration(s).")
+        else:
+            print("Schema already up to date.")
     except Exception as e:
-        print(f"Error creating tables: {e}")
+        print(f"Error applying migrations: {e}")
+
+
+# --- Row builders (run in worker processes) ---
+class Plan:
+    """Id ranges and volumes shared by the parent and the workers."""
+
+    def __init__(self, users, certificates, records_per_student, vaults, audit_logs, seed, db):
+        self.seed = seed
+        self.n_users = users
+        self.n_certificates = certificates
+        self.records_per_student = records_per_student
+        self.n_vaults = vaults
+        self.n_audit = audit_logs
+
+        def next_id(model, column="id"):
+            return (db.execute(select(func.max(getattr(model, column)))).scalar() or 0) + 1
+
+        self.user_base = next_id(models.User)
+        self.cert_base = next_id(models.Certificate)
+        self.condition_base = next_id(models.Condition)
+        self.vault_base = next_id(models.Vault)
+        self.app_id_base = max(next_id(models.Vault, "app_id"), 1_000_000)
+
+        # Contiguous id range per role, in ROLE_SHARES order, students last
+        self.roles = []
+        start = self.user_base
+        for role, share in ROLE_SHARES:
+            count = max(1, int(users * share))
+            self.roles.append((role, start, start + count))
+            start += count
+        self.roles.append((models.UserRole.STUDENT, start, self.user_base + users))
+        self.admins = self.roles[0][1:]
+        self.faculty = self.roles[1][1:]
+        self.students = self.roles[-1][1:]
+
+    def rng(self, kind, start):
+        return random.Random(f"{self.seed}-{kind}-{start}")
+
+    def condition_id(self, cert_index, position):
+        cycle, slot = divmod(cert_index, len(CONDITION_MIXES))
+        return self.condition_base + cycle * _CONDITIONS_PER_CYCLE + _MIX_OFFSETS[slot] + position
+
+    def timestamp(self, rng):
+        return START_TIME + timedelta(seconds=rng.randrange(SPAN_SECONDS))
+
+
+def _build_users(plan, start, end, hashed_password):
+    rows = []
+    for role, lo, hi in plan.roles:
+        for user_id in range(max(lo, start), min(hi, end)):
+            name = f"{role.value}_{user_id}"
+            rows.append({"id": user_id, "username": name, "email": f"{name}@example.edu",
+                         "hashed_password": hashed_password, "role": role.value})
+    return {models.User: rows}
+
+
+def _build_records(plan, start, end):
+    rng = plan.rng("records", start)
+    issuers = plan.faculty
+    rows = []
+    for student_id in range(start, end):
+        # One chain per category; records are emitted in chain order so autoincrement ids follow it
+        for category in RECORD_CATEGORIES:
+            prev_hash = models.RecordVersion.GENESIS_HASH
+            timestamp = plan.timestamp(rng)
+            for _ in range(max(1, plan.records_per_student // len(RECORD_CATEGORIES))):
+                if category == "Attendance":
+                    value = str(rng.randint(40, 100))
+                elif category == "Grade":
+                    value = rng.choice(GRADES)
+                else:
+                    value = rng.choice(BEHAVIORS)
+                timestamp += timedelta(hours=rng.randint(1, 240))
+                data_hash = models.RecordVersion.compute_hash(category, value, timestamp, prev_hash)
+                rows.append({"student_id": student_id, "category": category, "value": value,
+                             "timestamp": timestamp, "issuer_id": rng.randrange(*issuers),
+                             "previous_hash": prev_hash, "data_hash": data_hash})
+                prev_hash = data_hash
+    return {models.RecordVersion: rows}
+
+
+def _build_condition(rng, plan, condition_type):
+    if condition_type == "time":
+        target = plan.timestamp(rng).date().isoformat()
+        met = target < "2024-09-01"
+        return {"condition_type": "time", "target_value": target, "description": f"Release after {target}",
+                "current_value": None, "is_met": met}
+    if condition_type == "attendance":
+        target = rng.choice([60, 70, 75, 80, 90])
+        current = rng.randint(40, 100)
+        return {"condition_type": "attendance", "target_value": str(target), "description": f"Attendance > {target}%",
+                "current_value": f"{current}%", "is_met": current >= target}
+    if condition_type == "grade":
+        target = rng.choice(["A", "B", "C"])
+        current = rng.choice(GRADES)
+        return {"condition_type": "grade", "target_value": target, "description": f"Grade {target} or better",
+                "current_value": current, "is_met": current <= target}
+    targeted = rng.random() < 0.5
+    return {"condition_type": "approval", "target_value": "", "description": "Requires Faculty Approval",
+            "current_value": None, "is_met": rng.random() < 0.6,
+            "target_recipient_id": rng.randrange(*plan.faculty) if targeted else None}
+
+
+def _build_certificates(plan, start, end):
+    rng = plan.rng("certificates", start)
+    certs, conditions, inbox = [], [], []
+    for index in range(start, end):
+        cert_id = plan.cert_base + index
+        created_at = plan.timestamp(rng)
+        cert_conditions = []
+        for position, condition_type in enumerate(CONDITION_MIXES[index % len(CONDITION_MIXES)]):
+            condition = _build_condition(rng, plan, condition_type)
+            condition.update(id=plan.condition_id(index, position), certificate_id=cert_id)
+            condition.setdefault("target_recipient_id", None)
+            cert_conditions.append(condition)
+        cert = {
+            "id": cert_id, "title": f"Certificate {cert_id}",
+            "student_id": rng.randrange(*plan.students), "issuer_id": rng.randrange(*plan.admins),
+            "encrypted_ipfs_hash": f"Qm{rng.getrandbits(64):016x}", "decryption_key": f"key{rng.getrandbits(32):08x}",
+            "status": "UNLOCKED" if all(c["is_met"] for c in cert_conditions) else "LOCKED",
+            "created_at": created_at, "updated_at": created_at,
+        }
+        certs.append(cert)
+        conditions.extend(cert_conditions)
+
+        pending = [c for c in cert_conditions if c["condition_type"] == "approval" and not c["is_met"]]
+        if pending:
+            payload = verification.render_certificate(
+                models.Certificate(**cert), f"student_{cert['student_id']}",
+                [models.Condition(**c) for c in cert_conditions],
+            )
+            body = json.dumps(payload, separators=(",", ":"))
+            for c in pending:
+                inbox.append({"faculty_id": c["target_recipient_id"] or models.SHARED_INBOX,
+                              "certificate_id": cert_id, "condition_id": c["id"],
+                              "payload": body, "created_at": created_at})
+    return {models.Certificate: certs, models.Condition: conditions, models.ApprovalInboxItem: inbox}
+
+
+def _build_vaults(plan, start, end):
+    rng = plan.rng("vaults", start)
+    rows = []
+    for index in range(start, end):
+        unlock_time = plan.timestamp(rng) + timedelta(days=rng.randint(1, 730))
+        rows.append({
+            "id": plan.vault_base + index, "app_id": plan.app_id_base + index,
+            "owner_id": rng.randrange(*plan.students),
+            "ipfs_hash": f"Qm{rng.getrandbits(64):016x}", "filename": f"document_{index}.pdf",
+            "beneficiary": f"{rng.getrandbits(160):040X}", "encrypted_key": f"{rng.getrandbits(128):032x}",
+            "unlock_time": unlock_time, "status": "UNLOCKED" if unlock_time < datetime(2025, 1, 1) else "LOCKED",
+        })
+    return {models.Vault: rows}
+
+
+def _build_audit(plan, start, end):
+    # Timestamps rise with the index. Tasks are appended in order (imap), and the
+    # store hands out fresh ids above any existing entry, so generated ids rise
+    # with time too, even on a store that already holds newer entries.
+    rng = plan.rng("audit", start)
+    step = SPAN_SECONDS / max(1, plan.n_audit)
+    rows = []
+    for index in range(start, end):
+        action = rng.choice(AUDIT_ACTIONS)
+        rows.append({"action": action, "target_id": str(rng.randrange(plan.cert_base, plan.cert_base + max(1, plan.n_certificates))),
+                     "details": f"Synthetic {action.lower()}", "actor_username": f"faculty_{rng.randrange(*plan.faculty)}",
+                     "timestamp": START_TIME + timedelta(seconds=index * step)})
+    return {"audit": rows}
+
+
+def _run_task(task):
+    kind, plan, start, end, extra = task
+    if kind == "users":
+        return _build_users(plan, start, end, extra)
+    if kind == "records":
+        return _build_records(plan, start, end)
+    if kind == "certificates":
+        return _build_certificates(plan, start, end)
+    if kind == "vaults":
+        return _build_vaults(plan, start, end)
+    return _build_audit(plan, start, end)
+
+
+# --- Loader (parent process) ---
+def _ranges(start, end, size=TASK_SIZE):
+    return [(lo, min(lo + size, end)) for lo in range(start, end, size)]
+
+
+def _speed_up_sqlite(engine):
+    # Bulk load only: the data is reproducible, so skip fsyncs on this engine's connections
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def _pragmas(dbapi_conn, _):
+            dbapi_conn.execute("PRAGMA synchronous=OFF")
+
+
+def generate(users, certificates, records_per_student, vaults, audit_logs, workers=None, seed=42):
+    engine = create_engine(
+        database.SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False} if database.SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {},
+    )
+    _speed_up_sqlite(engine)
+    migrations.upgrade(engine)
+
+    with engine.connect() as conn:
+        plan = Plan(users, certificates, records_per_student, vaults, audit_logs, seed, conn)
+    hashed_password = auth.get_password_hash(GENERATED_PASSWORD)
+
+    # Users first (records and certificates reference them), then everything else
+    phases = [
+        [("users", plan, lo, hi, hashed_password) for lo, hi in _ranges(plan.user_base, plan.user_base + users)],
+        [("records", plan, lo, hi, None) for lo, hi in _ranges(*plan.students, size=max(1, TASK_SIZE // max(1, records_per_student)))
+         if records_per_student]
+        + [("certificates", plan, lo, hi, None) for lo, hi in _ranges(0, certificates)]
+        + [("vaults", plan, lo, hi, None) for lo, hi in _ranges(0, vaults)],
+        [("audit", plan, lo, hi, None) for lo, hi in _ranges(0, audit_logs, size=TASK_SIZE * 10)],
+    ]
+
+    totals = {}
+    started = time.perf_counter()
+    with multiprocessing.Pool(workers or os.cpu_count()) as pool:
+        for tasks in phases:
+            for batch in pool.imap(_run_task, tasks):
+                if "audit" in batch:
+                    audit_store.store.append(batch["audit"])
+                    totals["audit_log"] = totals.get("audit_log", 0) + len(batch["audit"])
+                    continue
+                with engine.begin() as conn:
+                    for model, rows in batch.items():
+                        if rows:
+                            conn.execute(insert(model), rows)
+                            totals[model.__tablename__] = totals.get(model.__tablename__, 0) + len(rows)
+            print(f"  {time.perf_counter() - started:7.1f}s  " + ", ".join(f"{k}={v:,}" for k, v in totals.items()))
+    if certificates:
+        # Core inserts bypass the session hooks; generated certificates belong to new students only
+        with engine.begin() as conn:
+            cache.bump_collections(conn, [cache.CERTIFICATES])
+    engine.dispose()
+
+    elapsed = time.perf_counter() - started
+    rows = sum(totals.values())
+    print(f"Generated {rows:,} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s).")
+    print(f"Generated users log in as <role>_<id> (e.g. faculty_{plan.faculty[0]}) with password '{GENERATED_PASSWORD}'.")
+
 
 if __name__ == "__main__":
-    # If running as script, ensure path is correct relative to execution from root
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--generate", choices=SCALES, help="also insert a preset volume of synthetic data")
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--certificates", type=int)
+    parser.add_argument("--records-per-student", type=int)
+    parser.add_argument("--vaults", type=int)
+    parser.add_argument("--audit-logs", type=int)
+    parser.add_argument("--workers", type=int, help="generator processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
     init_db()
+    if args.generate:
+        # An explicit 0 turns a kind of data off; only a missing option takes the preset
+        volumes = [
+            preset if value is None else value
+            for value, preset in zip(
+                (args.users, args.certificates, args.records_per_student, args.vaults, args.audit_logs),
+                SCALES[args.generate],
+            )
+        ]
+        users, certificates, records_per_student, vaults, audit_logs = volumes
+        if users <= len(ROLE_SHARES) and (certificates or vaults or audit_logs or records_per_student):
+            parser.error(f"--users must be above {len(ROLE_SHARES)} (one per role) to generate other data")
+        generate(
+            users=users,
+            certificates=certificates,
+            records_per_student=records_per_student,
+            vaults=vaults,
+            audit_logs=audit_logs,
+            workers=args.workers,
+            seed=args.seed,
+        )
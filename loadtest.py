@@ -0,0 +1,376 @@
+"""
+Scenario-driven load generator for the TrustCert API.
+
+The end-to-end flow from verify_flow.py, split into per-role scenarios and run
+as an open-loop load: sessions arrive at --rate per second (Poisson arrivals),
+each picks a scenario by weight and issues its requests through a shared
+HTTP connection pool. Latencies are recorded per endpoint (route template, not
+URL) and reported as throughput and p50/p95/p99.
+
+Scenarios:
+    student   dashboard poll (/my-certificates, /records/{username}), sometimes a
+              condition re-check
+    faculty   approval inbox, approving the newest item, sometimes a new record
+    admin     certificate issuance (approval- or date-gated), sometimes the full list
+    public    public verification of a known certificate, sometimes a batch
+
+Usage:
+    python loadtest.py --spawn                       # local uvicorn + fake algod
+    python loadtest.py --base-url http://127.0.0.1:8000 --rate 50 --duration 60
+    python loadtest.py --spawn --mix student=60,faculty=10,admin=5,public=25 --json out.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import httpx
+
+DEFAULT_MIX = "student=50,faculty=15,admin=5,public=30"
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+# --- Stats ---
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.started = None
+        self.finished = None
+
+    def record(self, endpoint, seconds, ok):
+        self.latencies[endpoint].append(seconds)
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def report(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        rows = []
+        for endpoint in sorted(self.latencies):
+            samples = sorted(self.latencies[endpoint])
+            rows.append({
+                "endpoint": endpoint,
+                "requests": len(samples),
+                "errors": self.errors[endpoint],
+                "rps": len(samples) / elapsed,
+                "p50_ms": percentile(samples, 50) * 1000,
+                "p95_ms": percentile(samples, 95) * 1000,
+                "p99_ms": percentile(samples, 99) * 1000,
+                "max_ms": samples[-1] * 1000,
+            })
+        total = sum(r["requests"] for r in rows)
+        return {
+            "elapsed_s": elapsed,
+            "requests": total,
+            "errors": sum(r["errors"] for r in rows),
+            "rps": total / elapsed,
+            "endpoints": rows,
+        }
+
+
+def percentile(sorted_samples, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_samples))))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+def print_report(report):
+    print(f"\n--- {report['requests']} requests in {report['elapsed_s']:.1f}s "
+          f"({report['rps']:.1f} req/s, {report['errors']} errors) ---")
+    print(f"{'endpoint':<52} {'reqs':>6} {'err':>5} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for r in report["endpoints"]:
+        print(f"{r['endpoint']:<52} {r['requests']:>6} {r['errors']:>5} {r['rps']:>7.1f} "
+              f"{r['p50_ms']:>7.1f}ms {r['p95_ms']:>7.1f}ms {r['p99_ms']:>7.1f}ms {r['max_ms']:>7.1f}ms")
+
+
+# --- Client ---
+class LoadClient:
+    def __init__(self, http: httpx.AsyncClient, stats: Stats):
+        self.http = http
+        self.stats = stats
+
+    async def call(self, method, endpoint, url, expect=(200,), **kwargs):
+        """Issue one request, recorded under `endpoint` (the route template)."""
+        started = time.perf_counter()
+        try:
+            resp = await self.http.request(method, url, **kwargs)
+            ok = resp.status_code in expect
+        except httpx.HTTPError:
+            resp, ok = None, False
+        self.stats.record(f"{method} {endpoint}", time.perf_counter() - started, ok)
+        return resp if ok else None
+
+
+class World:
+    """Users and certificates created during setup and shared by all scenarios."""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.admins = []
+        self.faculty = []
+        self.students = []
+        self.cert_ids = []
+        self.certs_by_student = defaultdict(list)
+
+
+def auth(user):
+    return {"Authorization": f"Bearer {user['token']}"}
+
+
+async def register(client: LoadClient, username, role, attempts=5):
+    # Setup registers users concurrently from one address, which the server may
+    # shed (503) or rate limit (429); wait as told by Retry-After and try again.
+    for _ in range(attempts):
+        resp = await client.call("POST", "/register", "/register", expect=(200, 429, 503), json={
+            "username": username, "email": f"{username}@load.test", "password": "loadtest", "role": role
+        })
+        if resp is None or resp.status_code == 200:
+            break
+        await asyncio.sleep(float(resp.headers.get("retry-after", "1")))
+    if resp is None or resp.status_code != 200:
+        raise SystemExit(f"Could not register {username}; is the server running?")
+    return {"username": username, "token": resp.json()["access_token"]}
+
+
+async def issue_certificate(client: LoadClient, world: World, rng: random.Random):
+    admin = rng.choice(world.admins)
+    student = rng.choice(world.students)
+    body = {
+        "title": f"Load Certificate {rng.randrange(10**6)}",
+        "encrypted_ipfs_hash": "loadtest",
+        "decryption_key": "loadtest",
+        "student_username": student["username"],
+    }
+    if rng.random() < 0.7:
+        body["require_approval"] = True
+    else:
+        body["manual_date"] = "2000-01-01"
+    resp = await client.call("POST", "/certificates/create", "/certificates/create", json=body, headers=auth(admin))
+    if resp is not None:
+        cert_id = resp.json()["id"]
+        world.cert_ids.append(cert_id)
+        world.certs_by_student[student["username"]].append(cert_id)
+
+
+async def setup_world(client: LoadClient, args, rng: random.Random) -> World:
+    world = World(f"lt{int(time.time())}")
+    world.admins = [await register(client, f"{world.prefix}_admin{i}", "admin") for i in range(max(1, args.admins))]
+    world.faculty = [await register(client, f"{world.prefix}_fac{i}", "faculty") for i in range(max(1, args.faculty))]
+    world.students = await asyncio.gather(*[
+        register(client, f"{world.prefix}_stu{i}", "student") for i in range(max(1, args.students))
+    ])
+    await asyncio.gather(*[issue_certificate(client, world, rng) for _ in range(args.seed_certs)])
+    return world
+
+
+# --- Scenarios ---
+async def student_session(client: LoadClient, world: World, rng: random.Random):
+    student = rng.choice(world.students)
+    await client.call("GET", "/my-certificates", "/my-certificates", headers=auth(student))
+    await client.call("GET", "/records/{student_username}", f"/records/{student['username']}", headers=auth(student))
+    certs = world.certs_by_student.get(student["username"])
+    if certs and rng.random() < 0.3:
+        await client.call("POST", "/certificates/{id}/verify-conditions",
+                          f"/certificates/{rng.choice(certs)}/verify-conditions", headers=auth(student))
+
+
+async def faculty_session(client: LoadClient, world: World, rng: random.Random):
+    faculty = rng.choice(world.faculty)
+    resp = await client.call("GET", "/pending-approvals", "/pending-approvals?limit=20", headers=auth(faculty))
+    if resp is not None and resp.json():
+        cert_id = resp.json()[0]["id"]
+        await client.call("POST", "/certificates/{id}/approve-condition/approval",
+                          f"/certificates/{cert_id}/approve-condition/approval", headers=auth(faculty))
+    if rng.random() < 0.2:
+        student = rng.choice(world.students)
+        await client.call("POST", "/records/add", "/records/add", headers=auth(faculty), json={
+            "student_username": student["username"],
+            "category": rng.choice(["Attendance", "Grade"]),
+            "value": str(rng.randint(50, 100)),
+        })
+
+
+async def admin_session(client: LoadClient, world: World, rng: random.Random):
+    await issue_certificate(client, world, rng)
+    if rng.random() < 0.1:
+        await client.call("GET", "/certificates/all", "/certificates/all", headers=auth(rng.choice(world.admins)))
+
+
+async def public_session(client: LoadClient, world: World, rng: random.Random):
+    if not world.cert_ids:
+        return
+    if rng.random() < 0.1:
+        ids = rng.sample(world.cert_ids, min(50, len(world.cert_ids)))
+        await client.call("POST", "/certificates/public/verify-batch", "/certificates/public/verify-batch", json={"ids": ids})
+    else:
+        cert_id = rng.choice(world.cert_ids)
+        await client.call("GET", "/certificates/public/{id}", f"/certificates/public/{cert_id}", expect=(200, 404))
+
+
+SCENARIOS = {
+    "student": student_session,
+    "faculty": faculty_session,
+    "admin": admin_session,
+    "public": public_session,
+}
+
+
+def parse_mix(mix: str):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+# --- Runner ---
+async def run_load(args):
+    rng = random.Random(args.seed)
+    weights = parse_mix(args.mix)
+    names, name_weights = list(weights), list(weights.values())
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as http:
+        setup_stats = Stats()
+        setup_stats.started = time.perf_counter()
+        world = await setup_world(LoadClient(http, setup_stats), args, rng)
+        print(f"Setup: {len(world.admins)} admins, {len(world.faculty)} faculty, "
+              f"{len(world.students)} students, {len(world.cert_ids)} certificates")
+
+        stats = Stats()
+        client = LoadClient(http, stats)
+        in_flight = set()
+        dropped = 0
+        stats.started = time.perf_counter()
+        deadline = stats.started + args.duration
+        next_arrival = stats.started
+
+        # Open loop: arrivals follow the configured rate whatever the server's latency
+        while True:
+            next_arrival += rng.expovariate(args.rate)
+            if next_arrival >= deadline:
+                break
+            await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+            if len(in_flight) >= args.max_sessions:
+                dropped += 1
+                continue
+            scenario = SCENARIOS[rng.choices(names, weights=name_weights)[0]]
+            task = asyncio.create_task(scenario(client, world, random.Random(rng.random())))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+        stats.finished = time.perf_counter()
+
+    report = stats.report()
+    report["config"] = {
+        "rate": args.rate, "duration": args.duration, "mix": weights,
+        "connections": args.connections, "dropped_sessions": dropped,
+    }
+    return report
+
+
+# --- Local Server ---
+def spawn_server(args):
+    """Start fake algod (in-process) and uvicorn (subprocess) in a scratch directory."""
+    sys.path.insert(0, REPO_ROOT)
+    import fake_algod
+
+    algod_server, _ = fake_algod.serve(args.algod_port)
+    threading.Thread(target=algod_server.serve_forever, daemon=True).start()
+
+    workdir = tempfile.mkdtemp(prefix="trustcert-load-")
+    os.makedirs(os.path.join(workdir, "backend"))
+    env = dict(
+        os.environ,
+        PYTHONPATH=REPO_ROOT,
+        ALGOD_ADDRESS=f"http://127.0.0.1:{args.algod_port}",
+        # Every simulated user shares one client IP; per-caller limits would cap the offered load
+        TRUSTCERT_RATE_LIMIT="0",
+    )
+    # Schema is a deploy step, not something the workers do on startup
+    subprocess.run([sys.executable, os.path.join(REPO_ROOT, "init_db.py")], cwd=workdir, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    cmd = [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(args.port), "--log-level", "warning"]
+    if args.workers > 1:
+        cmd += ["--workers", str(args.workers)]
+    server = subprocess.Popen(cmd, cwd=workdir, env=env)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    for _ in range(100):
+        try:
+            if httpx.get(base_url + "/", timeout=1).status_code == 200:
+                break
+        except httpx.HTTPError:
+            pass
+        if server.poll() is not None:
+            raise SystemExit("uvicorn exited during startup")
+        time.sleep(0.2)
+    else:
+        server.terminate()
+        raise SystemExit("uvicorn did not come up")
+
+    def stop():
+        server.terminate()
+        server.wait()
+        algod_server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return base_url, stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="run against a fresh local uvicorn + fake algod")
+    parser.add_argument("--port", type=int, default=8800, help="uvicorn port with --spawn")
+    parser.add_argument("--algod-port", type=int, default=4801, help="fake algod port with --spawn")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers with --spawn")
+    parser.add_argument("--rate", type=float, default=20.0, help="session arrivals per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario weights, e.g. " + DEFAULT_MIX)
+    parser.add_argument("--connections", type=int, default=50, help="HTTP connection pool size")
+    parser.add_argument("--max-sessions", type=int, default=1000, help="cap on concurrent sessions")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--students", type=int, default=100)
+    parser.add_argument("--faculty", type=int, default=10)
+    parser.add_argument("--admins", type=int, default=2)
+    parser.add_argument("--seed-certs", type=int, default=200, help="certificates issued during setup")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    stop = None
+    if args.spawn:
+        args.base_url, stop = spawn_server(args)
+    try:
+        report = asyncio.run(run_load(args))
+    finally:
+        if stop:
+            stop()
+
+    print_report(report)
+    if report["config"]["dropped_sessions"]:
+        print(f"Dropped {report['config']['dropped_sessions']} sessions at the --max-sessions cap")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if report["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
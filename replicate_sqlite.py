@@ -0,0 +1,60 @@
+"""
+SQLite "replicas" for trying out read/write routing locally.
+
+Copies the primary database file to each replica path with SQLite's online
+backup API, once or every --interval seconds, so the replicas trail the
+primary by up to that interval (a stand-in for replication lag). Point the
+backend at the copies with TRUSTCERT_DATABASE_REPLICA_URLS (see
+backend/replicas.py).
+
+Usage:
+    python init_db.py && python replicate_sqlite.py --once backend/replica1.db
+    python replicate_sqlite.py backend/replica1.db backend/replica2.db --interval 2 &
+    TRUSTCERT_DATABASE_REPLICA_URLS=sqlite:///./backend/replica1.db,sqlite:///./backend/replica2.db \\
+        uvicorn backend.main:app
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+DEFAULT_PRIMARY = os.getenv("TRUSTCERT_DATABASE_URL", "sqlite:///./backend/chronovault.db")
+
+
+def sqlite_path(url: str) -> str:
+    if not url.startswith("sqlite:///"):
+        raise SystemExit(f"Not a SQLite database URL: {url}")
+    return url[len("sqlite:///"):]
+
+
+def copy_database(primary: str, replica: str):
+    source = sqlite3.connect(primary)
+    target = sqlite3.connect(replica)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("replicas", nargs="+", help="replica database files")
+    parser.add_argument("--primary", default=DEFAULT_PRIMARY, help="primary database URL")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between copies")
+    parser.add_argument("--once", action="store_true", help="copy once and exit")
+    args = parser.parse_args()
+
+    primary = sqlite_path(args.primary)
+    while True:
+        started = time.perf_counter()
+        for replica in args.replicas:
+            copy_database(primary, replica)
+        if args.once:
+            print(f"Copied {primary} to {len(args.replicas)} replica(s)")
+            return
+        time.sleep(max(0.0, args.interval - (time.perf_counter() - started)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Concurrency stress check for condition and status transitions.
+
+Seeds a throwaway SQLite database with certificates that each need one faculty
+approval and one (already passed) release date, then hammers them from a
+thread pool with overlapping single approvals, batch approvals and condition
+re-evaluations, all calling the endpoint functions in backend/main.py
+directly. Afterwards it checks that:
+
+- every approval was granted exactly once (no lost or double approvals);
+- every certificate was unlocked exactly once and every condition is met.
+
+It repeats the run for each thread count and prints the throughput, then exits
+non-zero if any invariant was violated.
+
+Usage:
+    python stress_conditions.py [--certs 200] [--repeat 4] [--threads 1,2,4,8]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+# Keep every bit of on-disk state (primary database, audit segments, bundle key)
+# out of the real ./backend: set before backend reads its config at import.
+STATE_DIR = tempfile.mkdtemp(prefix="trustcert-stress-state-")
+os.environ["TRUSTCERT_DATABASE_URL"] = f"sqlite:///{os.path.join(STATE_DIR, 'primary.db')}"
+os.environ["TRUSTCERT_AUDIT_DIR"] = os.path.join(STATE_DIR, "audit_segments")
+os.environ["TRUSTCERT_BUNDLE_KEY_PATH"] = os.path.join(STATE_DIR, "bundle_signing_key.pem")
+
+from backend import main, migrations, models, events, auth, audit
+
+BATCH_SIZE = 20
+
+
+def seed(Session, n_certs):
+    db = Session()
+    try:
+        hashed = auth.get_password_hash("stress")
+        users = [
+            models.User(username="stress_admin", email="a@stress", hashed_password=hashed, role="admin"),
+            models.User(username="stress_faculty", email="f@stress", hashed_password=hashed, role="faculty"),
+            models.User(username="stress_student", email="s@stress", hashed_password=hashed, role="student"),
+        ]
+        db.add_all(users)
+        db.flush()
+        admin, faculty, student = users
+
+        certs = [
+            models.Certificate(
+                title=f"Stress {i}", student_id=student.id, issuer_id=admin.id,
+                encrypted_ipfs_hash="stress", decryption_key="stress", status="LOCKED"
+            )
+            for i in range(n_certs)
+        ]
+        db.add_all(certs)
+        db.flush()
+        for cert in certs:
+            db.add(models.Condition(certificate_id=cert.id, condition_type="approval", target_value="", is_met=False))
+            db.add(models.Condition(certificate_id=cert.id, condition_type="time", target_value="2000-01-01", is_met=False))
+        db.commit()
+        return faculty.id, [cert.id for cert in certs]
+    finally:
+        db.close()
+
+
+def run(n_certs, repeat, threads):
+    workdir = tempfile.mkdtemp(prefix="trustcert-stress-")
+    engine = create_engine(
+        f"sqlite:///{os.path.join(workdir, 'stress.db')}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+        pool_size=threads, max_overflow=0,
+    )
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    migrations.upgrade(engine)
+    faculty_id, cert_ids = seed(Session, n_certs)
+
+    # Every certificate gets `repeat` approvals, `repeat` evaluations and a share of batch calls
+    tasks = []
+    for cert_id in cert_ids:
+        tasks += [("approve", cert_id)] * repeat + [("verify", cert_id)] * repeat
+    shuffled = cert_ids[:]
+    for _ in range(repeat):
+        random.shuffle(shuffled)
+        tasks += [("batch", shuffled[i:i + BATCH_SIZE]) for i in range(0, len(shuffled), BATCH_SIZE)]
+    random.shuffle(tasks)
+
+    approvals_granted = Counter()
+    unlocks = Counter()
+    lock = threading.Lock()
+
+    def count_unlock(db, cert_id, student_id, status):
+        with lock:
+            unlocks[cert_id] += 1
+        original_status_changed(db, cert_id, student_id, status)
+
+    def work(task):
+        kind, arg = task
+        db = Session()
+        try:
+            user = db.get(models.User, faculty_id)
+            if kind == "approve":
+                if main.approve_condition(arg, "approval", db=db, current_user=user)["approved"]:
+                    with lock:
+                        approvals_granted[arg] += 1
+            elif kind == "verify":
+                main.verify_conditions(arg, db=db)
+            else:
+                result = main.approve_conditions_batch(main.schemas.BatchApproveRequest(certificate_ids=arg), db=db, current_user=user)
+                with lock:
+                    for item in result["results"]:
+                        if item["result"] == "approved":
+                            approvals_granted[item["certificate_id"]] += 1
+        finally:
+            db.close()
+
+    original_status_changed = events.certificate_status_changed
+    events.certificate_status_changed = count_unlock
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(work, tasks))
+        elapsed = time.perf_counter() - started
+    finally:
+        events.certificate_status_changed = original_status_changed
+
+    db = Session()
+    try:
+        still_locked = db.query(func.count(models.Certificate.id)).filter(models.Certificate.status != "UNLOCKED").scalar()
+        unmet = db.query(func.count(models.Condition.id)).filter(models.Condition.is_met == False).scalar()
+    finally:
+        db.close()
+        engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    errors = []
+    if still_locked:
+        errors.append(f"{still_locked} certificates still LOCKED")
+    if unmet:
+        errors.append(f"{unmet} conditions still unmet")
+    wrong_approvals = [c for c in cert_ids if approvals_granted[c] != 1]
+    if wrong_approvals:
+        errors.append(f"{len(wrong_approvals)} certificates not approved exactly once (e.g. {wrong_approvals[0]}: {approvals_granted[wrong_approvals[0]]})")
+    wrong_unlocks = [c for c in cert_ids if unlocks[c] != 1]
+    if wrong_unlocks:
+        errors.append(f"{len(wrong_unlocks)} certificates not unlocked exactly once (e.g. {wrong_unlocks[0]}: {unlocks[wrong_unlocks[0]]})")
+    return len(tasks), elapsed, errors
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--certs", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=4, help="concurrent callers per certificate and operation")
+    parser.add_argument("--threads", default="1,2,4,8")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'threads':>8} {'requests':>9} {'seconds':>8} {'req/s':>8}  result")
+    try:
+        for threads in [int(t) for t in args.threads.split(",")]:
+            n_tasks, elapsed, errors = run(args.certs, args.repeat, threads)
+            print(f"{threads:>8} {n_tasks:>9} {elapsed:>8.2f} {n_tasks / elapsed:>8.0f}  {'OK' if not errors else 'FAILED'}")
+            for error in errors:
+                print(f"    {error}")
+            failed = failed or bool(errors)
+    finally:
+        audit.sink.stop() # flush queued audit entries before their directory goes
+        shutil.rmtree(STATE_DIR, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main_cli()